@@ -7,7 +7,17 @@ from flask import Blueprint
 
 from app.utilities.logging import configuration
 from app.utilities.logging.api_log import log_api_call, get_request_time
+from app.utilities.logging.audit_log import AuditLogWriter
+from app.utilities.cache import init_cache
+from app.utilities.search import init_search
+from app.utilities.metrics import init_metrics
+from app.utilities.compression import init_compression
+from app.utilities.jsonprovider import init_json
+from app.utilities.database import init_database
+from app.utilities.warmup import cli_context
+from app.utilities.warmup import warm_up
 from app.utilities.exceptions import register_handlers
+from app.commands import register_commands
 from app import blueprints
 from app.config import Development, Test, Production
 from app.models import BaseSchema
@@ -20,6 +30,11 @@ from app.models.log import IncomingAPI
 from app.blueprints.api import BaseAPI
 from app.blueprints.api import BaseRestAPI
 from app.blueprints.api import BaseRestAPIById
+from app.blueprints.api import BaseRestAPIExport
+from app.blueprints.api import BaseRestAPIHierarchy
+from app.blueprints.api import BaseRestAPISearch
+from app.blueprints.api import BaseRestAPIAncestors
+from app.blueprints.api import BaseRestAPIDescendants
 from app.blueprints.api import BaseRestAPIRelationshipByModelId
 from app.blueprints.api import BaseRestAPIRelationshipByModelIdBySubResourceId
 from app.blueprints.service import BaseService
@@ -44,6 +59,9 @@ def initiate_app(app: Flask, config=Development, register_bps: bool = True):
     app = register_apis(app)
     app = register_app_hooks(app)
     register_handlers(app)
+    register_commands(app)
+    if app.config.get('WARM_UP') and not cli_context():
+        warm_up(app)
     return app
 
 
@@ -109,8 +127,14 @@ def register_blueprints(app):
 
 
 def register_extensions(app):
-    db.init_app(app)
+    init_json(app)
+    init_database(app)
     ma.init_app(app)
+    init_cache(app)
+    init_search(app)
+    init_metrics(app)
+    # after init_metrics: responses are compressed before the metrics record their size
+    init_compression(app)
     return app
 
 
@@ -120,8 +144,9 @@ def register_apis(app: Flask):
 
 def register_api(app: Flask | Blueprint, resource: Type[BaseModel], resource_schema: Type[BaseSchema],
                  service: Type[BaseService],
-                 relations: list[tuple[[BaseModel, BaseSchema, str, [bool]]]] = None):
-    _service_ = service(model=resource, schema=resource_schema, relations=relations)
+                 relations: list[tuple[[BaseModel, BaseSchema, str, [bool]]]] = None,
+                 loading: dict[str, str] = None):
+    _service_ = service(model=resource, schema=resource_schema, relations=relations, loading=loading)
     if relations:
         for relation in relations:
             api_relationship = BaseRestAPIRelationshipByModelId.as_view(
@@ -151,7 +176,28 @@ def register_api(app: Flask | Blueprint, resource: Type[BaseModel], resource_sch
         service=_service_
     )
 
+    if resource.__search_fields__:
+        rest_api_search = BaseRestAPISearch.as_view(
+            name=f'{generate_view_name(BaseRestAPISearch, resource_schema)}',
+            service=_service_
+        )
+        app.add_url_rule(generate_view_uri(BaseRestAPISearch, resource_schema), view_func=rest_api_search)
+
+    if resource.__hierarchy_parent_key__:
+        for end_point in (BaseRestAPIAncestors, BaseRestAPIDescendants):
+            rest_api_hierarchy = end_point.as_view(
+                name=f'{generate_view_name(end_point, resource_schema)}',
+                service=_service_
+            )
+            app.add_url_rule(generate_view_uri(end_point, resource_schema), view_func=rest_api_hierarchy)
+
+    rest_api_export = BaseRestAPIExport.as_view(
+        name=f'{generate_view_name(BaseRestAPIExport, resource_schema)}',
+        service=_service_
+    )
+
     app.add_url_rule(generate_view_uri(BaseRestAPI, resource_schema), view_func=rest_api)
+    app.add_url_rule(generate_view_uri(BaseRestAPIExport, resource_schema), view_func=rest_api_export)
     app.add_url_rule(generate_view_uri(BaseRestAPIById, resource_schema), view_func=rest_api_by_id)
 
     return app
@@ -178,6 +224,12 @@ def generate_view_uri(end_point: Type[BaseAPI], resource_schema: Type[BaseSchema
         return view_uri
     elif end_point is BaseRestAPIById:
         return view_uri + '/' + '<uuid:id>'
+    elif end_point is BaseRestAPIExport:
+        return view_uri + '/' + 'export'
+    elif end_point is BaseRestAPISearch:
+        return view_uri + '/' + 'search'
+    elif issubclass(end_point, BaseRestAPIHierarchy):
+        return view_uri + '/' + '<uuid:id>' + '/' + end_point.__direction__
     elif relation:
         if end_point is BaseRestAPIRelationshipByModelId:
             return view_uri + '/' + '<uuid:id>' + '/' + relation[1].__envelope__.get("many")
@@ -188,6 +240,7 @@ def generate_view_uri(end_point: Type[BaseAPI], resource_schema: Type[BaseSchema
 
 
 def register_app_hooks(app):
+    AuditLogWriter(app)
     hook1 = app.before_request(get_request_time)
     hook2 = app.after_request(log_api_call)
     return app
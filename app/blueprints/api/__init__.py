@@ -1,13 +1,49 @@
+import logging
 from uuid import UUID
 
 from flask.views import MethodView
 from flask import request
 from app.blueprints.service import BaseService
+from app.utilities.logging.timing import timed
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+
+def get_expand_arg() -> tuple:
+    """
+    Return the relation keys of the 'expand' URL parameter, i.e. ?expand=categories,parent
+
+    :return: tuple of relation keys
+    """
+    return tuple(key.strip() for key in request.args.get('expand', '').split(',') if key.strip())
 
 
 class BaseAPI(MethodView):
+    """
+    Base class of the REST APIs.
+
+    Class Variables:
+
+    - __async_read__: If True GET is served by the asyncio read path of the ASGI app (see app.utilities.asgi), views
+    reading after they returned (i.e. streamed responses) should set it to False. By-default it is True.
+    """
     init_every_request = False
     __view_name_suffix__ = ''
+    __async_read__ = True
+
+    @classmethod
+    def as_view(cls, name: str, *class_args, **class_kwargs):
+        """
+        Flask's MethodView.as_view(), the service of the view is kept on the view function as 'service'.
+        """
+        view = super().as_view(name, *class_args, **class_kwargs)
+        view.service = class_kwargs.get('service')
+        return view
+
+    def dispatch_request(self, **kwargs):
+        with timed('service'):
+            return super().dispatch_request(**kwargs)
 
 
 class BaseRestAPIById(BaseAPI):
@@ -15,7 +51,7 @@ class BaseRestAPIById(BaseAPI):
     Generic class of all REST APIs.
 
     For a given model of type BaseModel produces bellow http resource end points:
-    GET , DELETE -> /models/id
+    GET , PATCH, DELETE -> /models/id
 
     Is a child class of flask's MethodView.
 
@@ -40,19 +76,35 @@ class BaseRestAPIById(BaseAPI):
         """
         HTTP GET, retrieve resource by given id.
 
+        Relations listed in the 'expand' URL parameter are embedded in the resource. Answers 304 if the If-None-Match
+        header matches the ETag of the resource.
+
         :param id: The id of the resource on DB.
         :return: Serialized presentation of the resource
         """
-        return self.__service__.get_model_by_id(id)
+        return self.__service__.get_model_by_id(id, expand=get_expand_arg(), if_none_match=request.if_none_match)
+
+    def patch(self, id: UUID):
+        """
+        HTTP PATCH, partially update the resource by given id, only the fields in request body are updated.
+
+        If the If-Match header is given the resource is updated only if it matches its current ETag, 412 otherwise.
+
+        :param id: The id of the resource on DB.
+        :return: Serialized presentation of the resource
+        """
+        return self.__service__.patch_model_by_id(id, request.get_json(), if_match=request.if_match)
 
     def delete(self, id: UUID):
         """
         HTTP DELETE, delete resource by given id.
 
+        If the If-Match header is given the resource is deleted only if it matches its current ETag, 412 otherwise.
+
         :param id: The id of the resource on DB.
         :return: bool
         """
-        return self.__service__.delete_model_by_id(id)
+        return self.__service__.delete_model_by_id(id, if_match=request.if_match)
 
 
 class BaseRestAPI(BaseAPI):
@@ -60,7 +112,7 @@ class BaseRestAPI(BaseAPI):
     Generic class of all REST APIs.
 
     For a given model of type BaseModel produces bellow http resource end points:
-    POST , PUT, GET -> /models/
+    POST , PUT, PATCH, GET -> /models/
 
     Is a child class of flask's MethodView.
 
@@ -84,6 +136,10 @@ class BaseRestAPI(BaseAPI):
     def post(self):
         """
         HTTP POST, create the resource by given data in request body.
+
+        If the data is wrapped in the collection label (i.e. {"products": [...]}) all resources are created with bulk
+        inserts and the id or the validation errors of each item are returned.
+
         :return: Serialized presentation of the resource
         """
         return self.__service__.create_model(request.get_json())
@@ -91,14 +147,35 @@ class BaseRestAPI(BaseAPI):
     def put(self):
         """
         HTTP PUT, update the resource by given data in request body.
+
+        If the If-Match header is given the resource is updated only if it matches its current ETag, 412 otherwise.
         :return: Serialized presentation of the resource
         """
-        return self.__service__.update_model(request.get_json())
+        return self.__service__.update_model(request.get_json(), if_match=request.if_match)
+
+    def patch(self):
+        """
+        HTTP PATCH, partially update many resources in one transaction.
+
+        The data is wrapped in the collection label, each item has the id of a resource and the fields to update
+        (i.e. {"products": [{"id": ..., "base_price": ...}]}). The result of each item is returned.
+
+        :return: Result of each item
+        """
+        return self.__service__.patch_models(request.get_json())
 
     def get(self):
         """
         HTTP GET, retrieve all resources, 'limit' and 'page' URL parameters are used for pagination.
 
+        If the 'cursor' URL parameter is given (may be empty for the first page) keyset pagination is used instead of
+        'page' and the response contains a 'next_cursor'. If 'total' is true the total number of resources is added.
+        Relations listed in the 'expand' URL parameter are embedded in each resource, they are loaded for the whole
+        page at once. Answers 304 if the If-None-Match header matches the ETag of the page.
+
+        Resources can be filtered and sorted, i.e. ?filter[base_price][gte]=10&sort=-updated, see
+        app.utilities.filtering.
+
         note: limit and page default values are 10 and 1 respectively.
 
         :return: Serialized presentation of the resources
@@ -110,7 +187,147 @@ class BaseRestAPI(BaseAPI):
             print(err)
             page = 1
             limit = 10
-        return self.__service__.get_all_models(limit=limit, page=page)
+        cursor = request.args.get('cursor', None)
+        with_total = request.args.get('total', '').lower() in ('1', 'true', 'yes')
+        return self.__service__.get_all_models(limit=limit, page=page, cursor=cursor, with_total=with_total,
+                                               expand=get_expand_arg(), if_none_match=request.if_none_match,
+                                               query_args=request.args)
+
+
+class BaseRestAPIExport(BaseAPI):
+    """
+    Generic class of all REST APIs.
+
+    For a given model of type BaseModel produces bellow http resource end points:
+    GET -> /models/export
+
+    Is a child class of flask's MethodView.
+
+    Class Variables:
+
+    - init_every_request: If false instructs flask to use 1 instance for all incoming requests which is useful if the
+    state of the object should be shared across requests, By-default it is False.
+
+    - __async_read__: False, the response is streamed after the view returned.
+    """
+    init_every_request = False
+    __view_name_suffix__ = 'Export'
+    __async_read__ = False
+
+    def __init__(self, service: BaseService):
+        """
+        Initiate the object.
+
+        :param service: service layer for business logic.
+        """
+        self.__service__ = service
+
+    def get(self):
+        """
+        HTTP GET, stream all resources in one response.
+
+        The response has the same form as GET /models, if the 'format' URL parameter is 'ndjson' one resource is
+        written per line instead.
+
+        :return: Streaming response
+        """
+        return self.__service__.export_models(ndjson=request.args.get('format') == 'ndjson')
+
+
+class BaseRestAPISearch(BaseAPI):
+    """
+    Generic class of all REST APIs.
+
+    For a given model of type BaseModel having __search_fields__ produces bellow http resource end point:
+    GET -> /models/search
+
+    Is a child class of flask's MethodView.
+
+    Class Variables:
+
+    - init_every_request: If false instructs flask to use 1 instance for all incoming requests which is useful if the
+    state of the object should be shared across requests, By-default it is False.
+    """
+    init_every_request = False
+    __view_name_suffix__ = 'Search'
+
+    def __init__(self, service: BaseService):
+        """
+        Initiate the object.
+
+        :param service: service layer for business logic.
+        """
+        self.__service__ = service
+
+    def get(self):
+        """
+        HTTP GET, full-text search of the resources by the 'q' URL parameter, best matches first.
+
+        'limit' and 'cursor' (the 'next_cursor' of the previous page) URL parameters are used for pagination.
+
+        :return: Serialized presentation of the resources
+        """
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError as err:
+            app_logger.warning(f'invalid limit URL parameter, using 10: {err}')
+            limit = 10
+        return self.__service__.search_models(request.args.get('q', ''), limit=limit,
+                                              cursor=request.args.get('cursor', None))
+
+
+class BaseRestAPIHierarchy(BaseAPI):
+    """
+    Generic class of all REST APIs.
+
+    For a given model of type BaseModel having a __hierarchy_parent_key__ produces bellow http resource end point:
+    GET -> /models/id/ancestors | /models/id/descendants (see the subclasses)
+
+    Is a child class of flask's MethodView.
+
+    Class Variables:
+
+    - init_every_request: If false instructs flask to use 1 instance for all incoming requests which is useful if the
+    state of the object should be shared across requests, By-default it is False.
+
+    - __direction__: 'ancestors' or 'descendants', also the last segment of the URI.
+    """
+    init_every_request = False
+    __view_name_suffix__ = ''
+    __direction__ = ''
+
+    def __init__(self, service: BaseService):
+        """
+        Initiate the object.
+
+        :param service: service layer for business logic.
+        """
+        self.__service__ = service
+
+    def get(self, id: UUID):
+        """
+        HTTP GET, retrieve the ancestors or descendants of the resource, the 'depth' URL parameter limits the number of
+        levels.
+
+        :param id: The id of the resource on DB.
+        :return: Serialized presentation of the resources
+        """
+        try:
+            max_depth = int(request.args['depth']) if 'depth' in request.args else None
+        except ValueError as err:
+            app_logger.warning(f'invalid depth URL parameter, levels are not limited: {err}')
+            max_depth = None
+        return self.__service__.get_hierarchy(id, self.__direction__, max_depth=max_depth)
+
+
+class BaseRestAPIAncestors(BaseRestAPIHierarchy):
+    __view_name_suffix__ = 'Ancestors'
+    __direction__ = 'ancestors'
+
+
+class BaseRestAPIDescendants(BaseRestAPIHierarchy):
+    __view_name_suffix__ = 'Descendants'
+    __direction__ = 'descendants'
 
 
 class BaseRestAPIRelationshipByModelId(BaseAPI):
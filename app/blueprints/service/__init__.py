@@ -1,10 +1,46 @@
 from uuid import UUID
+from datetime import datetime
 from typing import Type
+from typing import Optional
+
+import logging
 
 from flask import jsonify
+from flask import current_app
+from flask import Response
+from flask import stream_with_context
+from werkzeug.datastructures import ETags
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import quote_etag
 from marshmallow import ValidationError
+from sqlalchemy import inspect
 from app.models import BaseModel
 from app.models import BaseSchema
+from app.models.serializer import get_dumper
+from app.models.serializer import get_schema
+from app.models.serializer import get_loader
+from app.utilities.pagination import encode_cursor
+from app.utilities.pagination import decode_cursor
+from app.utilities.cache import entity_key
+from app.utilities.database.replicas import primary_reads
+from app.utilities.database.replicas import reading_from_replica
+from app.utilities.database.replicas import replica_read
+from app.utilities.etag import entity_etag
+from app.utilities.etag import identity_etags
+from app.utilities.jsonprovider import native_types
+from app.utilities.etag import collection_etag
+from app.utilities.filtering import QueryError
+from app.utilities.filtering import parse_list_query
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+# get_loader() arguments of the writes, the server sets the id (on creation) and the bookkeeping columns
+CREATE_LOADER = {'exclude': ('id', 'created', 'updated', 'active')}
+UPDATE_LOADER = {'exclude': ('created', 'updated')}
+PATCH_LOADER = {'exclude': ('id', 'created', 'updated', 'active'), 'partial': True}
+PATCH_MANY_LOADER = {'exclude': ('created', 'updated', 'active'), 'partial': True}
+WRITE_LOADERS = (CREATE_LOADER, UPDATE_LOADER, PATCH_LOADER, PATCH_MANY_LOADER)
 
 
 class BaseService:
@@ -16,77 +52,596 @@ class BaseService:
     Example: create sub model, can be customized based on sub_model_key and each relationship gets it's own method.
     """
 
+    default_loading_strategy = 'selectin'
+
     def __init__(self, model: Type[BaseModel], schema: Type[BaseSchema],
-                 relations: list[tuple[[BaseModel, Type[BaseSchema], str, [bool]]]] = None):
+                 relations: list[tuple[[BaseModel, Type[BaseSchema], str, [bool]]]] = None,
+                 loading: dict[str, str] = None):
         """
         Initiates the service layer for a given model(resource).
         :param model: data base model
         :param schema: marshmallow schema of the model
         :param relations: contains all relations of the model
+        :param loading: {sub_resource_key: loading strategy} used whenever a relation is loaded, relations missing
+        here use default_loading_strategy. See BaseModel.loader_options() for the strategies.
         """
         self.__model__ = model                  # main model to operate on
         self.__model_schema__ = schema          # main model marshmallow schema
         self.__relation_models__ = dict()       # dictionary containing {sub_resource_key: sub_resource_class}
         self.__relation_schemas__ = dict()      # dictionary containing {sub_resource_key: sub_resource_schema_class}
         self.__relation_many__ = dict()         # dictionary containing {sub_resource_key: bool -> True:many & False:single}
+        self.__relation_loading__ = dict()      # dictionary containing {sub_resource_key: loading strategy}
         if relations:
             for relation in relations:
                 self.__relation_models__[relation[2]] = relation[0]
                 self.__relation_schemas__[relation[2]] = relation[1]
                 self.__relation_many__[relation[2]] = relation[3]
+                self.__relation_loading__[relation[2]] = (loading or {}).get(relation[2],
+                                                                             self.default_loading_strategy)
+        # validates the keys and strategies once, at registration time
+        model.loader_options(self.__relation_loading__)
+
+    def warm_up(self, native: bool = False):
+        """
+        Build the shared schemas, dumpers and loaders used by the service, see app.utilities.warmup.
+
+        :param native: build the dumpers of a JSON provider encoding UUID and datetime natively
+        """
+        schema = self.__model_schema__
+        get_schema(schema)
+        get_dumper(schema, native=native)
+        for loader_args in WRITE_LOADERS:
+            get_loader(schema, **loader_args)
+        for relation_schema in self.__relation_schemas__.values():
+            get_dumper(relation_schema, native=native)
+            get_loader(relation_schema, only=['id'])
+
+    def loader_options(self, sub_model_keys) -> list:
+        """
+        Return the loader options of the given relations, using their configured loading strategy.
+
+        :param sub_model_keys: keys of the relations
+        :return: list of sqlalchemy loader options
+        """
+        return self.__model__.loader_options({key: self.__relation_loading__[key] for key in sub_model_keys
+                                              if key in self.__relation_loading__})
+
+    def check_expand(self, expand) -> Optional[tuple]:
+        """
+        Return an error response if any of the requested relations can not be expanded.
+
+        :param expand: keys of the relations to expand
+        :return: (response, status) | None
+        """
+        unknown = [key for key in expand if key not in self.__relation_schemas__]
+        if unknown:
+            return jsonify({'message': f'Can not expand: {", ".join(unknown)}'}), 400
+        return None
+
+    def expand_dump(self, model_objects: list, dumped_objects: list, expand) -> list:
+        """
+        Add the serialized form of the requested relations to the already dumped models (without envelope).
+
+        Relations should be loaded with loader_options(expand) so this does not trigger a query per model.
 
-    def get_model_by_id(self, model_id: UUID):
+        :param model_objects: models
+        :param dumped_objects: serialized forms of the models, in the same order
+        :param expand: keys of the relations to expand
+        :return: dumped_objects
+        """
+        relationships = inspect(self.__model__).relationships
+        for key in expand:
+            relation_schema_class = self.__relation_schemas__[key]
+            many = relationships[key].uselist
+            envelope = relation_schema_class.__envelope__.get('many' if many else 'single')
+            relation_schema = get_dumper(relation_schema_class, native=native_types())
+            for model_object, dumped_object in zip(model_objects, dumped_objects):
+                value = getattr(model_object, key)
+                dumped_object[key] = relation_schema.dump(value, many=many)[envelope] if value is not None else None
+        return dumped_objects
+
+    @replica_read
+    def get_model_by_id(self, model_id: UUID, expand: tuple = (), if_none_match: ETags = None):
         """
         Get model by UUID.
 
+        Without expand, the serialized form is read from and stored in the entity cache of the app (if any), see
+        app.utilities.cache, forms read from a lagging replica are not stored (see is_current()). It also carries an
+        ETag, if it matches if_none_match 304 is returned without loading or serializing the model. Expanded forms have
+        no ETag since relationship changes do not bump 'updated'.
+
         returns 404 model is not found
         :param model_id: model UUID
+        :param expand: keys of the relations to embed in the serialized form
+        :param if_none_match: ETags of the If-None-Match header
         :return: serialized form of model
         """
-        model_object = self.__model__.get(model_id)
+        error = self.check_expand(expand)
+        if error:
+            return error
+        if_none_match = identity_etags(if_none_match)
+        cache = None if expand else current_app.extensions.get('entity_cache')
+        if cache is not None:
+            key = entity_key(self.__model__, model_id)
+            # taken before loading, a write committed meanwhile keeps the (stale) form out of the cache
+            generation = cache.generation(key)
+            cached = cache.get(key)
+            # entries are shared by all services of a model, only use the ones dumped with this service's schema
+            if cached is not None and cached[0] is self.__model_schema__:
+                if if_none_match and if_none_match.contains_weak(cached[2]):
+                    return self.not_modified(cached[2])
+                return cached[1], 200, self.etag_headers(cached[2])
+        if not expand and if_none_match:
+            updated = self.__model__.get_updated(model_id)
+            if updated is None:
+                return {}, 404
+            etag = entity_etag(self.__model__, model_id, updated)
+            if if_none_match.contains_weak(etag):
+                return self.not_modified(etag)
+        model_object = self.__model__.get(model_id, options=self.loader_options(expand))
         if not model_object:
             return {}, 404
-        dump_schema = self.__model_schema__()
-        return dump_schema.dump(model_object)
+        dump_schema = get_dumper(self.__model_schema__, native=native_types())
+        response = dump_schema.dump(model_object)
+        if expand:
+            self.expand_dump([model_object], [response[self.__model_schema__.__envelope__.get('single')]], expand)
+            return response
+        etag = entity_etag(self.__model__, model_id, model_object.updated)
+        if cache is not None and self.is_current(model_object):
+            cache.set_if_generation(key, (self.__model_schema__, response, etag), generation)
+        return response, 200, self.etag_headers(etag)
+
+    def is_current(self, model_object) -> bool:
+        """
+        Check that a model read from a replica is the current version of the primary, before caching its form.
+
+        :param model_object: The model read.
+        :return: True if it was read from the primary or the replica has caught up with it
+        """
+        if not reading_from_replica():
+            return True
+        with primary_reads():
+            return self.__model__.get_updated(model_object.id) == model_object.updated
+
+    @staticmethod
+    def etag_headers(etag: str) -> dict:
+        """
+        Return the response headers carrying the given ETag.
+
+        :param etag: unquoted ETag
+        :return: headers
+        """
+        return {'ETag': quote_etag(etag)}
 
-    def delete_model_by_id(self, model_id: UUID):
+    def not_modified(self, etag: str):
+        """
+        Return the 304 Not Modified response for the given ETag.
+
+        :param etag: unquoted ETag
+        :return: empty response
+        """
+        return '', 304, self.etag_headers(etag)
+
+    def check_if_match(self, model_id: UUID, if_match: ETags) -> tuple[Optional[tuple], Optional[datetime]]:
+        """
+        Check the If-Match header of a write against the current ETag of the model.
+
+        The returned 'updated' should be passed to the write (if_updated) so a concurrent write between the check and
+        the write is detected as well.
+
+        :param model_id: model UUID
+        :param if_match: ETags of the If-Match header
+        :return: (error response, None) if the model is not found (404) or the ETag does not match (412) |
+        (None, 'updated' of the model)
+        """
+        updated = self.__model__.get_updated(model_id)
+        if updated is None:
+            return (jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}),
+                    404), None
+        if not identity_etags(if_match).contains(entity_etag(self.__model__, model_id, updated)):
+            return self.precondition_failed(), None
+        return None, updated
+
+    @staticmethod
+    def precondition_failed():
+        """
+        Return the 412 Precondition Failed response of a write whose If-Match does not match.
+
+        :return: error response
+        """
+        return jsonify({'message': 'The resource has been modified, If-Match does not match its current ETag'}), 412
+
+    def dump_with_etag(self, model_object):
+        """
+        Serialize a model and add its ETag header.
+
+        :param model_object: model
+        :return: serialized form of the model with its ETag header
+        """
+        dump_schema = get_dumper(self.__model_schema__, native=native_types())
+        etag = entity_etag(self.__model__, model_object.id, model_object.updated)
+        return dump_schema.dump(model_object), 200, self.etag_headers(etag)
+
+    def delete_model_by_id(self, model_id: UUID, if_match: ETags = None):
         """
         Delete the model by the given UUID (all deletes are soft deletes)
         :param model_id: model UUID
+        :param if_match: ETags of the If-Match header, if given the model is deleted only if its ETag matches (412)
         :return: {'result': bool}
         """
+        if if_match:
+            error, updated = self.check_if_match(model_id, if_match)
+            if error:
+                return error
+            if not self.__model__.delete(model_id, if_updated=updated):
+                return self.precondition_failed()
+            return {'result': True}
         return {'result': self.__model__.delete(model_id)}
 
     def create_model(self, request_data: dict = None):
-        load_schema = self.__model_schema__(exclude=('id', 'created', 'updated', 'active'))
+        """
+        Create a model, or many models if the data is wrapped in the collection label (see create_models).
+
+        :param request_data: {single label: model} | {many label: [models]}
+        :return: serialized form of the created model
+        """
+        if isinstance(request_data, dict) and self.__model_schema__.__envelope__.get('many') in request_data:
+            return self.create_models(request_data)
+        loader = get_loader(self.__model_schema__, **CREATE_LOADER)
         try:
-            model_object = load_schema.load(request_data)
+            model_object = loader.load(request_data)
         except ValidationError as err:
             return jsonify(err.messages), 400
-        dump_schema = self.__model_schema__()
+        dump_schema = get_dumper(self.__model_schema__, native=native_types())
         return dump_schema.dump(self.__model__.post(model_object))
 
-    def update_model(self, request_data: dict = None):
-        load_schema = self.__model_schema__(exclude=('created', 'updated'))
+    def create_models(self, request_data: dict = None):
+        """
+        Create many models with chunked bulk inserts.
+
+        Every item is validated on its own, valid items are created even if others are not. The result of each item
+        is reported by its index: {'index': i, 'id': id} or {'index': i, 'errors': validation errors}.
+        Status code is 200 if all items are created, 207 if some of them are and 400 if none is.
+
+        Config Variables:
+
+        - BULK_MAX_ITEMS: Maximum number of items in one request, 413 is returned above it.
+        - BULK_INSERT_CHUNK_SIZE: Number of rows inserted by one statement.
+        - BULK_COMMIT_PER_CHUNK: Commit every chunk on its own instead of one transaction for the whole request.
+
+        :param request_data: {many label: [models]}
+        :return: {many label: [results]}
+        """
+        many_key = self.__model_schema__.__envelope__.get('many')
+        items = request_data[many_key]
+        if not isinstance(items, list):
+            return jsonify({many_key: ['Invalid input type.']}), 400
+        max_items = current_app.config.get('BULK_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return jsonify({'message': f'At most {max_items} {many_key} can be created in one request'}), 413
+
+        loader = get_loader(self.__model_schema__, **CREATE_LOADER)
+        loaded_items = loader.load_each(items)
+        ids = iter(self.__model__.post_many(
+            [data for data, _ in loaded_items if data is not None],
+            chunk_size=current_app.config.get('BULK_INSERT_CHUNK_SIZE', 500),
+            commit_per_chunk=current_app.config.get('BULK_COMMIT_PER_CHUNK', False)
+        ))
+        results = list()
+        for index, (data, errors) in enumerate(loaded_items):
+            model_id = next(ids) if data is not None else None
+            if model_id:
+                results.append({'index': index, 'id': str(model_id)})
+            else:
+                results.append({'index': index, 'errors': errors or {'_schema': ['Could not be created.']}})
+        return jsonify({many_key: results}), self.bulk_status(results)
+
+    def update_model(self, request_data: dict = None, if_match: ETags = None):
+        """
+        Update all fields of a model.
+
+        :param request_data: {single label: model}
+        :param if_match: ETags of the If-Match header, if given the model is updated only if its ETag matches (412)
+        :return: serialized form of the updated model
+        """
+        loader = get_loader(self.__model_schema__, **UPDATE_LOADER)
         try:
-            model_object = load_schema.load(request_data)
+            model_object = loader.load(request_data)
         except ValidationError as err:
             return jsonify(err.messages), 400
-        dump_schema = self.__model_schema__()
-        return dump_schema.dump(self.__model__.put(model_object))
+        if if_match:
+            error, updated = self.check_if_match(model_object.id, if_match)
+            if error:
+                return error
+            updated_object = self.__model__.put(model_object, if_updated=updated)
+            if not updated_object:
+                return self.precondition_failed()
+            return self.dump_with_etag(updated_object)
+        updated_object = self.__model__.put(model_object)
+        if not updated_object:
+            dump_schema = get_dumper(self.__model_schema__, native=native_types())
+            return dump_schema.dump(updated_object)
+        return self.dump_with_etag(updated_object)
+
+    def patch_model_by_id(self, model_id: UUID, request_data: dict = None, if_match: ETags = None):
+        """
+        Partially update the model by the given UUID, only the given fields are updated.
+
+        returns 404 model is not found
+        :param model_id: model UUID
+        :param request_data: {single label: fields}
+        :param if_match: ETags of the If-Match header, if given the model is updated only if its ETag matches (412)
+        :return: serialized form of the updated model
+        """
+        loader = get_loader(self.__model_schema__, **PATCH_LOADER)
+        try:
+            data = loader.load_dict(request_data)
+        except ValidationError as err:
+            return jsonify(err.messages), 400
+        updated = None
+        if if_match:
+            error, updated = self.check_if_match(model_id, if_match)
+            if error:
+                return error
+        model_object = self.__model__.patch(model_id, if_updated=updated, **data)
+        if not model_object:
+            return self.precondition_failed() if if_match else ({}, 404)
+        return self.dump_with_etag(model_object)
+
+    def patch_models(self, request_data: dict = None):
+        """
+        Partially update many models in one transaction, each item has the id of a model and the fields to update.
+
+        The result of each item is reported by its index: {'index': i, 'id': id} or {'index': i, 'errors': errors}.
+        Status code is 200 if all items are updated, 207 if some of them are and 400 if none is.
+
+        Config Variables:
+
+        - BULK_MAX_ITEMS: Maximum number of items in one request, 413 is returned above it.
+
+        :param request_data: {many label: [{'id': id, fields}]}
+        :return: {many label: [results]}
+        """
+        many_key = self.__model_schema__.__envelope__.get('many')
+        if not isinstance(request_data, dict) or many_key not in request_data:
+            return jsonify({'_schema': [f'key: {many_key}, is missing in input data']}), 400
+        items = request_data[many_key]
+        if not isinstance(items, list):
+            return jsonify({many_key: ['Invalid input type.']}), 400
+        max_items = current_app.config.get('BULK_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return jsonify({'message': f'At most {max_items} {many_key} can be updated in one request'}), 413
+
+        loader = get_loader(self.__model_schema__, **PATCH_MANY_LOADER)
+        loaded_items = list()
+        for data, errors in loader.load_each(items):
+            if data is not None and data.get('id') is None:
+                data, errors = None, {'id': ['Missing data for required field.']}
+            loaded_items.append((data, errors))
+        updated = iter(self.__model__.patch_many([data for data, _ in loaded_items if data is not None]))
+        results = list()
+        for index, (data, errors) in enumerate(loaded_items):
+            if data is not None and next(updated):
+                results.append({'index': index, 'id': str(data['id'])})
+            elif data is not None:
+                results.append({'index': index, 'errors': {'id': ['Not found.']}})
+            else:
+                results.append({'index': index, 'errors': errors})
+        return jsonify({many_key: results}), self.bulk_status(results)
+
+    @staticmethod
+    def bulk_status(results: list[dict]) -> int:
+        """
+        Status code of a bulk request, 200 if all items succeeded, 207 if some of them did and 400 if none did.
+
+        :param results: per item results, failed items have 'errors'
+        :return: status code
+        """
+        failed = sum(1 for result in results if 'errors' in result)
+        if not failed:
+            return 200
+        if failed < len(results):
+            return 207
+        return 400
+
+    @replica_read
+    def get_all_models(self, limit=10, page=1, cursor: str = None, with_total: bool = False, expand: tuple = (),
+                       if_none_match: ETags = None, query_args: MultiDict = None):
+        """
+        Get a page of models.
+
+        If cursor is None, page based (offset) pagination is used. Otherwise keyset pagination is used, an empty cursor
+        requests the first page and 'next_cursor' is added to the response (None on the last page).
+
+        The models can be filtered and sorted with the filter[column][operator] and sort parameters of query_args, see
+        app.utilities.filtering. Queries that can not use an index are handled per QUERY_UNINDEXED_POLICY (config).
 
-    def get_all_models(self, limit=10, page=1):
-        dump_schema = self.__model_schema__()
-        return dump_schema.dump(self.__model__.get_all(limit=limit, page=page), many=True)
+        Without expand, the page carries an ETag computed from the ids and the latest 'updated' of the loaded models
+        and the page parameters, so no other query is issued. If it matches if_none_match 304 is returned without
+        serializing the page.
 
+        :param limit: number of models in the page, capped to MAX_PAGE_LIMIT (config), see export_models() for reading
+        the whole collection
+        :param page: page number, ignored in cursor mode
+        :param cursor: opaque cursor returned as 'next_cursor' by the previous page
+        :param with_total: add the total number of models as 'total' (costs a COUNT query)
+        :param expand: keys of the relations to embed in the serialized form of each model
+        :param if_none_match: ETags of the If-None-Match header
+        :param query_args: URL parameters holding the filters and the sort order
+        :return: serialized form of the models
+        """
+        error = self.check_expand(expand)
+        if error:
+            return error
+        try:
+            list_query = parse_list_query(self.__model__, get_schema(self.__model_schema__), query_args or MultiDict())
+            keys = list_query.cursor_keys() if list_query.order and cursor is not None else None
+        except QueryError as err:
+            return jsonify({'message': f'Invalid query, {err}'}), 400
+        headers = dict()
+        if list_query.unindexed:
+            policy = current_app.config.get('QUERY_UNINDEXED_POLICY', 'flag')
+            if policy == 'reject':
+                return jsonify({'message': f'Query can not use an index, {list_query.unindexed}'}), 400
+            if policy == 'flag':
+                app_logger.warning(f'unindexed query on {self.__model__.__tablename__}: {list_query.unindexed}')
+                headers['X-Query-Unindexed'] = list_query.unindexed
+        limit = min(max(limit, 1), current_app.config.get('MAX_PAGE_LIMIT', 100))
+        if_none_match = identity_etags(if_none_match)
+        criteria = list_query.criteria
+        options = self.loader_options(expand)
+        if cursor is None:
+            model_object_list = self.__model__.get_all(limit=limit, page=page, options=options, criteria=criteria,
+                                                       order=list_query.order)
+            page_args = ('page', page, limit)
+        else:
+            order = list_query.order or self.__model__.__keyset_order__
+            keys = keys or [key for key, _ in order]
+            try:
+                after = decode_cursor(cursor, keys) if cursor else None
+            except ValueError as err:
+                return jsonify({'message': f'Invalid cursor, {err}'}), 400
+            model_object_list, last = self.__model__.get_all_after(limit=limit, after=after, order=order,
+                                                                   options=options, criteria=criteria)
+            next_cursor = encode_cursor(keys, last) if last else None
+            page_args = ('cursor', cursor, limit, next_cursor)
+        total = self.__model__.count(criteria=criteria) if with_total else None
+        etag = None
+        if not expand:
+            etag = collection_etag(self.__model__, model_object_list, *page_args, total, list_query.key)
+            if if_none_match and if_none_match.contains_weak(etag):
+                return self.not_modified(etag)
+        dump_schema = get_dumper(self.__model_schema__, native=native_types())
+        response = dump_schema.dump(model_object_list, many=True)
+        if cursor is not None:
+            response['next_cursor'] = next_cursor
+        if expand:
+            self.expand_dump(model_object_list, response[self.__model_schema__.__envelope__.get('many')], expand)
+        if with_total:
+            response['total'] = total
+        if etag:
+            headers.update(self.etag_headers(etag))
+        if headers:
+            return response, 200, headers
+        return response
+
+    def export_models(self, ndjson: bool = False):
+        """
+        Stream all models in one response.
+
+        Models are read with BaseModel.iterate() and serialized one by one, the serialized models are written to the
+        response EXPORT_BATCH_SIZE (config) at a time so the memory used does not depend on the size of the collection.
+        The body is the serialized form of the collection ({many label: [models]}) or, if ndjson is True, one
+        serialized model (without envelope) per line.
+
+        :param ndjson: write newline delimited json instead of a json document
+        :return: streaming response
+        """
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+        dump_one = get_dumper(self.__model_schema__, native=native_types()).dump_one
+        json_dumps = current_app.json.dumps
+        many_key = self.__model_schema__.__envelope__.get('many')
+
+        def write(batch: list, first: bool) -> str:
+            if ndjson:
+                return '\n'.join(batch) + '\n'
+            return ('' if first else ',') + ','.join(batch)
+
+        def generate():
+            if not ndjson:
+                yield '{' + json_dumps(many_key) + ':['
+            batch = list()
+            first = True
+            for model_object in self.__model__.iterate(batch_size=batch_size):
+                batch.append(json_dumps(dump_one(model_object)))
+                if len(batch) >= batch_size:
+                    yield write(batch, first)
+                    first = False
+                    batch = list()
+            if batch:
+                yield write(batch, first)
+            if not ndjson:
+                yield ']}'
+
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
+    @replica_read
+    def search_models(self, query: str, limit: int = 10, cursor: str = None):
+        """
+        Full-text search of the models, see app.utilities.search.
+
+        Results are ranked (each serialized model gets its 'score', lower is better) and paginated with a keyset on
+        (score, id), the response contains a 'next_cursor' (None on the last page).
+
+        :param query: words to search
+        :param limit: number of models in the page, capped to MAX_PAGE_LIMIT (config)
+        :param cursor: opaque cursor returned as 'next_cursor' by the previous page
+        :return: serialized form of the models
+        """
+        if not query or not query.strip():
+            return jsonify({'message': "The 'q' URL parameter is required"}), 400
+        backend = current_app.extensions.get('search')
+        if backend is None or not self.__model__.__search_fields__:
+            return jsonify({'message': 'Search is not available for this resource'}), 404
+        limit = min(max(limit, 1), current_app.config.get('MAX_PAGE_LIMIT', 100))
+        keys = ['score', 'id']
+        try:
+            after = decode_cursor(cursor, keys) if cursor else None
+        except ValueError as err:
+            return jsonify({'message': f'Invalid cursor, {err}'}), 400
+        results = backend.search(self.__model__, query, limit=limit + 1, after=after)
+        next_cursor = encode_cursor(keys, results[limit - 1][::-1]) if len(results) > limit else None
+        results = results[:limit]
+        model_objects = {model_object.id: model_object
+                         for model_object in self.__model__.get_many([UUID(id) for id, _ in results])}
+        dump_one = get_dumper(self.__model_schema__, native=native_types()).dump_one
+        models = list()
+        for id, score in results:
+            model_object = model_objects.get(UUID(id))
+            if model_object is not None:
+                dumped_object = dump_one(model_object)
+                dumped_object['score'] = score
+                models.append(dumped_object)
+        return {self.__model_schema__.__envelope__.get('many'): models, 'next_cursor': next_cursor}
+
+    @replica_read
+    def get_hierarchy(self, model_id: UUID, direction: str, max_depth: int = None):
+        """
+        Get the ancestors or the descendants of a model in its hierarchy, see BaseModel.ancestors() and
+        BaseModel.descendants(). Each serialized model gets its 'depth' relative to the given model.
+
+        returns 404 model is not found
+        :param model_id: model UUID
+        :param direction: 'ancestors' | 'descendants'
+        :param max_depth: maximum number of levels to walk, capped to HIERARCHY_MAX_DEPTH (config)
+        :return: serialized form of the models
+        """
+        depth_limit = current_app.config.get('HIERARCHY_MAX_DEPTH', 32)
+        max_depth = depth_limit if max_depth is None else min(max(max_depth, 1), depth_limit)
+        if direction == 'ancestors':
+            rows = self.__model__.ancestors(model_id, max_depth=max_depth)
+        else:
+            rows = self.__model__.descendants(model_id, max_depth=max_depth)
+        if rows is None:
+            return jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}), 404
+        dump_one = get_dumper(self.__model_schema__, native=native_types()).dump_one
+        models = list()
+        for model_object, depth in rows:
+            dumped_object = dump_one(model_object)
+            dumped_object['depth'] = depth
+            models.append(dumped_object)
+        return {self.__model_schema__.__envelope__.get('many'): models}
+
+    @replica_read
     def get_sub_model(self, model_id: UUID, sub_model_key: str):
         dump_schema_class = self.__relation_schemas__.get(sub_model_key, None)
         if not dump_schema_class:
             return jsonify({
                 'message': 'No schema found for the given resource'
             }), 500
-        dump_schema = dump_schema_class()
-        model = self.__model__.get(model_id)
+        dump_schema = get_dumper(dump_schema_class, native=native_types())
+        model = self.__model__.get(model_id, options=self.loader_options([sub_model_key]))
         if not model:
             return jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}), 404
         sub_model_list = getattr(model, sub_model_key)
@@ -101,13 +656,14 @@ class BaseService:
             }), 500
 
         many = self.__relation_many__.get(sub_model_key, False)
-        dump_schema = relation_schema_class()
-        load_schema = relation_schema_class(only=['id'], many=many)
-        sub_resource_list = load_schema.load(request_data, many=many)
+        dump_schema = get_dumper(relation_schema_class, native=native_types())
+        loader = get_loader(relation_schema_class, only=['id'])
+        sub_resource_list = loader.load(request_data, many=many)
 
-        model = self.__model__.get(model_id)
+        model = self.__model__.get(model_id, options=self.loader_options([sub_model_key]))
         if not model:
             return jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}), 404
+        changed_ids = self.sub_model_ids(getattr(model, sub_model_key))
         if many:
             sub_resources = list()
             for sub_resource_instance in sub_resource_list:
@@ -121,11 +677,29 @@ class BaseService:
                 setattr(model, sub_model_key, sub_resource)
 
         put_result = self.__model__.put(model)
+        if put_result:
+            changed_ids.update(self.sub_model_ids(getattr(model, sub_model_key)))
+            self.__relation_models__[sub_model_key].send_changed(changed_ids)
         return dump_schema.dump(getattr(model, sub_model_key), many=many)
 
+    @staticmethod
+    def sub_model_ids(sub_models) -> set:
+        """
+        Return the ids of the sub-model(s) of a relationship.
+
+        :param sub_models: list of sub-models | sub-model | None
+        :return: set of ids
+        """
+        if sub_models is None:
+            return set()
+        if isinstance(sub_models, BaseModel):
+            return {sub_models.id}
+        return {sub_model.id for sub_model in sub_models}
+
+    @replica_read
     def get_sub_model_by_id(self, model_id: UUID, sub_model_id: UUID, sub_model_key: str):
         many = self.__relation_many__.get(sub_model_key, False)
-        model = self.__model__.get(model_id)
+        model = self.__model__.get(model_id, options=self.loader_options([sub_model_key]))
         if not model:
             return jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}), 404
         relation_schema_class = self.__relation_schemas__.get(sub_model_key, None)
@@ -133,7 +707,7 @@ class BaseService:
             return jsonify({
                 'message': 'No schema found for the given resource'
             }), 500
-        dump_schema = relation_schema_class()
+        dump_schema = get_dumper(relation_schema_class, native=native_types())
         sub_resource_list = getattr(model, sub_model_key)
         if sub_resource_list:
             if many:
@@ -149,7 +723,7 @@ class BaseService:
 
     def delete_sub_model_by_id(self, model_id: UUID, sub_model_id: UUID, sub_model_key: str):
         many = self.__relation_many__.get(sub_model_key, False)
-        model = self.__model__.get(model_id)
+        model = self.__model__.get(model_id, options=self.loader_options([sub_model_key]))
         if not model:
             return jsonify({'message': f'{self.__model_schema__.__envelope__.get("single", "")} not found'}), 404
         sub_resource_list = getattr(model, sub_model_key)
@@ -172,6 +746,7 @@ class BaseService:
             put_result = self.__model__.put(model)
 
             if put_result:
+                self.__relation_models__[sub_model_key].send_changed([sub_model_id])
                 return jsonify({'response': True})
             else:
                 return jsonify({'response': False}), 400
@@ -0,0 +1,12 @@
+from flask import Flask
+
+from app.commands.catalog import catalog_cli
+
+
+def register_commands(app: Flask):
+    """
+    Register the CLI commands of the app (flask <group> <command>).
+
+    :param app: The flask app.
+    """
+    app.cli.add_command(catalog_cli)
@@ -0,0 +1,358 @@
+"""
+'flask catalog' commands, bulk export and import of the catalog: categories, products and the links between them.
+
+File formats:
+
+- ndjson: One record per line wrapped in its kind, the single label of the schemas and 'product_category' for links,
+  i.e. {"category": {...}}, {"product": {...}}, {"product_category": {"product_code": ..., "category_code": ...}}.
+  One file may contain all kinds, links are resolved after all categories and products are imported.
+- csv: One kind per file (--entity), the header holds the field names. None is written as an empty cell and empty
+  cells of nullable fields are read as missing.
+
+Records carry the fields loaded by the schemas ('created', 'updated' and 'active' are not exported), links refer to
+products and categories by their 'code'.
+"""
+
+import csv
+import json
+import sys
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from time import monotonic
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models.product.product import Product
+from app.models.product.product import ProductSchema
+from app.models.product.product import Category
+from app.models.product.product import CategorySchema
+from app.models.product.product import product_category
+from app.models.serializer import get_schema
+from app.models.serializer import get_dumper
+from app.models.serializer import get_loader
+from app.utilities.search import searchable_models
+
+catalog_cli = AppGroup('catalog', help='Bulk export and import of the catalog.')
+
+ENTITIES = {
+    'category': (Category, CategorySchema),
+    'product': (Product, ProductSchema),
+}
+LINK = 'product_category'
+LINK_FIELDS = ('product_code', 'category_code')
+KINDS = ('category', 'product', LINK)  # export order, categories and products come before their links
+EXCLUDE = ('created', 'updated', 'active')
+
+
+class Progress:
+    """
+    Counts the processed rows and reports them with the throughput on stderr, at most every 'interval' seconds.
+    """
+
+    def __init__(self, label: str, interval: float = 2.0, max_errors: int = 20):
+        self.label = label
+        self.interval = interval
+        self.max_errors = max_errors
+        self.started = monotonic()
+        self.reported = self.started
+        self.read = 0
+        self.invalid = 0
+        self.failed = 0
+        self.written = dict()
+
+    def count(self, kind: str, value: int = 1):
+        self.written[kind] = self.written.get(kind, 0) + value
+
+    def error(self, row: int, errors):
+        self.invalid += 1
+        if self.invalid <= self.max_errors:
+            click.echo(f'row {row}: {json.dumps(errors)}', err=True)
+
+    def report(self, final: bool = False):
+        now = monotonic()
+        if not final and now - self.reported < self.interval:
+            return
+        self.reported = now
+        elapsed = max(now - self.started, 1e-9)
+        written = sum(self.written.values())
+        kinds = ', '.join(f'{kind}: {count}' for kind, count in self.written.items())
+        message = f'{self.label}: {written} written ({kinds})'
+        if self.read:
+            message += f', {self.read} read, {self.invalid} invalid, {self.failed} failed'
+        click.echo(f'{message}, {written / elapsed:.0f} rows/s' + (f' in {elapsed:.1f}s' if final else ''), err=True)
+
+
+@contextmanager
+def open_file(path: str, mode: str):
+    if path == '-':
+        yield sys.stdout if 'w' in mode else sys.stdin
+        return
+    with open(path, mode, newline='', encoding='utf-8') as file:
+        yield file
+
+
+def csv_fields(kind: str) -> list[str]:
+    """
+    Return the CSV columns of a kind of record.
+
+    :param kind: 'category' | 'product' | 'product_category'
+    :return: field names
+    """
+    if kind == LINK:
+        return list(LINK_FIELDS)
+    return list(get_schema(ENTITIES[kind][1], exclude=EXCLUDE).dump_fields)
+
+
+def nullable_fields(kind: str) -> frozenset:
+    """
+    Return the fields of a kind of record that accept None.
+
+    :param kind: 'category' | 'product' | 'product_category'
+    :return: field names
+    """
+    if kind == LINK:
+        return frozenset()
+    schema = get_schema(ENTITIES[kind][1], exclude=EXCLUDE)
+    return frozenset(name for name, field_obj in schema.load_fields.items() if field_obj.allow_none)
+
+
+def iter_records(kind: str, batch_size: int = 1000):
+    """
+    Iterate over the serialized records of a kind, streaming them from the DB.
+
+    :param kind: 'category' | 'product' | 'product_category'
+    :param batch_size: Number of rows fetched at a time.
+    :return: iterator of dicts
+    """
+    if kind == LINK:
+        statement = (select(Product.code, Category.code)
+                     .select_from(product_category)
+                     .join(Product, Product.id == product_category.c.product_id)
+                     .join(Category, Category.id == product_category.c.category_id)
+                     .where(Product.active == True, Category.active == True)
+                     .execution_options(yield_per=batch_size))
+        for product_code, category_code in db.session.execute(statement):
+            yield {'product_code': product_code, 'category_code': category_code}
+        return
+    model, schema = ENTITIES[kind]
+    dump_one = get_dumper(schema, exclude=EXCLUDE).dump_one
+    for model_object in model.iterate(batch_size=batch_size):
+        yield dump_one(model_object)
+
+
+@catalog_cli.command('export')
+@click.argument('output', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--entity', type=click.Choice(('all',) + KINDS), default='all', show_default=True,
+              help='Kind of records to export, CSV files hold a single kind.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=1000, show_default=True,
+              help='Rows fetched from the DB at a time.')
+def export_command(output: str, file_format: str, entity: str, batch_size: int):
+    """
+    Export the catalog to OUTPUT ('-' for stdout).
+    """
+    if file_format == 'csv' and entity == 'all':
+        raise click.UsageError('CSV files hold a single kind of records, use --entity.')
+    kinds = KINDS if entity == 'all' else (entity,)
+    progress = Progress('export')
+    with open_file(output, 'w') as file:
+        for kind in kinds:
+            if file_format == 'csv':
+                fields = csv_fields(kind)
+                writer = csv.writer(file)
+                writer.writerow(fields)
+                for record in iter_records(kind, batch_size):
+                    writer.writerow(['' if record.get(field) is None else record[field] for field in fields])
+                    progress.count(kind)
+                    progress.report()
+            else:
+                for record in iter_records(kind, batch_size):
+                    file.write(json.dumps({kind: record}, separators=(',', ':')) + '\n')
+                    progress.count(kind)
+                    progress.report()
+    progress.report(final=True)
+
+
+def validate_rows(task: tuple) -> list[tuple]:
+    """
+    Parse and validate a chunk of rows, runs in the worker processes of the import.
+
+    :param task: (file format, kind of CSV rows, number of the first row, raw rows, CSV header)
+    :return: list of (row number, kind, validated data, None) | (row number, kind, None, errors)
+    """
+    file_format, entity, start, rows, fields = task
+    results = list()
+    for row_number, raw in enumerate(rows, start=start):
+        if file_format == 'csv':
+            kind = entity
+            nullable = nullable_fields(kind)
+            record = {field: value for field, value in zip(fields, raw) if value != '' or field not in nullable}
+        else:
+            try:
+                document = json.loads(raw)
+            except ValueError as err:
+                results.append((row_number, None, None, {'_schema': [f'Invalid json: {err}']}))
+                continue
+            if not isinstance(document, dict) or len(document) != 1 or next(iter(document)) not in KINDS:
+                results.append((row_number, None, None, {'_schema': [f'Expected one of the keys: {", ".join(KINDS)}']}))
+                continue
+            kind, record = next(iter(document.items()))
+
+        if kind == LINK:
+            if not isinstance(record, dict):
+                results.append((row_number, kind, None, {'_schema': ['Invalid input type.']}))
+                continue
+            errors = {field: ['Missing data for required field.'] for field in LINK_FIELDS
+                      if not isinstance(record.get(field), str) or not record.get(field)}
+            if errors:
+                results.append((row_number, kind, None, errors))
+            else:
+                results.append((row_number, kind, {field: record[field] for field in LINK_FIELDS}, None))
+            continue
+        data, errors = get_loader(ENTITIES[kind][1], exclude=EXCLUDE).load_each([record])[0]
+        results.append((row_number, kind, data, errors))
+    return results
+
+
+def read_tasks(file, file_format: str, entity: str, chunk_size: int):
+    """
+    Split the input file in chunks of raw rows to validate.
+
+    :return: iterator of validate_rows() tasks
+    """
+    if file_format == 'csv':
+        reader = csv.reader(file)
+        fields = next(reader, [])
+        rows = reader
+    else:
+        fields = None
+        rows = (line for line in file if line.strip())
+    start = 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield file_format, entity, start, chunk, fields
+        start += len(chunk)
+
+
+def validate_tasks(tasks, workers: int):
+    """
+    Run validate_rows() on the tasks, in a pool of 'workers' processes if workers > 1, keeping the order of the tasks.
+
+    At most two tasks per worker are in flight so large files are not read into memory ahead of the inserts.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield validate_rows(task)
+        return
+    # multiprocessing is only imported by the imports using several workers, not by every start of the app
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(validate_rows, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def insert_links(links: list[dict], chunk_size: int) -> tuple[int, int]:
+    """
+    Insert product_category rows, resolving the products and categories by their code.
+
+    :param links: {'product_code': ..., 'category_code': ...} records
+    :param chunk_size: Number of rows inserted by one statement.
+    :return: (number of inserted links, number of links whose product or category was not found)
+    """
+    product_ids = dict(db.session.execute(select(Product.code, Product.id).where(Product.active == True)).all())
+    category_ids = dict(db.session.execute(select(Category.code, Category.id).where(Category.active == True)).all())
+    rows = list()
+    for link in links:
+        product_id = product_ids.get(link['product_code'])
+        category_id = category_ids.get(link['category_code'])
+        if product_id and category_id:
+            rows.append({'product_id': product_id, 'category_id': category_id})
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(product_category), rows[start:start + chunk_size])
+        db.session.commit()
+    return len(rows), len(links) - len(rows)
+
+
+@catalog_cli.command('import')
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--entity', type=click.Choice(KINDS), help='Kind of the records of a CSV file.')
+@click.option('--workers', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Processes used to parse and validate the rows, 0 or 1 to do it in this process.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, show_default=True,
+              help='Rows validated per task and inserted per statement (and transaction).')
+@click.option('--new-ids', is_flag=True, help='Generate new ids instead of using the ids of the file, parent_id '
+                                               'references between products are not remapped.')
+@click.option('--max-errors', type=click.IntRange(min=0), default=20, show_default=True,
+              help='Number of invalid rows reported in detail.')
+def import_command(input_path: str, file_format: str, entity: str, workers: int, chunk_size: int, new_ids: bool,
+                   max_errors: int):
+    """
+    Import the catalog from INPUT_PATH ('-' for stdin).
+
+    Rows are validated with the schemas of the models, valid categories and products are inserted with chunked bulk
+    inserts (each chunk is committed on its own) and the links are inserted at the end. Invalid rows are reported and
+    skipped.
+    """
+    if file_format == 'csv' and not entity:
+        raise click.UsageError('CSV files hold a single kind of records, use --entity.')
+    progress = Progress('import', max_errors=max_errors)
+    buffers = {kind: list() for kind in ENTITIES}
+    links = list()
+
+    def flush(kind: str):
+        model = ENTITIES[kind][0]
+        ids = model.post_many(buffers[kind], chunk_size=chunk_size, commit_per_chunk=True, keep_ids=not new_ids)
+        created = sum(1 for id in ids if id)
+        progress.count(kind, created)
+        progress.failed += len(ids) - created
+        buffers[kind] = list()
+
+    with open_file(input_path, 'r') as file:
+        for results in validate_tasks(read_tasks(file, file_format, entity, chunk_size), workers):
+            for row_number, kind, data, errors in results:
+                progress.read += 1
+                if errors:
+                    progress.error(row_number, errors)
+                elif kind == LINK:
+                    links.append(data)
+                else:
+                    buffers[kind].append(data)
+                    if len(buffers[kind]) >= chunk_size:
+                        flush(kind)
+            progress.report()
+    for kind in ENTITIES:
+        if buffers[kind]:
+            flush(kind)
+    if links:
+        inserted, unresolved = insert_links(links, chunk_size)
+        progress.count(LINK, inserted)
+        if unresolved:
+            progress.failed += unresolved
+            click.echo(f'{unresolved} product_category link(s) refer to unknown codes', err=True)
+    progress.report(final=True)
+
+
+@catalog_cli.command('rebuild-search')
+def rebuild_search_command():
+    """
+    Rebuild the full-text search index of every searchable model from scratch.
+    """
+    backend = current_app.extensions['search']
+    for model in searchable_models():
+        started = monotonic()
+        indexed = backend.rebuild(model)
+        click.echo(f'{model.__tablename__}: {indexed} indexed with {backend.name} in {monotonic() - started:.1f}s')
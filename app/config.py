@@ -4,6 +4,91 @@ from flask import Flask
 class DefaultConfig:
     env_name = 'DEFAULT'
 
+    # database engine profile, see app.utilities.database
+    DATABASE_POOL_SIZE = 5
+    DATABASE_MAX_OVERFLOW = 10
+    DATABASE_POOL_TIMEOUT = 30
+    DATABASE_POOL_RECYCLE = -1
+    DATABASE_POOL_PRE_PING = False
+    DATABASE_STATEMENT_CACHE_SIZE = 500
+    DATABASE_ISOLATION_LEVEL = None
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+    }
+
+    # read replicas of the GET endpoints (keys of SQLALCHEMY_BINDS), see app.utilities.database.replicas. The entity
+    # cache stays on: a form read from a replica costs a primary key lookup on the primary before it is cached, and is
+    # not cached while the replica lags behind the primary
+    DATABASE_READ_REPLICAS = ()
+    DATABASE_REPLICA_POLICY = 'round_robin'
+    DATABASE_REPLICA_RETRY_AFTER = 30
+    DATABASE_READ_YOUR_WRITES = 5
+
+    # audit log (IncomingAPI) writer, see app.utilities.logging.audit_log.AuditLogWriter
+    AUDIT_LOG_ASYNC = True
+    AUDIT_LOG_QUEUE_SIZE = 10000
+    AUDIT_LOG_BATCH_SIZE = 100
+    AUDIT_LOG_FLUSH_INTERVAL = 1.0
+    AUDIT_LOG_OVERFLOW_POLICY = 'drop_oldest'
+    AUDIT_LOG_BLOCK_TIMEOUT = 0.5
+    AUDIT_LOG_SAMPLE_RATE = 10
+
+    # per request SQL instrumentation, see app.utilities.logging.timing
+    SERVER_TIMING_HEADER = True
+    SQL_STATEMENT_WARNING_THRESHOLD = 50
+
+    # GET /metrics, see app.utilities.metrics
+    METRICS_ENABLED = True
+    METRICS_DIR = None
+    METRICS_FLUSH_INTERVAL = 1.0
+
+    # build schemas, routes and statements at startup instead of on the first requests, see app.utilities.warmup
+    WARM_UP = False
+
+    # JSON provider of the responses: 'auto', 'orjson' or 'stdlib', see app.utilities.jsonprovider
+    JSON_BACKEND = 'auto'
+
+    # negotiated Content-Encoding of the responses, see app.utilities.compression
+    COMPRESSION_ENABLED = True
+    COMPRESSION_ALGORITHMS = ('zstd', 'gzip', 'deflate')
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_LEVEL = 6
+    COMPRESSION_ZSTD_LEVEL = 3
+    COMPRESSION_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain')
+    COMPRESSION_CACHE_SIZE = 1000
+
+    # ASGI serving (run:create_asgi_app) and its asyncio engine, see app.utilities.asgi and app.utilities.database
+    ASGI_ASYNC_READS = True
+    ASYNC_DATABASE_URL = None
+
+    # bulk create, see app.blueprints.service.BaseService.create_models
+    BULK_MAX_ITEMS = 10000
+    BULK_INSERT_CHUNK_SIZE = 500
+    BULK_COMMIT_PER_CHUNK = False
+
+    # maximum 'limit' of GET /models, use GET /models/export to read a whole collection
+    MAX_PAGE_LIMIT = 100
+    # rows fetched and written at a time by GET /models/export
+    EXPORT_BATCH_SIZE = 1000
+
+    # what to do with list queries (filter / sort) that can not use an index: 'allow', 'flag' or 'reject', see
+    # app.utilities.filtering
+    QUERY_UNINDEXED_POLICY = 'flag'
+
+    # maximum number of levels walked by GET /models/id/ancestors | descendants
+    HIERARCHY_MAX_DEPTH = 32
+
+    # full-text search backend of GET /models/search, see app.utilities.search
+    SEARCH_BACKEND = 'auto'
+
+    # serialized entities cache of GET /models/id, see app.utilities.cache
+    ENTITY_CACHE_BACKEND = 'lru'
+    ENTITY_CACHE_MAX_SIZE = 10000
+    ENTITY_CACHE_TTL = 300
+
 
 class Development(DefaultConfig):
     env_name = 'DEVELOP'
@@ -12,7 +97,23 @@ class Development(DefaultConfig):
 class Test(DefaultConfig):
     env_name = 'TEST'
     TESTING = True
+    AUDIT_LOG_ASYNC = False
 
 
 class Production(DefaultConfig):
     env_name = 'PRODUCTION'
+
+    DATABASE_POOL_SIZE = 10
+    DATABASE_MAX_OVERFLOW = 20
+    DATABASE_POOL_RECYCLE = 1800
+    DATABASE_POOL_PRE_PING = True
+    DATABASE_STATEMENT_CACHE_SIZE = 1200
+    WARM_UP = True
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    }
@@ -1,5 +1,23 @@
+from flask import g
+from flask import has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_marshmallow import Marshmallow
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """
+    Session sending the statements of replica reads to the read replica chosen for them (g.read_bind, see
+    app.utilities.database.replicas), everything else (and every flush) goes to the binds of flask-sqlalchemy.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            key = g.get('read_bind')
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 ma = Marshmallow()
@@ -1,4 +1,5 @@
 import copy
+import logging
 from datetime import datetime
 from uuid import UUID
 from uuid import uuid4
@@ -9,10 +10,39 @@ from marshmallow import pre_load
 from marshmallow import post_dump
 from marshmallow import ValidationError
 from sqlalchemy import select
+from sqlalchemy import insert
+from sqlalchemy import update
 from sqlalchemy import inspect
+from sqlalchemy import func
+from sqlalchemy import tuple_
+from sqlalchemy import and_
+from sqlalchemy import or_
+from sqlalchemy import literal
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import declared_attr
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import subqueryload
+from sqlalchemy.orm import lazyload
+from sqlalchemy.orm import raiseload
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.extensions import db
 from app.extensions import ma
+from app.models.signals import model_changed
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+LOADING_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'subquery': subqueryload,
+    'lazy': lazyload,
+    'raise': raiseload,
+}
 
 
 class BaseModel(db.Model):
@@ -41,10 +71,37 @@ class BaseModel(db.Model):
     - __patch_ignore_set__: Attributes in this set will be skipped during updates with patch method. Initially this list
     is a deep copy of __put_ignore_set__. By-default it contains 'id', 'created', 'updated' and 'active'.
 
+    - __keyset_order__: Default sort order of keyset (cursor) pagination as (column, descending) pairs, the last column
+    should be unique. By-default it is ('created', 'id') ascending, backed by an (active, created, id) index. An
+    (active, updated) index backs filtering and sorting on 'updated'.
+
+    - __hierarchy_parent_key__: Name of the (indexed) column referencing the parent object of the same model, if the
+    model is a hierarchy (tree). Enables ancestors() and descendants() and adds a (parent key, active) index. By-default
+    it is None.
+
+    - __search_fields__: Names of the text columns indexed for full-text search, see app.utilities.search. By-default it
+    is None (not searchable).
+
+    - __filter_fields__: Names of the columns list endpoints can filter and sort by, see app.utilities.filtering.
+    By-default it is None, meaning all columns but 'active'.
+
     """
     __abstract__ = True
     __put_ignore_set__ = {'id', 'created', 'updated', 'active'}
     __patch_ignore_set__ = copy.deepcopy(__put_ignore_set__)
+    __keyset_order__ = (('created', False), ('id', False))
+    __hierarchy_parent_key__ = None
+    __search_fields__ = None
+    __filter_fields__ = None
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        indexes = (db.Index(f'ix_{cls.__tablename__}_active_created_id', 'active', 'created', 'id'),
+                   db.Index(f'ix_{cls.__tablename__}_active_updated', 'active', 'updated'))
+        if cls.__hierarchy_parent_key__:
+            parent_key = cls.__hierarchy_parent_key__
+            indexes += (db.Index(f'ix_{cls.__tablename__}_{parent_key}_active', parent_key, 'active'),)
+        return indexes
 
     id: db.Mapped[UUID] = db.mapped_column(
         primary_key=True,
@@ -110,34 +167,134 @@ class BaseModel(db.Model):
             print(e)
             db.session.rollback()
             return None
+        cls.send_changed([inspect(model_object).identity[0]])
         return model_object
 
     @classmethod
-    def get(cls, id: UUID) -> Optional[object]:
+    def post_many(cls, items: list[dict], chunk_size: int = 500, commit_per_chunk: bool = False,
+                  keep_ids: bool = False) -> list[Optional[UUID]]:
+        """
+        Create new model objects in the DB with chunked bulk INSERT statements.
+
+        Ids are generated here (unless keep_ids is True and the item has one), other attributes missing from an item
+        get their column defaults. Keys that are not columns of the model are ignored. By-default all chunks are
+        inserted in one transaction, if commit_per_chunk is True each chunk is committed on its own so a failing chunk
+        does not roll back the previous ones.
+        If any exception happens, calls rollback() method of sqlalchemy.
+
+        :param items: Column names of the objects and their respective value.
+        :param chunk_size: Number of objects inserted by one statement.
+        :param commit_per_chunk: Commit after every chunk instead of once at the end.
+        :param keep_ids: Use the 'id' of the items that have one, i.e. when importing data exported from another DB.
+        :return: Ids of the created objects, None for objects that could not be created
+        """
+        columns = {column.key for column in inspect(cls).column_attrs} - {'id'}
+        rows = [dict({key: value for key, value in item.items() if key in columns},
+                     id=(item.get('id') if keep_ids else None) or uuid4()) for item in items]
+        ids = [row['id'] for row in rows]
+        failed = set()
+        chunk_size = max(chunk_size, 1)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                db.session.execute(insert(cls), chunk)
+                if commit_per_chunk:
+                    db.session.commit()
+            except SQLAlchemyError as e:
+                app_logger.error(f'failed to insert {len(chunk)} {cls.__name__} object(s): {getattr(e, "orig", e)}')
+                db.session.rollback()
+                if not commit_per_chunk:
+                    return [None] * len(ids)
+                failed.update(row['id'] for row in chunk)
+        if not commit_per_chunk:
+            try:
+                db.session.commit()
+            except SQLAlchemyError as e:
+                app_logger.error(f'failed to insert {len(ids)} {cls.__name__} object(s): {getattr(e, "orig", e)}')
+                db.session.rollback()
+                return [None] * len(ids)
+        cls.send_changed([id for id in ids if id not in failed])
+        return [None if id in failed else id for id in ids]
+
+    @classmethod
+    def get(cls, id: UUID, options: list = None) -> Optional[object]:
         """
         Retrieve the object associated with the given id from DB.
 
         :param id: The id of the object on DB.
+        :param options: sqlalchemy loader options (i.e. relationship loading strategies), see loader_options().
         :return: Retrieved object from DB | None
         """
-        model_object = db.session.scalar(select(cls).where(cls.id == id).where(cls.active == True))
+        statement = select(cls).where(cls.id == id).where(cls.active == True)
+        if options:
+            statement = statement.options(*options)
+        model_object = db.session.scalar(statement)
         return model_object
 
     @classmethod
-    def patch(cls, id: UUID, **kwargs) -> Optional[object]:
+    def get_many(cls, ids: list[UUID], options: list = None) -> list[object]:
+        """
+        Retrieve the active objects having the given ids from DB with one statement.
+
+        :param ids: The ids of the objects on DB.
+        :param options: sqlalchemy loader options, see loader_options().
+        :return: List of the objects found, in no particular order
+        """
+        if not ids:
+            return list()
+        statement = select(cls).where(cls.id.in_(ids)).where(cls.active == True)
+        if options:
+            statement = statement.options(*options)
+        return list(db.session.scalars(statement))
+
+    @classmethod
+    def loader_options(cls, strategies: dict[str, str]) -> list:
+        """
+        Build sqlalchemy loader options for the given relationships.
+
+        Strategies are the keys of LOADING_STRATEGIES: 'selectin' and 'subquery' load the relationship of all the
+        retrieved objects with one extra query, 'joined' loads it in the same query, 'lazy' loads it on first access
+        and 'raise' forbids loading it.
+
+        :param strategies: {relationship key: strategy}
+        :return: List of loader options
+        :raises ValueError If a key is not a relationship of the model or a strategy is unknown.
+        """
+        relationships = inspect(cls).relationships
+        options = list()
+        for key, strategy in strategies.items():
+            if key not in relationships:
+                raise ValueError(f'{key} is not a relationship of {cls.__name__}')
+            if strategy not in LOADING_STRATEGIES:
+                raise ValueError(f'unknown loading strategy: {strategy}, expected one of {tuple(LOADING_STRATEGIES)}')
+            options.append(LOADING_STRATEGIES[strategy](getattr(cls, key)))
+        return options
+
+    @classmethod
+    def patch(cls, id: UUID, if_updated: datetime = None, **kwargs) -> Optional[object]:
         """
         Update the object having the id given on DB.
 
         Only given columns (attributes) in kwargs will be updated, rest of the columns will remain intact.
+        If all given keys are plain columns the update is done with a single UPDATE statement (see _update()),
+        otherwise (e.g. relationships) the object is loaded and updated through the ORM.
         If any exception happens, calls rollback() method of sqlalchemy.
 
         :param id: The id of the object on DB.
+        :param if_updated: If given, the object is updated only if its 'updated' column still has this value.
         :param kwargs: Columns of the object and their respective value.
         :return: Updated object on DB | None
         """
+        values = {key: value for key, value in kwargs.items() if key not in cls.__patch_ignore_set__}
+        column_keys = {column.key for column in inspect(cls).column_attrs}
+        if values and set(values) <= column_keys:
+            return cls._update(id, values, if_updated=if_updated)
+
         model_object = cls.get(id)
         if not model_object:
             return None
+        if if_updated is not None and model_object.updated != if_updated:
+            return None
         for key, value in kwargs.items():
             if key not in cls.__patch_ignore_set__:
                 try:
@@ -148,27 +305,75 @@ class BaseModel(db.Model):
         try:
             db.session.add(model_object)
             db.session.commit()
-            return model_object
         except BaseException as e:
             print(e)
             db.session.rollback()
             return None
+        cls.send_changed([model_object.id])
+        return model_object
+
+    @classmethod
+    def patch_many(cls, items: list[dict]) -> list[bool]:
+        """
+        Update many objects on DB in one transaction, each item has the id of an object and the columns to update.
+
+        Ids of active objects are selected with one statement, then the items are applied with executemany UPDATEs by
+        primary key, grouped by their set of columns. 'updated' is bumped on every object, keys in
+        __patch_ignore_set__ and keys that are not columns of the model are ignored.
+        If any exception happens, calls rollback() method of sqlalchemy.
+
+        :param items: Column names of the objects (including 'id') and their respective value.
+        :return: For each item, True if its object is updated | False if the object does not exist
+        """
+        columns = {column.key for column in inspect(cls).column_attrs} - cls.__patch_ignore_set__
+        ids = [item.get('id') for item in items]
+        try:
+            found = set(db.session.scalars(select(cls.id).where(cls.id.in_([id for id in ids if id]),
+                                                                 cls.active == True)))
+            now = datetime.now()
+            groups = dict()
+            for id, item in zip(ids, items):
+                if id not in found:
+                    continue
+                row = {key: value for key, value in item.items() if key in columns}
+                row.update(id=id, updated=now)
+                groups.setdefault(frozenset(row), list()).append(row)
+            for rows in groups.values():
+                db.session.execute(update(cls), rows)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            app_logger.error(f'failed to update {len(items)} {cls.__name__} object(s): {getattr(e, "orig", e)}')
+            db.session.rollback()
+            return [False] * len(items)
+        cls.send_changed(found)
+        return [id in found for id in ids]
 
     @classmethod
-    def put(cls, model_object) -> Optional[object]:
+    def put(cls, model_object, if_updated: datetime = None) -> Optional[object]:
         """
         Update the object having the same id as the given object on DB.
 
-        All columns (attributes) of the object will be updated. Loops over the given object's columns using the
-        sqlalchemy inspect func to find the columns and update the DB instance (retrieved by id).
+        All columns (attributes) of the object will be updated. If the given object is not attached to the session
+        (e.g. deserialized from a request) the update is done with a single UPDATE statement (see _update()),
+        otherwise loops over the given object's columns using the sqlalchemy inspect func to find the columns and
+        update the DB instance (retrieved by id).
         If any exception happens, calls rollback() method of sqlalchemy.
 
         :param model_object: A python object of the class 'cls'.
+        :param if_updated: If given, the object is updated only if its 'updated' column still has this value.
         :return: Updated object on DB | None
         """
+        state = inspect(model_object)
+        if state.transient or state.detached:
+            values = {column.key: getattr(model_object, column.key) for column in state.mapper.column_attrs
+                      if column.key not in cls.__put_ignore_set__}
+            return cls._update(model_object.id, values, if_updated=if_updated)
+
         server_object = cls.get(model_object.id)
         if not server_object:
             return None
+        if if_updated is not None and server_object.updated != if_updated:
+            return None
         try:
             for column in inspect(model_object).mapper.column_attrs:
                 value = getattr(model_object, column.key)
@@ -180,51 +385,309 @@ class BaseModel(db.Model):
             print(e)
             db.session.rollback()
             return None
+        cls.send_changed([server_object.id])
         return server_object
 
     @classmethod
-    def delete(cls, id: UUID) -> bool:
+    def delete(cls, id: UUID, if_updated: datetime = None) -> bool:
         """
         Soft delete the object on DB by given id.
 
-        Sets the active flag of the object to False and persists it on DB.
+        Sets the active flag of the object to False with a single UPDATE statement, filtered on the active flag so
+        deleting an already deleted object fails.
         If any exception happens, calls rollback() method of sqlalchemy.
 
         :param id: The id of the object on DB.
+        :param if_updated: If given, the object is deleted only if its 'updated' column still has this value.
         :return: True on success | False
         """
-        model_object = cls.get(id)
-        if not model_object:
-            return False
-        model_object.active = False
+        statement = (update(cls)
+                     .where(cls.id == id, cls.active == True)
+                     .values(active=False, updated=datetime.now())
+                     .execution_options(synchronize_session=False))
+        if if_updated is not None:
+            statement = statement.where(cls.updated == if_updated)
         try:
-            db.session.add(model_object)
+            result = db.session.execute(statement)
             db.session.commit()
-            return True
-        except BaseException as e:
-            print(e)
+        except SQLAlchemyError as e:
+            app_logger.error(f'failed to delete {cls.__name__} {id}: {getattr(e, "orig", e)}')
             db.session.rollback()
             return False
+        if result.rowcount != 1:
+            return False
+        cls.send_changed([id])
+        return True
 
     @classmethod
-    def get_all(cls, limit: int = 10, page: int = 1) -> list[object | None]:
+    def _update(cls, id: UUID, values: dict, if_updated: datetime = None) -> Optional[object]:
+        """
+        Update the given columns of the active object having the id given with a single UPDATE statement.
+
+        The 'updated' column is always bumped. Where the dialect supports 'UPDATE ... RETURNING' the new row is
+        returned by the same statement and the object is built from it (or the instance already in the session is
+        refreshed with it) without another SELECT. On other dialects the object is read back with get().
+        If any exception happens, calls rollback() method of sqlalchemy.
+
+        :param id: The id of the object on DB.
+        :param values: Columns of the object and their respective value.
+        :param if_updated: If given, the object is updated only if its 'updated' column still has this value.
+        :return: Updated object on DB | None
+        """
+        statement = (update(cls)
+                     .where(cls.id == id, cls.active == True)
+                     .values(**values, updated=datetime.now())
+                     .execution_options(synchronize_session=False))
+        if if_updated is not None:
+            statement = statement.where(cls.updated == if_updated)
+        column_attrs = inspect(cls).column_attrs
+        returning = db.session.get_bind(mapper=cls).dialect.update_returning
+        if returning:
+            statement = statement.returning(*[getattr(cls, column.key) for column in column_attrs])
+        try:
+            result = db.session.execute(statement)
+            row = result.first() if returning else None
+            rowcount = None if returning else result.rowcount
+            db.session.commit()
+        except SQLAlchemyError as e:
+            app_logger.error(f'failed to update {cls.__name__} {id}: {getattr(e, "orig", e)}')
+            db.session.rollback()
+            return None
+        if not returning:
+            if not rowcount:
+                return None
+            cls.send_changed([id])
+            return cls.get(id)
+        if row is None:
+            return None
+        cls.send_changed([id])
+
+        model_object = db.session.identity_map.get(db.session.identity_key(cls, row.id))
+        if model_object is None:
+            model_object = cls()
+            for column, value in zip(column_attrs, row):
+                set_committed_value(model_object, column.key, value)
+            make_transient_to_detached(model_object)
+            db.session.add(model_object)
+        else:
+            for column, value in zip(column_attrs, row):
+                set_committed_value(model_object, column.key, value)
+        return model_object
+
+    @classmethod
+    def send_changed(cls, ids):
+        """
+        Send the model_changed signal for the given ids of this model, called after every successful write.
+
+        :param ids: The ids of the created, updated or deleted objects.
+        """
+        if ids:
+            model_changed.send(cls, ids=list(ids))
+
+    @classmethod
+    def get_all(cls, limit: int = 10, page: int = 1, options: list = None, criteria: list = None,
+                order: tuple[tuple[str, bool], ...] = None) -> list[object | None]:
         """
         Retrieve the list of all objects of class 'cls' from DB.
 
         Only active == True objects will be retrieved.
         Limit and page parameters will be passed to sqlalchemy's paginate func (per_page, page respectively).
 
+        Objects are ordered by __keyset_order__ (or order) and no COUNT query is issued, use count() for the total. The
+        limit is not capped here, the API layer caps it (see MAX_PAGE_LIMIT).
+
         :param limit: Number of objects to return.
         :param page: Number of the page.
+        :param options: sqlalchemy loader options, see loader_options().
+        :param criteria: Extra sqlalchemy WHERE criteria, see app.utilities.filtering.
+        :param order: Sort order as (column, descending) pairs, defaults to __keyset_order__.
         :return: List of objects | empty list
         """
+        statement = (select(cls)
+                     .where(cls.active == True, *(criteria or ()))
+                     .order_by(*cls._keyset_order_by(order or cls.__keyset_order__)))
+        if options:
+            statement = statement.options(*options)
         model_object_list = db.paginate(
-            select(cls).where(cls.active == True),
+            statement,
             per_page=limit,
-            page=page
+            page=page,
+            max_per_page=None,
+            count=False
         )
         return model_object_list.items
 
+    @classmethod
+    def get_all_after(cls, limit: int = 10, after: tuple = None, order: tuple[tuple[str, bool], ...] = None,
+                      options: list = None, criteria: list = None) -> tuple[list, Optional[tuple]]:
+        """
+        Retrieve a page of active objects of class 'cls' using keyset (cursor) pagination.
+
+        Instead of an OFFSET scan, rows are located with a 'WHERE (sort keys) > (values of the last row)' condition
+        which can be served by an index no matter how deep the page is.
+
+        :param limit: Number of objects to return, not capped here like get_all().
+        :param after: Values of the sort keys of the last object of the previous page, None for the first page.
+        :param order: Sort order as (column, descending) pairs, defaults to __keyset_order__. Sort columns should not
+        be nullable.
+        :param options: sqlalchemy loader options, see loader_options().
+        :param criteria: Extra sqlalchemy WHERE criteria, see app.utilities.filtering.
+        :return: (List of objects, values of the sort keys of the last object | None if there is no next page)
+        """
+        limit = max(limit, 1)
+        order = order or cls.__keyset_order__
+        statement = select(cls).where(cls.active == True, *(criteria or ()))
+        if after is not None:
+            statement = statement.where(cls._keyset_after(order, after))
+        statement = statement.order_by(*cls._keyset_order_by(order)).limit(limit + 1)
+        if options:
+            statement = statement.options(*options)
+        model_object_list = list(db.session.scalars(statement))
+        if len(model_object_list) <= limit:
+            return model_object_list, None
+        model_object_list = model_object_list[:limit]
+        last = model_object_list[-1]
+        return model_object_list, tuple(getattr(last, key) for key, _ in order)
+
+    @classmethod
+    def iterate(cls, batch_size: int = 1000, options: list = None):
+        """
+        Iterate over all active objects of class 'cls' ordered by __keyset_order__, without loading them all at once.
+
+        Rows are fetched from the cursor and turned into objects 'batch_size' at a time (sqlalchemy's yield_per), the
+        session does not keep strong references to unmodified objects so memory stays flat while iterating.
+
+        :param batch_size: Number of rows fetched at a time.
+        :param options: sqlalchemy loader options, see loader_options(). Joined eager loading of collections can not
+        be used with yield_per.
+        :return: iterator of objects
+        """
+        statement = (select(cls)
+                     .where(cls.active == True)
+                     .order_by(*cls._keyset_order_by(cls.__keyset_order__))
+                     .execution_options(yield_per=max(batch_size, 1)))
+        if options:
+            statement = statement.options(*options)
+        return db.session.scalars(statement)
+
+    @classmethod
+    def ancestors(cls, id: UUID, max_depth: int = 32, options: list = None) -> Optional[list[tuple[object, int]]]:
+        """
+        Retrieve the ancestors of the active object having the given id with one recursive CTE over
+        __hierarchy_parent_key__.
+
+        The walk stops at the first inactive ancestor and after max_depth levels.
+
+        :param id: The id of the object on DB.
+        :param max_depth: Maximum number of levels to walk up.
+        :param options: sqlalchemy loader options, see loader_options().
+        :return: List of (ancestor, depth) from the parent (depth 1) up | None if the object does not exist
+        """
+        parent_key = cls._hierarchy_parent_key()
+        tree = (select(cls.id, literal(0).label('depth'))
+                .where(cls.id == id, cls.active == True)
+                .cte('ancestors', recursive=True))
+        child = aliased(cls)
+        parent = aliased(cls)
+        tree = tree.union_all(
+            select(parent.id, tree.c.depth + 1)
+            .join(child, child.id == tree.c.id)
+            .join(parent, parent.id == getattr(child, parent_key))
+            .where(parent.active == True, tree.c.depth < max_depth)
+        )
+        return cls._hierarchy_rows(tree, options)
+
+    @classmethod
+    def descendants(cls, id: UUID, max_depth: int = 32, options: list = None) -> Optional[list[tuple[object, int]]]:
+        """
+        Retrieve the descendants of the active object having the given id with one recursive CTE over
+        __hierarchy_parent_key__ (backed by its index).
+
+        Inactive objects and their subtrees are skipped, the walk stops after max_depth levels.
+
+        :param id: The id of the object on DB.
+        :param max_depth: Maximum number of levels to walk down.
+        :param options: sqlalchemy loader options, see loader_options().
+        :return: List of (descendant, depth) ordered by depth, children have depth 1 | None if the object does not exist
+        """
+        parent_key = cls._hierarchy_parent_key()
+        tree = (select(cls.id, literal(0).label('depth'))
+                .where(cls.id == id, cls.active == True)
+                .cte('descendants', recursive=True))
+        child = aliased(cls)
+        tree = tree.union_all(
+            select(child.id, tree.c.depth + 1)
+            .join(child, getattr(child, parent_key) == tree.c.id)
+            .where(child.active == True, tree.c.depth < max_depth)
+        )
+        return cls._hierarchy_rows(tree, options)
+
+    @classmethod
+    def _hierarchy_parent_key(cls) -> str:
+        if not cls.__hierarchy_parent_key__:
+            raise ValueError(f'{cls.__name__} is not a hierarchy, __hierarchy_parent_key__ is not set')
+        return cls.__hierarchy_parent_key__
+
+    @classmethod
+    def _hierarchy_rows(cls, tree, options: list = None) -> Optional[list[tuple[object, int]]]:
+        statement = (select(cls, tree.c.depth)
+                     .join(tree, cls.id == tree.c.id)
+                     .order_by(tree.c.depth, *cls._keyset_order_by(cls.__keyset_order__)))
+        if options:
+            statement = statement.options(*options)
+        rows = db.session.execute(statement).all()
+        if not rows:
+            return None
+        # a cycle in the hierarchy repeats objects until max_depth, keep their first (shallowest) occurrence
+        seen = set()
+        result = list()
+        for model_object, depth in rows:
+            if model_object.id not in seen:
+                seen.add(model_object.id)
+                if depth:
+                    result.append((model_object, depth))
+        return result
+
+    @classmethod
+    def get_updated(cls, id: UUID) -> Optional[datetime]:
+        """
+        Retrieve only the 'updated' column of the active object having the given id, used to check versions (ETags)
+        without loading the object.
+
+        :param id: The id of the object on DB.
+        :return: 'updated' of the object | None if it does not exist
+        """
+        return db.session.scalar(select(cls.updated).where(cls.id == id).where(cls.active == True))
+
+    @classmethod
+    def count(cls, criteria: list = None) -> int:
+        """
+        Count the active objects of class 'cls' on DB.
+
+        :param criteria: Extra sqlalchemy WHERE criteria, see app.utilities.filtering.
+        :return: Number of objects
+        """
+        return db.session.scalar(select(func.count()).select_from(cls).where(cls.active == True, *(criteria or ())))
+
+    @classmethod
+    def _keyset_order_by(cls, order: tuple[tuple[str, bool], ...]) -> list:
+        return [getattr(cls, key).desc() if descending else getattr(cls, key).asc() for key, descending in order]
+
+    @classmethod
+    def _keyset_after(cls, order: tuple[tuple[str, bool], ...], values: tuple):
+        columns = [getattr(cls, key) for key, _ in order]
+        directions = {descending for _, descending in order}
+        if len(directions) == 1:
+            # a row value comparison, is index friendly on sqlite and postgres
+            if directions.pop():
+                return tuple_(*columns) < tuple(values)
+            return tuple_(*columns) > tuple(values)
+        criteria = list()
+        for i, ((_, descending), column, value) in enumerate(zip(order, columns, values)):
+            equals = [columns[j] == values[j] for j in range(i)]
+            criteria.append(and_(*equals, column < value if descending else column > value))
+        return or_(*criteria)
+
 
 class BaseSchema(ma.SQLAlchemyAutoSchema):
     """
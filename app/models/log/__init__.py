@@ -21,3 +21,10 @@ class IncomingAPI(db.Model):
     request_time: db.Mapped[datetime] = db.mapped_column(db.DateTime)
     response_time: db.Mapped[datetime] = db.mapped_column(db.DateTime)
     remote_address: db.Mapped[str] = db.mapped_column(db.String)
+
+    # milliseconds, see app.utilities.logging.timing
+    db_statements: db.Mapped[int] = db.mapped_column(db.Integer, nullable=True)
+    db_time: db.Mapped[float] = db.mapped_column(db.Float, nullable=True)
+    service_time: db.Mapped[float] = db.mapped_column(db.Float, nullable=True)
+    serialize_time: db.Mapped[float] = db.mapped_column(db.Float, nullable=True)
+    total_time: db.Mapped[float] = db.mapped_column(db.Float, nullable=True)
@@ -17,6 +17,9 @@ product_category = Table(
 
 
 class Product(BaseModel):
+    __hierarchy_parent_key__ = 'parent_id'
+    __search_fields__ = ('name', 'code', 'description')
+
     name: db.Mapped[str] = db.mapped_column(db.String, nullable=False)
     code: db.Mapped[str] = db.mapped_column(db.String, nullable=False, index=True)
     description: db.Mapped[str]
@@ -0,0 +1,397 @@
+"""
+Cached schema instances and precompiled dump/load functions for BaseSchema subclasses.
+
+Building a marshmallow schema deep copies and binds all of its declared fields, doing it on every request is wasteful
+since schema instances are safe to reuse for dump and load. get_schema() returns one shared instance per
+(schema class, only, exclude, many) combination.
+
+get_dumper() goes one step further and generates a dump function specialized for the dump fields of a schema: the loop
+over the fields is unrolled and the common column types (str, UUID, datetime, float, int, bool) are converted inline,
+every other field is serialized by the field itself. The result is the same as schema.dump(), envelope and links
+included.
+
+get_loader() is the counterpart for schema.load(): it unwraps the envelope, validates the fields and builds the model
+instances without going through marshmallow's hook dispatching, raising the same ValidationError messages.
+"""
+
+import keyword
+from uuid import UUID
+from datetime import datetime
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Type
+
+from marshmallow import fields
+from marshmallow import missing
+from marshmallow import Schema
+from marshmallow import ValidationError
+from marshmallow import EXCLUDE
+from marshmallow import INCLUDE
+from marshmallow import RAISE
+from marshmallow.decorators import PRE_DUMP
+from marshmallow.decorators import POST_DUMP
+from marshmallow.decorators import PRE_LOAD
+from marshmallow.decorators import POST_LOAD
+from marshmallow.decorators import VALIDATES
+from marshmallow.decorators import VALIDATES_SCHEMA
+from marshmallow.error_store import ErrorStore
+from marshmallow.utils import is_collection
+from marshmallow.utils import set_value
+
+from app.utilities.logging.timing import timed
+from app.models import BaseSchema
+
+# field class: (python type, inline conversion of 'value')
+_INLINE_FIELDS = {
+    fields.String: (str, 'value'),
+    fields.UUID: (UUID, 'str(value)'),
+    fields.DateTime: (datetime, 'value.isoformat()'),
+    fields.Float: (float, 'value'),
+    fields.Integer: (int, 'value'),
+    fields.Boolean: (bool, 'value'),
+}
+
+# inline conversions of the dumpers of a JSON provider encoding UUID and datetime natively
+_NATIVE_FIELDS = {
+    **_INLINE_FIELDS,
+    fields.UUID: (UUID, 'value'),
+    fields.DateTime: (datetime, 'value'),
+}
+
+
+def _cache_of(schema_class: Type[Schema]) -> dict:
+    # stored on the class itself so schemas generated at runtime (i.e. Schema.from_dict) are freed with their class
+    cache = schema_class.__dict__.get('__serializer_cache__')
+    if cache is None:
+        cache = dict()
+        setattr(schema_class, '__serializer_cache__', cache)
+    return cache
+
+
+def _variant_key(only, exclude, many) -> tuple:
+    return tuple(only) if only is not None else None, tuple(exclude), bool(many)
+
+
+def get_schema(schema_class: Type[Schema], only=None, exclude=(), many: bool = False) -> Schema:
+    """
+    Return a shared instance of the schema class for the given arguments, built on first use.
+
+    :param schema_class: marshmallow schema class
+    :param only: passed to the schema constructor
+    :param exclude: passed to the schema constructor
+    :param many: passed to the schema constructor
+    :return: schema instance
+    """
+    key = ('schema',) + _variant_key(only, exclude, many)
+    cache = _cache_of(schema_class)
+    schema = cache.get(key)
+    if schema is None:
+        schema = cache.setdefault(key, schema_class(only=only, exclude=exclude, many=many))
+    return schema
+
+
+def get_dumper(schema_class: Type[Schema], only=None, exclude=(), native: bool = False) -> 'Dumper':
+    """
+    Return the precompiled Dumper of the schema class for the given arguments, built on first use.
+
+    :param schema_class: marshmallow schema class
+    :param only: passed to the schema constructor
+    :param exclude: passed to the schema constructor
+    :param native: if True UUID and datetime values are left as they are for a JSON provider encoding them (see
+    app.utilities.jsonprovider), the output is not the one of schema.dump() anymore
+    :return: Dumper
+    """
+    key = ('dumper', bool(native)) + _variant_key(only, exclude, False)
+    cache = _cache_of(schema_class)
+    dumper = cache.get(key)
+    if dumper is None:
+        dumper = cache.setdefault(key, Dumper(get_schema(schema_class, only=only, exclude=exclude), native=native))
+    return dumper
+
+
+def get_loader(schema_class: Type[Schema], only=None, exclude=(), partial: bool = False) -> 'Loader':
+    """
+    Return the precompiled Loader of the schema class for the given arguments, built on first use.
+
+    :param schema_class: marshmallow schema class
+    :param only: passed to the schema constructor
+    :param exclude: passed to the schema constructor
+    :param partial: if True missing required fields are not reported (i.e. for PATCH)
+    :return: Loader
+    """
+    key = ('loader', bool(partial)) + _variant_key(only, exclude, False)
+    cache = _cache_of(schema_class)
+    loader = cache.get(key)
+    if loader is None:
+        loader = cache.setdefault(key, Loader(get_schema(schema_class, only=only, exclude=exclude),
+                                              partial=partial))
+    return loader
+
+
+class Dumper:
+    """
+    Serializer equivalent to schema.dump() for BaseSchema subclasses.
+
+    Schemas with their own pre_dump/post_dump hooks, or a non default get_attribute, are dumped by marshmallow itself.
+
+    Attributes:
+
+    - schema: The underlying schema instance.
+    - native: If True UUID and datetime values of the inlined fields are not converted to strings.
+    - dump_one: Serialize a single object without the envelope.
+    """
+
+    def __init__(self, schema: Schema, native: bool = False):
+        self.schema = schema
+        self.native = native
+        self.fallback = not self._is_compilable(schema)
+        if isinstance(schema, BaseSchema):
+            self.single_key = schema.__envelope__.get('single', 'model')
+            self.many_key = schema.__envelope__.get('many', 'models')
+        self.dump_one = self._compile(schema, native) if not self.fallback else self._dump_one_fallback
+
+    def dump(self, obj, many: bool = False):
+        """
+        Serialize the object(s) exactly like schema.dump(obj, many=many).
+
+        :param obj: Object or list of objects.
+        :param many: True if obj is a collection.
+        :return: { label : data }
+        """
+        with timed('serialize'):
+            if self.fallback or obj is None:
+                return self.schema.dump(obj, many=many)
+            if many:
+                dump_one = self.dump_one
+                return {self.many_key: [dump_one(item) for item in obj]}
+            return {self.single_key: self.dump_one(obj)}
+
+    def _dump_one_fallback(self, obj):
+        return self.schema._serialize(obj, many=False)
+
+    @staticmethod
+    def _is_compilable(schema: Schema) -> bool:
+        if not isinstance(schema, BaseSchema):
+            return False
+        if type(schema).handle_single_or_collection is not BaseSchema.handle_single_or_collection:
+            return False
+        if type(schema).get_attribute is not Schema.get_attribute:
+            return False
+        post_dump = schema._hooks[(POST_DUMP, True)] + schema._hooks[(POST_DUMP, False)]
+        pre_dump = schema._hooks[(PRE_DUMP, True)] + schema._hooks[(PRE_DUMP, False)]
+        return not pre_dump and post_dump == ['handle_single_or_collection']
+
+    @staticmethod
+    def _compile(schema: Schema, native: bool = False):
+        namespace = {
+            'missing': missing,
+            'dict_class': OrderedDict if schema.ordered else dict,
+            'get_attribute': schema.get_attribute,
+            'slow_dump_one': lambda obj: schema._serialize(obj, many=False),
+        }
+        lines = [
+            'def dump_one(obj):',
+            '    if hasattr(obj, "__getitem__"):',
+            '        return slow_dump_one(obj)',
+            '    ret = dict_class()',
+        ]
+        for index, (attr_name, field_obj) in enumerate(schema.dump_fields.items()):
+            field_name = f'field_{index}'
+            namespace[field_name] = field_obj
+            key = field_obj.data_key if field_obj.data_key is not None else attr_name
+            inline = (_NATIVE_FIELDS if native else _INLINE_FIELDS).get(type(field_obj))
+            if inline and Dumper._is_inlineable(attr_name, field_obj):
+                type_name = f'type_{index}'
+                namespace[type_name] = inline[0]
+                lines += [
+                    f'    value = getattr(obj, {attr_name!r}, missing)',
+                    f'    if value is not missing:',
+                    f'        ret[{key!r}] = {inline[1]} if value.__class__ is {type_name} '
+                    f'else {field_name}._serialize(value, {attr_name!r}, obj)',
+                ]
+            else:
+                lines += [
+                    f'    value = {field_name}.serialize({attr_name!r}, obj, accessor=get_attribute)',
+                    f'    if value is not missing:',
+                    f'        ret[{key!r}] = value',
+                ]
+        lines.append('    return ret')
+        exec(compile('\n'.join(lines), f'<dumper {type(schema).__name__}>', 'exec'), namespace)
+        return namespace['dump_one']
+
+    @staticmethod
+    def _is_inlineable(attr_name: str, field_obj: fields.Field) -> bool:
+        if field_obj.attribute is not None or field_obj.dump_default is not missing:
+            return False
+        if not attr_name.isidentifier() or keyword.iskeyword(attr_name):
+            return False
+        if isinstance(field_obj, fields.Number) and field_obj.as_string:
+            return False
+        if isinstance(field_obj, fields.DateTime) and (field_obj.format or 'iso') not in ('iso', 'iso8601'):
+            return False
+        if isinstance(field_obj, fields.Boolean) and (True not in field_obj.truthy or False not in field_obj.falsy):
+            return False
+        return True
+
+
+class Loader:
+    """
+    Deserializer equivalent to schema.load() for BaseSchema subclasses.
+
+    The fields to load, their input keys and the set of known keys are computed once. Schemas with their own
+    load hooks or validators, or loading instances from the session, are loaded by marshmallow itself.
+
+    Attributes:
+
+    - schema: The underlying schema instance.
+    - partial: If True missing required fields are not reported.
+    """
+
+    def __init__(self, schema: Schema, partial: bool = False):
+        self.schema = schema
+        self.partial = True if partial else None
+        self.fallback = not self._is_compilable(schema)
+        if self.fallback:
+            return
+        self.model = schema.opts.model
+        self.single_key = schema.__envelope__.get('single', 'model')
+        self.many_key = schema.__envelope__.get('many', 'models')
+        self.dict_class = OrderedDict if schema.ordered else dict
+        self.unknown = schema.unknown
+        self.index_errors = schema.opts.index_errors
+        self.type_error = schema.error_messages['type']
+        self.unknown_error = schema.error_messages['unknown']
+        self.fields = tuple(
+            (field_obj.data_key if field_obj.data_key is not None else attr_name,
+             field_obj,
+             field_obj.attribute or attr_name)
+            for attr_name, field_obj in schema.load_fields.items()
+        )
+        self.field_names = frozenset(field_name for field_name, _, _ in self.fields)
+        self.field_kwargs = {'partial': self.partial} if self.partial is not None else {}
+
+    def load(self, data, many: bool = False):
+        """
+        Deserialize the enveloped data to model instance(s), exactly like schema.load(data, many=many).
+
+        :param data: { label : data }
+        :param many: True if data is a collection.
+        :return: model instance | list of model instances
+        :raises ValidationError If data is not valid.
+        """
+        if self.fallback:
+            return self.schema.load(data, many=many, partial=self.partial)
+        result = self.load_dict(data, many=many)
+        if many:
+            return [self.model(**item) for item in result]
+        return self.model(**result)
+
+    def load_dict(self, data, many: bool = False):
+        """
+        Unwrap and validate the enveloped data without building model instances.
+
+        :param data: { label : data }
+        :param many: True if data is a collection.
+        :return: dict of attributes | list of dicts
+        :raises ValidationError If data is not valid.
+        """
+        if self.fallback:
+            if many:
+                return [self._as_dict(item) for item in self.schema.load(data, many=True, partial=self.partial)]
+            return self._as_dict(self.schema.load(data, many=False, partial=self.partial))
+        key = self.many_key if many else self.single_key
+        if key not in data.keys():
+            raise ValidationError({'_schema': [f'key: {key}, is missing in input data']}, data=data, valid_data=None)
+        error_store = ErrorStore()
+        payload = data[key]
+        if many:
+            if not is_collection(payload):
+                error_store.store_error([self.type_error])
+                result = []
+            else:
+                result = [self.deserialize(item, error_store, index=index if self.index_errors else None)
+                          for index, item in enumerate(payload)]
+        else:
+            result = self.deserialize(payload, error_store)
+        if error_store.errors:
+            raise ValidationError(error_store.errors, data=data, valid_data=result)
+        return result
+
+    def load_each(self, items: list) -> list[tuple]:
+        """
+        Validate the items of a collection (without envelope) one by one, so valid items can be used even if others
+        are not.
+
+        :param items: list of input dicts
+        :return: list of (dict of attributes, None) for valid items | (None, errors) for invalid ones
+        """
+        results = list()
+        for item in items:
+            if self.fallback:
+                try:
+                    results.append((self.load_dict({self.schema.__envelope__.get('single', 'model'): item}), None))
+                except ValidationError as err:
+                    results.append((None, err.messages))
+                continue
+            error_store = ErrorStore()
+            result = self.deserialize(item, error_store)
+            results.append((None, error_store.errors) if error_store.errors else (result, None))
+        return results
+
+    def deserialize(self, data, error_store: ErrorStore, index: int = None) -> dict:
+        """
+        Validate and deserialize one object (without envelope), storing the errors in error_store.
+
+        :param data: input dict
+        :param error_store: marshmallow error store
+        :param index: index of the object in the collection, if any
+        :return: dict of attributes
+        """
+        result = self.dict_class()
+        if not isinstance(data, Mapping):
+            error_store.store_error([self.type_error], index=index)
+            return result
+        partial = self.partial
+        field_kwargs = self.field_kwargs
+        for field_name, field_obj, attribute in self.fields:
+            raw_value = data.get(field_name, missing)
+            if raw_value is missing and partial is True:
+                continue
+            try:
+                value = field_obj.deserialize(raw_value, field_name, data, **field_kwargs)
+            except ValidationError as error:
+                error_store.store_error(error.messages, field_name, index=index)
+                value = error.valid_data or missing
+            if value is not missing:
+                if '.' in attribute:
+                    set_value(result, attribute, value)
+                else:
+                    result[attribute] = value
+        if self.unknown != EXCLUDE:
+            for key in set(data) - self.field_names:
+                if self.unknown == INCLUDE:
+                    result[key] = data[key]
+                elif self.unknown == RAISE:
+                    error_store.store_error([self.unknown_error], key, index)
+        return result
+
+    @staticmethod
+    def _as_dict(model_object) -> dict:
+        return {key: value for key, value in vars(model_object).items() if not key.startswith('_sa_')}
+
+    @staticmethod
+    def _is_compilable(schema: Schema) -> bool:
+        if not isinstance(schema, BaseSchema):
+            return False
+        schema_class = type(schema)
+        for method in ('load_with_wrapper', 'make_model'):
+            if getattr(schema_class, method) is not getattr(BaseSchema, method):
+                return False
+        if schema_class.handle_error is not Schema.handle_error or getattr(schema, '_load_instance', False):
+            return False
+        hooks = schema._hooks
+        if hooks[VALIDATES] or hooks[(VALIDATES_SCHEMA, True)] or hooks[(VALIDATES_SCHEMA, False)]:
+            return False
+        return (hooks[(PRE_LOAD, True)] == ['load_with_wrapper'] and not hooks[(PRE_LOAD, False)] and
+                hooks[(POST_LOAD, True)] == ['make_model'] and
+                set(hooks[(POST_LOAD, False)]) <= {'make_instance'})
@@ -0,0 +1,13 @@
+"""
+Signals sent by BaseModel write operations.
+
+- model_changed: Sent after a successful commit that created, updated or (soft) deleted rows of a model, the sender is
+the model class and 'ids' is the list of the affected ids. Relationship changes made through the service layer are
+sent for both sides of the relationship.
+"""
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+model_changed = _signals.signal('model-changed')
@@ -0,0 +1,242 @@
+"""
+ASGI serving of the app, i.e. 'uvicorn --factory run:create_asgi_app'.
+
+ASGIApp serves the GET views (BaseAPI.__async_read__, all but the streamed exports) on the event loop with a
+non-blocking database session: an AsyncSession (sqlalchemy.ext.asyncio) on an asyncio driver, aiosqlite for SQLite (see
+app.utilities.database.create_async_database_engine()). The view runs as it is, in the session's run_sync() greenlet
+with flask-sqlalchemy's db.session set to the AsyncSession's session, so the services, envelopes, hyperlinks, ETags and
+the entity cache are the ones of the WSGI app, while every statement awaits its result instead of blocking a thread. A
+request waiting for the database costs a coroutine, not a thread. The request hooks of the app (api log and its audit
+log queue, metrics, compression of large bodies, ...) may block, they run around the view like they do under WSGI but
+on a worker thread (in_thread()), never on the event loop.
+
+Everything else (writes, exports, unknown urls) is served by the flask (WSGI) app through asgiref's WsgiToAsgi, each
+request on a thread of its own. With read replicas (DATABASE_READ_REPLICAS) every request is, the replica routing is
+done by the session of flask-sqlalchemy.
+
+Config Variables:
+
+- ASGI_ASYNC_READS: Serve the GET views with the asyncio session, By-default it is True. If False every request goes
+to the WSGI app.
+"""
+
+import asyncio
+import io
+import logging
+from typing import Optional
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import Flask
+from flask import request
+from flask import request_started
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from app.extensions import db
+from app.utilities.database import create_async_database_engine
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+
+def wsgi_environ(scope: dict, body: bytes) -> dict:
+    """
+    Build the WSGI environ of an ASGI http scope, like WsgiToAsgi does.
+
+    :param scope: ASGI http scope
+    :param body: request body
+    :return: WSGI environ
+    """
+    instance = WsgiToAsgiInstance(None)
+    instance.scope = scope
+    return instance.build_environ(scope, io.BytesIO(body))
+
+
+def in_thread(function):
+    """
+    Wrap a blocking function of the request (i.e. the before / after_request hooks) to run on a worker thread, with the
+    context variables (flask's request context) of the caller.
+
+    :param function: The function.
+    :return: coroutine function
+    """
+    return sync_to_async(function, thread_sensitive=False)
+
+
+def call_view(session, view, view_args: dict):
+    """
+    Call a view with db.session set to the given session, run by AsyncSession.run_sync().
+
+    :param session: The sync session of the AsyncSession.
+    :param view: The view function.
+    :param view_args: The arguments of the view, from the url.
+    :return: The return value of the view
+    """
+    # the scope of db.session is the app context, pushed by ASGIApp for this request only
+    db.session.registry.set(session)
+    try:
+        return view(**view_args)
+    finally:
+        db.session.registry.clear()
+
+
+class ASGIApp:
+    """
+    ASGI application serving a flask app, see the module documentation.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.engine = None
+        self.sessions: Optional[async_sessionmaker] = None
+        if app.config.get('ASGI_ASYNC_READS', True) and 'replica_router' not in app.extensions:
+            self.engine = create_async_database_engine(app)
+            self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self._counters = {'async': 0, 'wsgi': 0}
+        self._connected = False
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def __call__(self, scope: dict, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'unsupported ASGI scope type: {scope["type"]}')
+        if self.sessions is not None and scope['method'] == 'GET':
+            body = await self.read_body(receive)
+            if body is None:
+                return
+            environ = wsgi_environ(scope, body)
+            if self.async_view(environ) is not None:
+                self._counters['async'] += 1
+                return await self.serve_async(environ, send)
+
+            async def receive_body():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            receive = receive_body
+        self._counters['wsgi'] += 1
+        # a thread per request, WsgiToAsgi runs them all on one thread otherwise
+        async with ThreadSensitiveContext():
+            await self.wsgi(scope, receive, send)
+
+    @staticmethod
+    async def read_body(receive) -> Optional[bytes]:
+        """
+        Read the request body.
+
+        :param receive: ASGI receive callable
+        :return: body | None if the client disconnected
+        """
+        chunks = list()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    def async_view(self, environ: dict):
+        """
+        Return the view of the request if it is served by the asyncio read path.
+
+        :param environ: WSGI environ of the request.
+        :return: The view function | None
+        """
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except (HTTPException, RequestRedirect):
+            return None
+        view = self.app.view_functions.get(endpoint)
+        if not getattr(getattr(view, 'view_class', None), '__async_read__', False):
+            return None
+        return view
+
+    async def serve_async(self, environ: dict, send):
+        """
+        Serve a request like flask's wsgi_app() does, the view reading through the asyncio session.
+
+        :param environ: WSGI environ of the request.
+        :param send: ASGI send callable
+        """
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            ctx.push()
+            try:
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    rv = await in_thread(app.preprocess_request)()
+                    if rv is None:
+                        rv = await self.read(app.view_functions[request.url_rule.endpoint], request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = await in_thread(app.finalize_request)(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            try:
+                await send({'type': 'http.response.start', 'status': response.status_code,
+                            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                        for name, value in response.headers.items()]})
+                await send({'type': 'http.response.body', 'body': response.get_data()})
+            finally:
+                response.close()
+        finally:
+            ctx.pop(error)
+
+    async def connect(self):
+        """
+        Open the first connection of the asyncio engine.
+
+        sqlalchemy initializes the dialect on the first connection under a threading lock, concurrent first connections
+        of the requests on the event loop thread would wait on each other forever, so it is opened once before them.
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if not self._connected:
+                async with self.engine.connect():
+                    self._connected = True
+
+    async def read(self, view, view_args: dict):
+        if not self._connected:
+            await self.connect()
+        async with self.sessions() as session:
+            return await session.run_sync(call_view, view, view_args)
+
+    def stats(self) -> dict:
+        """
+        Return the number of requests served by the asyncio read path and by the WSGI app.
+
+        :return: {'async', 'wsgi'}
+        """
+        return dict(self._counters)
+
+    async def dispose(self):
+        """
+        Close the connections of the asyncio engine.
+        """
+        if self.engine is not None:
+            await self.engine.dispose()
+            # the new pool (and event loop) connects first again
+            self._connected = False
+            self._connect_lock = None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.engine is not None:
+                    await self.connect()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,260 @@
+"""
+Pluggable in-process cache for serialized entities.
+
+The cache of the app lives in app.extensions['entity_cache'] and is created by init_cache(app) from the app config.
+Entries are keyed by (table name, id) and are removed whenever BaseModel sends the model_changed signal for that id.
+Invalidation only reaches the cache of the current process, with several workers the TTL bounds how stale an entry can
+get.
+
+Invalidating a key also bumps its generation. A reader takes the generation of the key before loading the entity and
+stores the serialized form with set_if_generation(), which is skipped if the key was invalidated in between: otherwise
+a reader loading the old row while a writer commits and invalidates would store the stale form until the TTL.
+
+The hits, misses and evictions of stats() are exported on GET /metrics (entity_cache_*_total), see
+app.utilities.metrics.
+
+Config Variables:
+
+- ENTITY_CACHE_BACKEND: 'lru' (default), 'null' to disable caching, or a BaseCache subclass (or its import path in the
+form 'package.module:Class') taking max_size and ttl keyword arguments.
+- ENTITY_CACHE_MAX_SIZE: Maximum number of entries, the least recently used entry is evicted above it.
+- ENTITY_CACHE_TTL: Number of seconds an entry is valid, 0 or None for no expiry.
+"""
+
+import threading
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from importlib import import_module
+from time import monotonic
+from typing import Any
+from typing import Hashable
+
+from flask import Flask
+from flask import current_app
+from flask import has_app_context
+
+from app.models.signals import model_changed
+
+# generations are kept per stripe of keys, so their memory is bounded, keys sharing a stripe only skip more sets
+GENERATION_STRIPES = 4096
+
+
+class BaseCache(ABC):
+    """
+    Interface of the cache backends.
+
+    Backends should count the 'hits', 'misses' and 'evictions' (entries removed because of the size bound or the TTL)
+    with _count(). The generations of the keys are handled here, backends only implement the storage.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._generation_lock = threading.Lock()
+        self._generations = [0] * GENERATION_STRIPES
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Any:
+        """
+        Return the value cached for the key.
+
+        :param key: cache key
+        :return: cached value | None
+        """
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any):
+        """
+        Cache the value for the key.
+
+        :param key: cache key
+        :param value: any value but None
+        """
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        """
+        Remove the key from the cache, if it is there.
+
+        :param key: cache key
+        """
+
+    @abstractmethod
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+    def __len__(self) -> int:
+        return 0
+
+    def generation(self, key: Hashable) -> int:
+        """
+        Return the generation of the key, taken before loading the value to cache.
+
+        :param key: cache key
+        :return: generation
+        """
+        return self._generations[hash(key) % GENERATION_STRIPES]
+
+    def set_if_generation(self, key: Hashable, value: Any, generation: int) -> bool:
+        """
+        Cache the value for the key unless the key was invalidated since its generation was taken.
+
+        :param key: cache key
+        :param value: any value but None
+        :param generation: The generation of the key, see generation().
+        :return: True if the value is cached | False
+        """
+        with self._generation_lock:
+            if self._generations[hash(key) % GENERATION_STRIPES] != generation:
+                return False
+            self.set(key, value)
+        return True
+
+    def invalidate(self, key: Hashable):
+        """
+        Remove the key from the cache and bump its generation.
+
+        :param key: cache key
+        """
+        with self._generation_lock:
+            self._generations[hash(key) % GENERATION_STRIPES] += 1
+            self.delete(key)
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the cache and its current size.
+
+        :return: {'hits', 'misses', 'evictions', 'size'}
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats['size'] = len(self)
+        return stats
+
+    def _count(self, counter: str, value: int = 1):
+        self._counters[counter] += value
+
+
+class NullCache(BaseCache):
+    """
+    Cache that stores nothing, every lookup is a miss.
+    """
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            self._count('misses')
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        pass
+
+    def delete(self, key: Hashable):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(BaseCache):
+    """
+    Thread safe LRU cache with a TTL, entries are kept in an OrderedDict from the least to the most recently used.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count('misses')
+                return None
+            value, expires = entry
+            if expires is not None and expires <= monotonic():
+                del self._entries[key]
+                self._count('evictions')
+                self._count('misses')
+                return None
+            self._entries.move_to_end(key)
+            self._count('hits')
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires = monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+BACKENDS = {
+    'lru': LRUCache,
+    'null': NullCache,
+}
+
+
+def init_cache(app: Flask) -> BaseCache:
+    """
+    Create the cache backend configured for the app and register it on app.extensions['entity_cache'].
+
+    :param app: The flask app.
+    :return: The cache
+    """
+    backend = app.config.get('ENTITY_CACHE_BACKEND', 'lru')
+    if isinstance(backend, str):
+        if backend in BACKENDS:
+            backend = BACKENDS[backend]
+        else:
+            module_name, _, class_name = backend.partition(':')
+            backend = getattr(import_module(module_name), class_name)
+    cache = backend(max_size=max(int(app.config.get('ENTITY_CACHE_MAX_SIZE', 10000)), 1),
+                    ttl=app.config.get('ENTITY_CACHE_TTL', 300))
+    app.extensions['entity_cache'] = cache
+    return cache
+
+
+def entity_key(model, id) -> tuple:
+    """
+    Return the cache key of an entity.
+
+    :param model: The model class.
+    :param id: The id of the entity.
+    :return: cache key
+    """
+    return model.__tablename__, id
+
+
+@model_changed.connect
+def invalidate(sender, ids=(), **kwargs):
+    """
+    Remove the changed entities from the cache of the current app, connected to the model_changed signal.
+
+    :param sender: The model class.
+    :param ids: The ids of the changed entities.
+    """
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('entity_cache')
+    if cache is None:
+        return
+    for id in ids:
+        cache.invalidate(entity_key(sender, id))
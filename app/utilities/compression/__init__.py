@@ -0,0 +1,210 @@
+"""
+Negotiated compression of the responses (Content-Encoding), for the large JSON pages of the list and relationship
+endpoints.
+
+The encoding is chosen from the Accept-Encoding header of the request among COMPRESSION_ALGORITHMS, the highest quality
+wins and ties go to the first one listed. gzip and deflate come from zlib, zstd is used when the optional 'zstandard'
+package is installed and skipped otherwise. Responses smaller than COMPRESSION_MIN_SIZE are sent as they are, streamed
+responses (GET /models/export) are compressed chunk by chunk whatever their size.
+
+Compressed bodies of responses carrying an ETag are kept in an LRU cache keyed by the url, the ETag and the encoding:
+the ETag changes with the content (see app.utilities.etag), so a page or an entity served again, i.e. from the entity
+cache, is not compressed again. A compressed body is a representation of its own, its ETag gets the encoding as suffix
+(i.e. "<tag>-gzip", see app.utilities.etag.encoded_etag()). The services strip the suffix before their If-Match and
+If-None-Match checks, and a 304 sent for a suffixed tag carries that tag. 'Vary: Accept-Encoding' keeps shared caches
+from mixing the encodings.
+
+The hook runs after the api log (which logs the uncompressed body) and before the metrics (which record the
+compressed size).
+
+Config Variables:
+
+- COMPRESSION_ENABLED: Compress the responses, By-default it is True.
+- COMPRESSION_ALGORITHMS: Encodings offered, in order of preference, among 'zstd', 'gzip' and 'deflate'.
+- COMPRESSION_MIN_SIZE: Bodies smaller than this number of bytes are not compressed.
+- COMPRESSION_LEVEL: Level of gzip and deflate, 1 (fastest) to 9 (smallest).
+- COMPRESSION_ZSTD_LEVEL: Level of zstd, 1 to 22.
+- COMPRESSION_MIMETYPES: Mimetypes compressed.
+- COMPRESSION_CACHE_SIZE: Compressed bodies kept for responses with an ETag, 0 to disable.
+"""
+
+import zlib
+from typing import Iterable
+from typing import Optional
+
+from flask import Flask
+from flask import current_app
+from flask import request
+from werkzeug.datastructures import Accept
+
+from app.utilities.cache import LRUCache
+from app.utilities.etag import encoded_etag
+
+try:
+    import zstandard
+except ImportError:     # optional dependency
+    zstandard = None
+
+ALGORITHMS = ('zstd', 'gzip', 'deflate')
+
+
+class Compressor:
+    """
+    Negotiates and applies the encodings of an app, holds the cache of the compressed bodies.
+    """
+
+    def __init__(self, algorithms: Iterable[str] = ('gzip', 'deflate'), level: int = 6, zstd_level: int = 3,
+                 min_size: int = 1024, mimetypes: Iterable[str] = ('application/json',), cache_size: int = 1000):
+        unknown = [algorithm for algorithm in algorithms if algorithm not in ALGORITHMS]
+        if unknown:
+            raise ValueError(f'COMPRESSION_ALGORITHMS should be among {ALGORITHMS}, unknown: {unknown}')
+        self.algorithms = tuple(algorithm for algorithm in algorithms if algorithm != 'zstd' or zstandard is not None)
+        self.level = level
+        self.zstd_level = zstd_level
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self.cache = LRUCache(max_size=cache_size, ttl=None) if cache_size else None
+
+    def negotiate(self, accept_encodings: Accept) -> Optional[str]:
+        """
+        Choose the encoding of a response.
+
+        :param accept_encodings: The parsed Accept-Encoding header of the request.
+        :return: encoding | None to send the response as it is
+        """
+        best = None
+        best_quality = 0
+        for algorithm in self.algorithms:
+            quality = accept_encodings.quality(algorithm)
+            if quality > best_quality:
+                best, best_quality = algorithm, quality
+        return best
+
+    def compressobj(self, encoding: str):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+        # wbits: 31 is the gzip container, 15 the zlib one ('deflate' in HTTP)
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        compressor = self.compressobj(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks: Iterable[bytes], encoding: str):
+        """
+        Compress a streamed body, each chunk is flushed so the client receives it without waiting for the next one.
+
+        :param chunks: body chunks, str chunks are encoded in utf-8 like werkzeug does
+        :param encoding: The encoding.
+        :return: generator of compressed chunks
+        """
+        compressor = self.compressobj(encoding)
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK if encoding == 'zstd' else zlib.Z_SYNC_FLUSH
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(flush_mode)
+            yield compressor.flush()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def stats(self) -> dict:
+        return {'algorithms': list(self.algorithms), 'cache': self.cache.stats() if self.cache is not None else None}
+
+
+def compressible(response, compressor: Compressor) -> bool:
+    return (200 <= response.status_code < 300 and response.status_code not in (204, 206)
+            and response.mimetype in compressor.mimetypes and 'Content-Encoding' not in response.headers
+            and not response.direct_passthrough)
+
+
+def set_encoding(response, encoding: str):
+    """
+    Set the Content-Encoding of a response and suffix its ETag (if any) with it.
+
+    :param response: The response.
+    :param encoding: The encoding.
+    """
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+
+
+def not_modified(response, compressor: Compressor):
+    """
+    Give a 304 response the ETag the client validated, the one of the compressed representation if it sent that one.
+
+    :param response: The 304 response.
+    :param compressor: The compressor of the app.
+    :return: The response
+    """
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    encoding = compressor.negotiate(request.accept_encodings)
+    if etag and encoding and request.if_none_match.contains_weak(encoded_etag(etag, encoding)):
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+def compress_response(response):
+    """
+    Compress the response with the encoding negotiated with the client, registered as an after_request hook.
+
+    :param response: The response.
+    :return: The response
+    """
+    compressor = current_app.extensions.get('compression')
+    if compressor is not None and response.status_code == 304:
+        return not_modified(response, compressor)
+    if compressor is None or not compressible(response, compressor):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compressor.negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compressor.compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        set_encoding(response, encoding)
+        return response
+    data = response.get_data()
+    if len(data) < compressor.min_size:
+        return response
+    etag = response.get_etag()[0]
+    key = (request.full_path, etag, encoding) if etag and compressor.cache is not None else None
+    body = compressor.cache.get(key) if key is not None else None
+    if body is None:
+        body = compressor.compress(data, encoding)
+        if key is not None:
+            compressor.cache.set(key, body)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    set_encoding(response, encoding)
+    return response
+
+
+def init_compression(app: Flask) -> Optional[Compressor]:
+    """
+    Create the compressor of the app from its config, register it on app.extensions['compression'] and hook it to the
+    responses.
+
+    :param app: The flask app.
+    :return: The compressor | None if compression is disabled
+    """
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return None
+    compressor = Compressor(algorithms=app.config.get('COMPRESSION_ALGORITHMS', ('gzip', 'deflate')),
+                            level=app.config.get('COMPRESSION_LEVEL', 6),
+                            zstd_level=app.config.get('COMPRESSION_ZSTD_LEVEL', 3),
+                            min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+                            mimetypes=app.config.get('COMPRESSION_MIMETYPES', ('application/json',)),
+                            cache_size=app.config.get('COMPRESSION_CACHE_SIZE', 1000))
+    app.extensions['compression'] = compressor
+    app.after_request(compress_response)
+    return compressor
@@ -0,0 +1,163 @@
+"""
+Engine profile of the app: pool sizing, pre-ping, statement cache size, isolation level and, for SQLite, connect time
+pragmas.
+
+init_database(app) builds SQLALCHEMY_ENGINE_OPTIONS from the config variables below (options already present in
+SQLALCHEMY_ENGINE_OPTIONS win), initializes flask-sqlalchemy and registers the pragmas on every new SQLite connection.
+Pool sizing does not apply to in-memory SQLite databases, they use a single shared connection.
+
+Config Variables:
+
+- DATABASE_POOL_SIZE: Connections kept open by the pool.
+- DATABASE_MAX_OVERFLOW: Connections opened above DATABASE_POOL_SIZE under load, closed when returned.
+- DATABASE_POOL_TIMEOUT: Seconds to wait for a free connection before failing.
+- DATABASE_POOL_RECYCLE: Seconds after which a connection is replaced, -1 to never replace them.
+- DATABASE_POOL_PRE_PING: Test connections when they are checked out, to survive server restarts and idle timeouts.
+- DATABASE_STATEMENT_CACHE_SIZE: Size of sqlalchemy's compiled statement cache.
+- DATABASE_ISOLATION_LEVEL: Isolation level of the connections, None for the driver default.
+- SQLITE_PRAGMAS: {pragma: value} executed on every new SQLite connection, i.e. journal_mode, synchronous, mmap_size,
+cache_size and busy_timeout.
+- ASYNC_DATABASE_URL: URL of the asyncio engine (see create_async_database_engine()), None (default) for the database
+of SQLALCHEMY_DATABASE_URI with the asyncio driver of its backend (ASYNC_DRIVERS).
+"""
+
+from typing import Optional
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import URL
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.extensions import db
+from app.utilities.database.replicas import init_replicas
+
+# config variable: create_engine() argument
+POOL_OPTIONS = {
+    'DATABASE_POOL_SIZE': 'pool_size',
+    'DATABASE_MAX_OVERFLOW': 'max_overflow',
+    'DATABASE_POOL_TIMEOUT': 'pool_timeout',
+    'DATABASE_POOL_RECYCLE': 'pool_recycle',
+}
+
+ENGINE_OPTIONS = {
+    'DATABASE_POOL_PRE_PING': 'pool_pre_ping',
+    'DATABASE_STATEMENT_CACHE_SIZE': 'query_cache_size',
+    'DATABASE_ISOLATION_LEVEL': 'isolation_level',
+}
+
+# backend: asyncio driver
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg',
+    'mysql': 'aiomysql',
+}
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def is_sqlite_memory(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config: dict) -> dict:
+    """
+    Return the create_engine() arguments of a config.
+
+    :param config: The app config.
+    :return: engine options
+    """
+    options = dict()
+    names = dict(ENGINE_OPTIONS)
+    if not is_sqlite_memory(config['SQLALCHEMY_DATABASE_URI']):
+        names.update(POOL_OPTIONS)
+    for name, option in names.items():
+        if config.get(name) is not None:
+            options[option] = config[name]
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def sqlite_pragmas_listener(pragmas: dict):
+    """
+    Return a 'connect' event listener executing the pragmas on new DBAPI connections.
+
+    :param pragmas: {pragma: value}
+    :return: listener
+    """
+    statements = [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def register_sqlite_pragmas(engine, pragmas: dict):
+    if pragmas and is_sqlite(engine.url):
+        event.listen(engine, 'connect', sqlite_pragmas_listener(pragmas))
+
+
+def async_database_url(config: dict, url: Optional[URL] = None) -> URL:
+    """
+    Return the URL of the asyncio engine of a config.
+
+    :param config: The app config.
+    :param url: URL of the flask-sqlalchemy engine, SQLALCHEMY_DATABASE_URI by default.
+    :return: ASYNC_DATABASE_URL | the URL with the asyncio driver of its backend
+    :raises ValueError If the backend has no known asyncio driver.
+    """
+    if config.get('ASYNC_DATABASE_URL'):
+        return make_url(config['ASYNC_DATABASE_URL'])
+    url = url or make_url(config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no asyncio driver known for {backend}, set ASYNC_DATABASE_URL')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_database_engine(app: Flask) -> AsyncEngine:
+    """
+    Create an asyncio engine (sqlalchemy.ext.asyncio) on the database of the app, with the same engine profile as its
+    flask-sqlalchemy engine.
+
+    :param app: The flask app.
+    :return: The engine
+    """
+    options = engine_options(app.config)
+    if 'pool_size' in options:
+        # aiosqlite defaults to NullPool, the pool profile applies to it like to the other drivers
+        options.setdefault('poolclass', AsyncAdaptedQueuePool)
+    with app.app_context():
+        # flask-sqlalchemy resolves relative SQLite paths to the instance folder
+        url = async_database_url(app.config, db.engine.url)
+    engine = create_async_engine(url, **options)
+    register_sqlite_pragmas(engine.sync_engine, app.config.get('SQLITE_PRAGMAS'))
+    return engine
+
+
+def init_database(app: Flask):
+    """
+    Initialize flask-sqlalchemy for the app with the engine profile of its config, and its read replicas (see
+    app.utilities.database.replicas).
+
+    :param app: The flask app.
+    """
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if pragmas:
+        with app.app_context():
+            for engine in db.engines.values():
+                register_sqlite_pragmas(engine, pragmas)
+    init_replicas(app)
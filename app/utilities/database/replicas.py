@@ -0,0 +1,224 @@
+"""
+Read replicas of the GET endpoints.
+
+The read methods of BaseService are decorated with replica_read: while one of them runs, the statements of the session
+are sent to a read replica (see app.extensions.RoutingSession) chosen by the ReplicaRouter of the app, round-robin or
+least-loaded (fewest reads in flight). Writes and flushes always go to the primary.
+
+- Fallback: if a read fails on a replica with a database error, the replica is skipped for
+DATABASE_REPLICA_RETRY_AFTER seconds and the read is run again on the primary.
+- Read-your-writes: a request that wrote (model_changed was sent) gets a cookie, the reads of that client go to the
+primary until it expires DATABASE_READ_YOUR_WRITES seconds later, so it does not read stale replicas.
+- Entity cache: a replica may lag behind the invalidations of the cache, a form read from a replica is stored only if
+its 'updated' is the one of the primary (one primary key lookup on the primary, see primary_reads()). Forms of rows the
+replica has not caught up with are served but not cached, hits are served without reading any database.
+
+Replicas are flask-sqlalchemy binds (SQLALCHEMY_BINDS) holding a copy of the primary's tables, i.e. a second SQLite
+file locally.
+
+Config Variables:
+
+- DATABASE_READ_REPLICAS: Keys of the SQLALCHEMY_BINDS used as read replicas, empty (default) to read from the primary.
+- DATABASE_REPLICA_POLICY: 'round_robin' (default) or 'least_loaded'.
+- DATABASE_REPLICA_RETRY_AFTER: Seconds a failed replica is skipped.
+- DATABASE_READ_YOUR_WRITES: Seconds the reads of a client go to the primary after it wrote, 0 to disable.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from time import monotonic
+from time import time
+from typing import Optional
+
+from flask import Flask
+from flask import current_app
+from flask import g
+from flask import has_request_context
+from flask import request
+from sqlalchemy.exc import DBAPIError
+
+from app.extensions import db
+from app.models.signals import model_changed
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+READ_YOUR_WRITES_COOKIE = 'read_primary_until'
+
+
+class ReplicaRouter:
+    """
+    Chooses the read replica of each read and keeps track of the failed ones.
+    """
+    POLICIES = ('round_robin', 'least_loaded')
+
+    def __init__(self, keys: list[str], policy: str = 'round_robin', retry_after: float = 30.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f'DATABASE_REPLICA_POLICY should be one of {self.POLICIES}, got: {policy}')
+        self.keys = list(keys)
+        self.policy = policy
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._next = 0
+        self._in_flight = dict.fromkeys(self.keys, 0)
+        self._failed_until = dict.fromkeys(self.keys, 0.0)
+        self._counters = {'replica_reads': 0, 'primary_reads': 0, 'failures': 0}
+
+    def acquire(self) -> Optional[str]:
+        """
+        Choose a healthy replica and count a read in flight on it, release() it when the read is done.
+
+        :return: bind key of the replica | None if every replica failed recently
+        """
+        now = monotonic()
+        with self._lock:
+            healthy = [key for key in self.keys if self._failed_until[key] <= now]
+            if not healthy:
+                return None
+            if self.policy == 'least_loaded':
+                key = min(healthy, key=lambda name: self._in_flight[name])
+            else:
+                key = healthy[self._next % len(healthy)]
+                self._next += 1
+            self._in_flight[key] += 1
+            self._counters['replica_reads'] += 1
+            return key
+
+    def release(self, key: str):
+        with self._lock:
+            self._in_flight[key] -= 1
+
+    def mark_failed(self, key: str):
+        with self._lock:
+            self._failed_until[key] = monotonic() + self.retry_after
+            self._counters['failures'] += 1
+
+    def count_primary_read(self):
+        with self._lock:
+            self._counters['primary_reads'] += 1
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the router and the replicas currently skipped.
+
+        :return: dict of counters
+        """
+        now = monotonic()
+        with self._lock:
+            stats = dict(self._counters)
+            stats['failed'] = [key for key in self.keys if self._failed_until[key] > now]
+        return stats
+
+
+def reading_from_replica() -> bool:
+    """
+    Return True while the current read runs on a replica.
+
+    :return: bool
+    """
+    return g.get('read_bind') is not None
+
+
+@contextmanager
+def primary_reads():
+    """
+    Send the reads of the block to the primary, i.e. to check a row read from a replica against it.
+    """
+    key = g.get('read_bind')
+    g.read_bind = None
+    try:
+        yield
+    finally:
+        g.read_bind = key
+
+
+def must_read_primary() -> bool:
+    if g.get('database_wrote'):
+        return True
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time()
+    except ValueError:
+        return False
+
+
+def replica_read(method):
+    """
+    Decorator of the read methods of BaseService, runs the method on a read replica with fallback to the primary.
+
+    Methods returning lazy (streamed) responses should not be decorated, their reads would happen after the decorator
+    returned.
+    """
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get('replica_router')
+        if router is None or not has_request_context() or g.get('read_bind') is not None:
+            return method(*args, **kwargs)
+        if must_read_primary():
+            router.count_primary_read()
+            return method(*args, **kwargs)
+        key = router.acquire()
+        if key is None:
+            router.count_primary_read()
+            return method(*args, **kwargs)
+        g.read_bind = key
+        try:
+            return method(*args, **kwargs)
+        except DBAPIError as e:
+            app_logger.error(f'read replica {key} failed, reading from the primary: {getattr(e, "orig", e)}')
+            router.mark_failed(key)
+            db.session.rollback()
+            g.read_bind = None
+            router.count_primary_read()
+            return method(*args, **kwargs)
+        finally:
+            g.read_bind = None
+            router.release(key)
+
+    return wrapper
+
+
+@model_changed.connect
+def remember_write(sender, **kwargs):
+    """
+    Flag the current request as a writing one, connected to the model_changed signal.
+    """
+    if has_request_context():
+        g.database_wrote = True
+
+
+def set_read_your_writes_cookie(response):
+    """
+    Send the read-your-writes cookie to the clients that wrote, registered as an after_request hook.
+
+    :param response: The response.
+    :return: The response
+    """
+    window = current_app.config.get('DATABASE_READ_YOUR_WRITES', 0)
+    # g outlives the request when the app context was pushed before it
+    if g.pop('database_wrote', False) and window:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, f'{time() + window:.3f}', max_age=window, httponly=True)
+    return response
+
+
+def init_replicas(app: Flask) -> Optional[ReplicaRouter]:
+    """
+    Create the replica router of the app from its config and register it on app.extensions['replica_router'].
+
+    :param app: The flask app.
+    :return: The router | None if no read replica is configured
+    """
+    keys = app.config.get('DATABASE_READ_REPLICAS') or ()
+    if not keys:
+        return None
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    missing = [key for key in keys if key not in binds]
+    if missing:
+        raise ValueError(f'DATABASE_READ_REPLICAS should be keys of SQLALCHEMY_BINDS, unknown: {missing}')
+    router = ReplicaRouter(keys, policy=app.config.get('DATABASE_REPLICA_POLICY', 'round_robin'),
+                           retry_after=float(app.config.get('DATABASE_REPLICA_RETRY_AFTER', 30)))
+    app.extensions['replica_router'] = router
+    app.after_request(set_read_your_writes_cookie)
+    return router
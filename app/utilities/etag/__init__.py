@@ -0,0 +1,75 @@
+"""
+Strong ETags derived from the 'updated' column of BaseModel.
+
+A resource's ETag is a digest of its table, id and 'updated', a collection page's ETag is a digest of the table, the
+ids and the latest 'updated' of the models in the page and the parameters selecting the page. Tags are returned
+unquoted, werkzeug's quote_etag() and ETags (request.if_match / request.if_none_match) handle the quoting.
+
+A compressed representation is a different one (RFC 9110 8.8.3), its ETag is the one of the identity body suffixed by
+its Content-Encoding (encoded_etag(), see app.utilities.compression). The conditional request checks compare the tags
+of the identity bodies, the suffix of the tags sent back by clients is removed with identity_etags().
+"""
+
+from datetime import datetime
+from hashlib import blake2b
+from typing import Optional
+from uuid import UUID
+
+from werkzeug.datastructures import ETags
+
+
+def _digest(*parts) -> str:
+    return blake2b('\x1f'.join(str(part) for part in parts).encode(), digest_size=16).hexdigest()
+
+
+def entity_etag(model, id: UUID, updated: datetime) -> str:
+    """
+    Return the ETag of a resource.
+
+    :param model: The model class.
+    :param id: The id of the resource.
+    :param updated: The 'updated' column of the resource.
+    :return: unquoted ETag
+    """
+    return _digest(model.__tablename__, id, updated.isoformat())
+
+
+def collection_etag(model, model_objects: list, *args) -> str:
+    """
+    Return the ETag of a page of a collection.
+
+    :param model: The model class.
+    :param model_objects: The models of the page, in order.
+    :param args: Anything else that selects the page or changes its representation (page, limit, cursor, ...).
+    :return: unquoted ETag
+    """
+    updated = max((model_object.updated for model_object in model_objects), default=None)
+    return _digest(model.__tablename__, updated.isoformat() if updated else '',
+                   *(model_object.id for model_object in model_objects), *args)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    Return the ETag of a representation compressed with the given Content-Encoding.
+
+    :param etag: unquoted ETag of the identity representation
+    :param encoding: The Content-Encoding.
+    :return: unquoted ETag
+    """
+    return f'{etag}-{encoding}'
+
+
+def identity_etags(etags: Optional[ETags]) -> Optional[ETags]:
+    """
+    Return the ETags of an If-Match or If-None-Match header with the encoding suffix of encoded_etag() removed.
+
+    The tags of this module are hex digests, anything after a '-' is the suffix.
+
+    :param etags: ETags of the header
+    :return: ETags of the identity representations
+    """
+    if not etags or etags.star_tag:
+        return etags
+    strong = {etag.split('-', 1)[0] for etag in etags.as_set()}
+    weak = {etag.split('-', 1)[0] for etag in etags.as_set(include_weak=True)} - strong
+    return ETags(strong, weak)
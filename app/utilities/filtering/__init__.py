@@ -0,0 +1,227 @@
+"""
+Filter and sort query language of the list endpoints (GET /models).
+
+Filters are URL parameters in the form 'filter[column][operator]=value' (the operator defaults to 'eq'), sorting is
+the 'sort' URL parameter, a comma separated list of columns, each one prefixed with '-' for descending order, i.e.
+
+    ?filter[base_price][gte]=10&filter[code][prefix]=P-&sort=-updated
+
+Only the columns in the model's __filter_fields__ are accepted and values are converted by the fields of the model's
+schema, so every value reaches the database as a bound parameter. Statements built for the same columns and operators
+have the same structure and share sqlalchemy's compiled statement cache ('in' lists are expanding parameters).
+
+A query is considered indexed if one of its filters can use an index of the table (the filter column leads an index,
+or follows 'active' in one, and the operator is not 'ne'), or, without filters, if the first sort column is indexed.
+What happens to other queries is decided by the QUERY_UNINDEXED_POLICY config variable.
+
+Config Variables:
+
+- QUERY_UNINDEXED_POLICY: 'allow' (run unindexed queries), 'flag' (default, run them, log a warning and add the
+X-Query-Unindexed header to the response) or 'reject' (answer 400).
+"""
+
+from marshmallow import Schema
+from marshmallow import ValidationError
+from sqlalchemy import inspect
+from werkzeug.datastructures import MultiDict
+
+FILTER_PREFIX = 'filter['
+
+OPERATORS = ('eq', 'ne', 'lt', 'lte', 'gt', 'gte', 'in', 'prefix', 'null')
+
+# operators a btree index can serve
+INDEXED_OPERATORS = frozenset(('eq', 'lt', 'lte', 'gt', 'gte', 'in', 'prefix', 'null'))
+
+# upper bound of the strings starting with a prefix, see ListQuery.condition()
+_MAX_CHAR = '\U0010ffff'
+
+
+class QueryError(ValueError):
+    """
+    Raised for malformed filters or sort orders, the message is meant for the API caller.
+    """
+
+
+class ListQuery:
+    """
+    Parsed filters and sort order of a list request.
+
+    Class Variables:
+
+    - criteria: sqlalchemy WHERE criteria, to pass to BaseModel.get_all() | get_all_after() | count().
+
+    - order: Sort order as (column, descending) pairs ending with ('id', False), None for the model's default order.
+
+    - unindexed: Why the query can not use an index, None if it can.
+
+    - key: Canonical form of the query, part of the collection ETag.
+    """
+
+    def __init__(self, model, schema: Schema, args: MultiDict):
+        """
+        Parse the filter and sort URL parameters.
+
+        :param model: The model class (subclass of BaseModel).
+        :param schema: Schema instance of the model, its fields convert the filter values.
+        :param args: URL parameters.
+        :raises QueryError If a parameter is malformed or uses a column that is not filterable.
+        """
+        self.model = model
+        self.schema = schema
+        self.fields = filter_fields(model)
+        self.filters = self.parse_filters(args)
+        self.order = self.parse_sort(args.get('sort', ''))
+        self.criteria = [self.condition(name, operator, value) for name, operator, value in self.filters]
+        self.unindexed = self.check_indexes()
+        self.key = repr((self.filters, self.order))
+
+    def __bool__(self) -> bool:
+        return bool(self.filters or self.order)
+
+    def parse_filters(self, args: MultiDict) -> list[tuple]:
+        filters = list()
+        for arg, raw_values in args.lists():
+            if not arg.startswith(FILTER_PREFIX):
+                continue
+            name, operator = self.parse_filter_arg(arg)
+            for raw in raw_values:
+                filters.append((name, operator, self.convert(name, operator, raw)))
+        return sorted(filters, key=lambda item: (item[0], item[1], repr(item[2])))
+
+    def parse_filter_arg(self, arg: str) -> tuple[str, str]:
+        parts = arg[len(FILTER_PREFIX):].rstrip(']').split('][')
+        if len(parts) == 1:
+            parts.append('eq')
+        if len(parts) != 2 or not arg.endswith(']'):
+            raise QueryError(f'malformed filter {arg}, expected filter[column][operator]')
+        name, operator = parts
+        if name not in self.fields:
+            raise QueryError(f'can not filter by {name}, filterable columns are {", ".join(sorted(self.fields))}')
+        if operator not in OPERATORS:
+            raise QueryError(f'unknown filter operator {operator}, operators are {", ".join(OPERATORS)}')
+        return name, operator
+
+    def convert(self, name: str, operator: str, raw: str):
+        if operator == 'null':
+            if raw.lower() not in ('true', 'false', '1', '0'):
+                raise QueryError(f'filter[{name}][null] expects true or false')
+            return raw.lower() in ('true', '1')
+        field = self.schema.fields.get(name)
+        if operator == 'in':
+            return tuple(self.deserialize(field, name, item) for item in raw.split(','))
+        value = self.deserialize(field, name, raw)
+        if operator == 'prefix' and not isinstance(value, str):
+            raise QueryError(f'filter[{name}][prefix] is only supported on text columns')
+        return value
+
+    @staticmethod
+    def deserialize(field, name: str, raw: str):
+        if field is None:
+            return raw
+        try:
+            return field.deserialize(raw)
+        except ValidationError as err:
+            raise QueryError(f'invalid value for {name}: {" ".join(err.messages)}')
+
+    def parse_sort(self, sort: str) -> tuple[tuple[str, bool], ...] | None:
+        order = list()
+        for item in sort.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            name = item.lstrip('-')
+            if name not in self.fields:
+                raise QueryError(f'can not sort by {name}, sortable columns are {", ".join(sorted(self.fields))}')
+            if name not in (key for key, _ in order):
+                order.append((name, item.startswith('-')))
+        if not order:
+            return None
+        if 'id' not in (key for key, _ in order):
+            order.append(('id', False))
+        return tuple(order)
+
+    def condition(self, name: str, operator: str, value):
+        column = getattr(self.model, name)
+        if operator == 'eq':
+            return column == value
+        if operator == 'ne':
+            return column != value
+        if operator == 'lt':
+            return column < value
+        if operator == 'lte':
+            return column <= value
+        if operator == 'gt':
+            return column > value
+        if operator == 'gte':
+            return column >= value
+        if operator == 'in':
+            return column.in_(value)
+        if operator == 'prefix':
+            # a range instead of LIKE 'value%' so an index on the column is usable whatever the collation
+            return (column >= value) & (column < value + _MAX_CHAR)
+        return column.is_(None) if value else column.is_not(None)
+
+    def check_indexes(self) -> str | None:
+        indexed = indexed_columns(self.model)
+        if self.filters:
+            if any(name in indexed and operator in INDEXED_OPERATORS for name, operator, _ in self.filters):
+                return None
+            return f'no index on {", ".join(sorted({name for name, _, _ in self.filters}))}'
+        if self.order and self.order[0][0] not in indexed:
+            return f'no index on {self.order[0][0]}'
+        return None
+
+    def cursor_keys(self) -> list[str]:
+        """
+        Return the sort keys stored in the cursors of this query, descending keys are prefixed with '-'.
+
+        :return: list of keys
+        :raises QueryError If a sort column is nullable, keyset pagination would skip rows having NULL.
+        """
+        columns = self.model.__table__.columns
+        for name, _ in self.order:
+            if columns[name].nullable:
+                raise QueryError(f'can not sort by {name} with a cursor, the column is nullable')
+        return [('-' if descending else '') + name for name, descending in self.order]
+
+
+def filter_fields(model) -> frozenset[str]:
+    """
+    Return the names of the columns a model can be filtered and sorted by.
+
+    :param model: The model class.
+    :return: set of column names
+    """
+    if model.__filter_fields__ is not None:
+        return frozenset(model.__filter_fields__)
+    return frozenset(attribute.key for attribute in inspect(model).column_attrs if attribute.key != 'active')
+
+
+def indexed_columns(model) -> frozenset[str]:
+    """
+    Return the columns of a model that lead an index, or follow 'active' in one (every query filters on 'active').
+
+    :param model: The model class.
+    :return: set of column names
+    """
+    indexed = {column.name for column in model.__table__.primary_key.columns}
+    for index in model.__table__.indexes:
+        names = [column.name for column in index.columns]
+        if names:
+            indexed.add(names[0])
+        if len(names) > 1 and names[0] == 'active':
+            indexed.add(names[1])
+    return frozenset(indexed)
+
+
+def parse_list_query(model, schema: Schema, args: MultiDict) -> ListQuery:
+    """
+    Parse the filter and sort URL parameters of a list request.
+
+    :param model: The model class.
+    :param schema: Schema instance of the model.
+    :param args: URL parameters.
+    :return: ListQuery
+    :raises QueryError If a parameter is malformed or uses a column that is not filterable.
+    """
+    return ListQuery(model, schema, args)
@@ -0,0 +1,124 @@
+"""
+JSON provider of the app (app.json): encodes the responses, jsonify() and the export streams.
+
+With the 'orjson' backend (the optional orjson package) UUID, datetime, date and time values are encoded natively, so
+the dumpers of the services leave them as they are instead of converting them to strings first (see
+app.models.serializer.get_dumper(native=True) and native_types()). The response bodies are built as bytes, without an
+intermediate str. The 'stdlib' backend uses the json module with the same conversions done by default().
+
+Both backends write UUIDs as strings, datetimes, dates and times in ISO 8601 (like marshmallow, flask's default
+provider writes datetimes in the HTTP date format) and Decimals as strings, so no precision is lost. Keys are sorted
+like flask does (sort_keys), orjson does not escape non ASCII characters (ensure_ascii is ignored).
+
+Config Variables:
+
+- JSON_BACKEND: 'auto' (default, orjson if it is installed), 'orjson' or 'stdlib'.
+"""
+
+import dataclasses
+import json
+from datetime import date
+from datetime import time
+from decimal import Decimal
+from uuid import UUID
+
+from flask import Flask
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:     # optional dependency
+    orjson = None
+
+BACKENDS = ('auto', 'orjson', 'stdlib')
+
+
+def default(o):
+    """
+    Encode the values the backends do not handle themselves.
+
+    :param o: The value.
+    :return: JSON compatible value
+    :raises TypeError If the value can not be encoded.
+    """
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    if isinstance(o, (UUID, Decimal)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider with an orjson backend and a stdlib fallback, see the module documentation.
+
+    Attributes:
+
+    - backend: 'orjson' or 'stdlib'.
+    - native_types: True if UUID and datetime values should be given to the provider as they are.
+    """
+
+    def __init__(self, app: Flask, backend: str = 'auto'):
+        super().__init__(app)
+        if backend not in BACKENDS:
+            raise ValueError(f'JSON_BACKEND should be one of {BACKENDS}, got: {backend}')
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'stdlib'
+        if backend == 'orjson' and orjson is None:
+            raise ValueError("JSON_BACKEND is 'orjson' but orjson is not installed")
+        self.backend = backend
+        self.native_types = backend == 'orjson'
+
+    def _orjson_option(self, pretty: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.dumps(obj, default=default, option=self._orjson_option()).decode()
+        kwargs.setdefault('default', default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.backend != 'orjson':
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=default, option=self._orjson_option(pretty))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def native_types() -> bool:
+    """
+    Return True if the JSON provider of the current app encodes UUID and datetime values natively.
+
+    :return: bool
+    """
+    return getattr(current_app.json, 'native_types', False)
+
+
+def init_json(app: Flask) -> CatalogJSONProvider:
+    """
+    Create the JSON provider of the app from its config and install it as app.json.
+
+    :param app: The flask app.
+    :return: The provider
+    """
+    app.json = CatalogJSONProvider(app, backend=app.config.get('JSON_BACKEND', 'auto'))
+    return app.json
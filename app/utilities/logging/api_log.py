@@ -5,11 +5,11 @@ from copy import deepcopy
 from flask import g
 from flask import request
 from flask import Response
+from flask import current_app
 
-from app.models.log import IncomingAPI
+from app.utilities.logging.timing import RequestTiming
 from environ import API_LOGGER_NAME
 from environ import APP_LOGGER_NAME
-from app.extensions import db
 
 app_logger = logging.getLogger(APP_LOGGER_NAME)
 api_logger = logging.getLogger(API_LOGGER_NAME)
@@ -18,11 +18,21 @@ api_logger = logging.getLogger(API_LOGGER_NAME)
 def get_request_time():
     request_time = datetime.now()
     setattr(g, 'request_time', request_time)
+    setattr(g, 'timing', RequestTiming())
 
 
 def log_api_call(response: Response):
     response_time = datetime.now()
     request_time = getattr(g, 'request_time')
+    timing = getattr(g, 'timing')
+    total = timing.elapsed()
+    if current_app.config.get('SERVER_TIMING_HEADER', True):
+        response.headers['Server-Timing'] = timing.server_timing(total)
+    threshold = current_app.config.get('SQL_STATEMENT_WARNING_THRESHOLD', 0)
+    if threshold and timing.db_statements > threshold:
+        statement, count = timing.most_repeated()
+        app_logger.warning(f'{request.method} {request.full_path} executed {timing.db_statements} SQL statements, '
+                           f'possible N+1 queries, the most repeated one ({count} times): {statement}')
     message = {
         'url': request.url,
         'method': request.method,
@@ -30,11 +40,17 @@ def log_api_call(response: Response):
         'status': response.status,
         'headers': str(request.headers),
         'body': str(request.get_json(silent=True)) or request.get_data(),
-        'r_body': str(response.get_json(silent=True)) or response.get_data(),
+        # reading a streamed body would buffer the whole response in memory
+        'r_body': '<streamed>' if response.is_streamed else str(response.get_json(silent=True)) or response.get_data(),
         'r_headers': str(response.headers),
         'request_time': request_time,
         'response_time': response_time,
-        'remote_address': request.remote_addr
+        'remote_address': request.remote_addr,
+        'db_statements': timing.db_statements,
+        'db_time': timing.db_time * 1000,
+        'service_time': timing.phases['service'] * 1000,
+        'serialize_time': timing.phases['serialize'] * 1000,
+        'total_time': total * 1000
     }
 
     file_message = deepcopy(message)
@@ -43,8 +59,8 @@ def log_api_call(response: Response):
     api_logger.info(msg=message)
     app_logger.info(msg=message)
 
-    incoming_api = IncomingAPI(**message)
-    db.session.add(incoming_api)
-    db.session.commit()
+    audit_log = current_app.extensions.get('audit_log')
+    if audit_log:
+        audit_log.submit(message)
 
     return response
@@ -0,0 +1,249 @@
+import os
+import atexit
+import logging
+import queue
+import threading
+from time import monotonic
+from time import sleep
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.log import IncomingAPI
+from app.extensions import db
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+# seconds the idle worker waits for a record before checking whether it is stopped
+_POLL_INTERVAL = 0.05
+
+
+class AuditLogWriter:
+    """
+    Background writer for IncomingAPI records.
+
+    Records are put on a bounded in-process queue by the request thread and a daemon worker thread drains the queue,
+    inserting the records with one bulk INSERT per batch. A batch is flushed when it reaches 'batch_size' records or
+    when 'flush_interval' seconds have passed since its first record, whichever comes first.
+
+    The worker runs in its own app context, so it uses its own session and never commits the request's session. It is
+    started lazily on the first submitted record (and restarted after a fork), which keeps pre-fork servers safe.
+
+    Config Variables:
+
+    - AUDIT_LOG_ASYNC: If False records are written synchronously on the calling thread (still outside the request's
+    session), By-default it is True.
+    - AUDIT_LOG_QUEUE_SIZE: Maximum number of records waiting in the queue.
+    - AUDIT_LOG_BATCH_SIZE: Maximum number of records inserted by one statement.
+    - AUDIT_LOG_FLUSH_INTERVAL: Maximum number of seconds a record waits in a partial batch.
+    - AUDIT_LOG_OVERFLOW_POLICY: What to do when the queue is full, one of:
+        - 'drop_oldest' (default): evict the oldest queued record to make room for the new one.
+        - 'block': wait up to AUDIT_LOG_BLOCK_TIMEOUT seconds for free space, then drop the record. The wait happens
+        on the request thread (or the event loop under ASGI), opt in only if losing records is worse than latency.
+        - 'sample': keep only one out of every AUDIT_LOG_SAMPLE_RATE overflowing records (evicting the oldest one),
+        drop the rest.
+    """
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'sample')
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 100
+        self.flush_interval = 1.0
+        self.overflow_policy = 'drop_oldest'
+        self.block_timeout = 0.5
+        self.sample_rate = 10
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._overflow_seen = 0
+        self._counters = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """
+        Read the configuration of the writer from the app config and register it on app.extensions['audit_log'].
+
+        :param app: The flask app.
+        """
+        self.app = app
+        self.enabled = app.config.get('AUDIT_LOG_ASYNC', True)
+        self.batch_size = max(int(app.config.get('AUDIT_LOG_BATCH_SIZE', 100)), 1)
+        self.flush_interval = float(app.config.get('AUDIT_LOG_FLUSH_INTERVAL', 1.0))
+        self.block_timeout = app.config.get('AUDIT_LOG_BLOCK_TIMEOUT', 0.5)
+        self.sample_rate = max(int(app.config.get('AUDIT_LOG_SAMPLE_RATE', 10)), 1)
+        self.overflow_policy = app.config.get('AUDIT_LOG_OVERFLOW_POLICY', 'drop_oldest')
+        if self.overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'AUDIT_LOG_OVERFLOW_POLICY should be one of {self.OVERFLOW_POLICIES}, '
+                             f'got: {self.overflow_policy}')
+        self._queue = queue.Queue(maxsize=int(app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000)))
+        app.extensions['audit_log'] = self
+
+    def submit(self, record: dict) -> bool:
+        """
+        Queue a record to be inserted as an IncomingAPI row.
+
+        :param record: Column names of IncomingAPI and their respective value.
+        :return: True if the record is accepted | False if it is dropped
+        """
+        if not self.enabled:
+            self._count('queued')
+            self.write([record])
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            return self._overflow(record)
+        self._count('queued')
+        return True
+
+    def write(self, records: list[dict]) -> bool:
+        """
+        Insert the given records with a single bulk INSERT and commit them, in a fresh app context.
+
+        :param records: List of records.
+        :return: True on success | False
+        """
+        try:
+            with self.app.app_context():
+                db.session.execute(insert(IncomingAPI), records)
+                db.session.commit()
+        except SQLAlchemyError as e:
+            app_logger.error(f'failed to write {len(records)} audit log record(s): {getattr(e, "orig", e)}')
+            self._count('failed', len(records))
+            return False
+        self._count('written', len(records))
+        self._count('batches')
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every queued record is written (or failed).
+
+        :param timeout: Maximum number of seconds to wait.
+        :return: True if the queue is drained | False on timeout
+        """
+        deadline = monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if monotonic() >= deadline or not self._is_running():
+                return not self._queue.unfinished_tasks
+            sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Flush the remaining records and stop the worker thread, called at interpreter exit.
+
+        The worker is signaled with an event rather than a record put on the queue: a full queue can not hold it back
+        and the overflow policies can not evict it.
+
+        :param timeout: Maximum number of seconds to wait for the worker.
+        """
+        if not self._is_running():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            app_logger.error(f'audit log worker did not stop within {timeout}s, '
+                             f'{self._queue.qsize()} record(s) not written')
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the writer.
+
+        - queued: Records accepted.
+        - written: Records inserted in the DB.
+        - dropped: Records dropped because of the overflow policy.
+        - failed: Records lost because of DB errors.
+        - batches: Number of INSERT statements executed.
+        - pending: Records currently waiting in the queue.
+
+        :return: dict of counters
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+    def _count(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def _is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            if self._pid != os.getpid():
+                # threads do not survive a fork, neither should the parent's queued records
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            if self._thread is None:
+                atexit.register(self.stop)
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _overflow(self, record: dict) -> bool:
+        if self.overflow_policy == 'block':
+            try:
+                self._queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self._count('dropped')
+                return False
+            self._count('queued')
+            return True
+
+        if self.overflow_policy == 'sample':
+            with self._lock:
+                self._overflow_seen += 1
+                keep = self._overflow_seen % self.sample_rate == 0
+            if not keep:
+                self._count('dropped')
+                return False
+
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+                self._count('queued')
+                return True
+            except queue.Full:
+                continue
+
+    def _run(self):
+        # once stopping, the records still queued are written before the worker exits
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                item = self._queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            batch = [item]
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, _POLL_INTERVAL)))
+                except queue.Empty:
+                    if self._stopping.is_set():
+                        break
+            self.write(batch)
+            for _ in batch:
+                self._queue.task_done()
@@ -1,3 +1,10 @@
+"""
+Loggers of the app and their file handlers.
+
+Importing this module has no side effect on the file system: the log files (and LOG_FILE_DIR) are created and opened
+by the first record written to them, so CLI commands and workers that log nothing do not open them.
+"""
+
 import logging
 from pathlib import Path
 from logging import FileHandler
@@ -7,15 +14,25 @@ from environ import API_LOGGER_NAME
 from environ import APP_LOGGER_FILE_PATH
 from environ import API_LOGGER_FILE_PATH
 from environ import EXCEPTION_LOGGER_FILE_PATH
-from environ import LOG_FILE_DIR
 
-if not Path(LOG_FILE_DIR).exists():
-    Path(LOG_FILE_DIR).mkdir(parents=True, exist_ok=True)
+
+class LazyFileHandler(FileHandler):
+    """
+    FileHandler opening its file, and creating its directory, on the first record.
+    """
+
+    def __init__(self, filename: str, mode: str = 'a+'):
+        super().__init__(filename=filename, mode=mode, delay=True)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
 
 # Handlers
-app_log_file_handler = FileHandler(filename=APP_LOGGER_FILE_PATH, mode='a+')
-api_log_file_handler = FileHandler(filename=API_LOGGER_FILE_PATH, mode='a+')
-exception_log_file_handler = FileHandler(filename=EXCEPTION_LOGGER_FILE_PATH, mode='a+')
+app_log_file_handler = LazyFileHandler(filename=APP_LOGGER_FILE_PATH)
+api_log_file_handler = LazyFileHandler(filename=API_LOGGER_FILE_PATH)
+exception_log_file_handler = LazyFileHandler(filename=EXCEPTION_LOGGER_FILE_PATH)
 
 # Formats
 json_file_format = {
@@ -0,0 +1,119 @@
+"""
+Per-request instrumentation: number of SQL statements, time spent in the DB and in the service and serialization
+phases, measured with perf_counter.
+
+The numbers of the current request live in g.timing (a RequestTiming, created by get_request_time()), they are added to
+the api log, to the IncomingAPI record and to the Server-Timing response header by log_api_call(). Statements are
+counted by cursor execute hooks registered on every sqlalchemy Engine, statements executed outside of a request (or in
+another app context, like the audit log writer's) are not counted.
+
+Config Variables:
+
+- SERVER_TIMING_HEADER: Add the Server-Timing header to the responses, By-default it is True.
+- SQL_STATEMENT_WARNING_THRESHOLD: Log a warning (possible N+1 queries) for requests executing more statements, 0
+disables the warning.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import g
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PHASES = ('service', 'serialize')
+
+
+class RequestTiming:
+    """
+    Timings of one request, durations are in seconds.
+    """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.db_statements = 0
+        self.db_time = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.statements = Counter()
+        self._depth = dict.fromkeys(PHASES, 0)
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    def server_timing(self, total: float) -> str:
+        """
+        Return the value of the Server-Timing header, durations are in milliseconds.
+
+        :param total: Duration of the whole request in seconds.
+        :return: header value
+        """
+        metrics = [f'db;dur={self.db_time * 1000:.3f};desc="{self.db_statements} statements"']
+        metrics += [f'{phase};dur={duration * 1000:.3f}' for phase, duration in self.phases.items()]
+        metrics.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(metrics)
+
+    def most_repeated(self) -> tuple[str, int]:
+        """
+        Return the statement executed the most times and its count, the usual suspect of N+1 queries.
+
+        :return: (statement, count)
+        """
+        return self.statements.most_common(1)[0] if self.statements else ('', 0)
+
+
+def current_timing() -> RequestTiming | None:
+    """
+    Return the timings of the current request, None outside of a request.
+
+    :return: RequestTiming | None
+    """
+    if not has_app_context():
+        return None
+    return g.get('timing')
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Add the duration of the block to a phase of the current request, nested blocks of the same phase are counted once.
+
+    :param phase: One of PHASES.
+    """
+    timing = current_timing()
+    if timing is None or timing._depth[phase]:
+        yield
+        return
+    timing._depth[phase] += 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[phase] += perf_counter() - start
+        timing._depth[phase] -= 1
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timing() is not None:
+        conn.info.setdefault('timing_start', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current_timing()
+    starts = conn.info.get('timing_start')
+    if timing is None or not starts:
+        return
+    timing.db_time += perf_counter() - starts.pop()
+    timing.db_statements += 1
+    timing.statements[statement] += 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(exception_context):
+    # after_cursor_execute is not called for failed statements
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('timing_start'):
+        connection.info['timing_start'].pop()
@@ -0,0 +1,380 @@
+"""
+In-process metrics of the API, exposed in the Prometheus text format on GET /metrics.
+
+Every request is recorded under its endpoint name (the view names built by generate_view_name()): a request counter
+by method and status code, and histograms of the latency, the response size and the DB time (see
+app.utilities.logging.timing). Metrics are lock striped, each thread is given one of STRIPES shards on first use, so
+request threads rarely wait on each other and the memory used does not grow with the number of threads.
+
+The hit, miss and eviction counters of the entity cache (app.utilities.cache) are exported as well, read from its
+stats() when the metrics are collected (StatsCounter).
+
+With several worker processes set METRICS_DIR to a directory shared by the workers (and emptied before they start).
+Each process writes its snapshot to 'metrics-<pid>.json' there, at most every METRICS_FLUSH_INTERVAL seconds and at
+exit, and GET /metrics answers the sum of the snapshots of all processes, whichever worker serves it.
+
+Config Variables:
+
+- METRICS_ENABLED: Record the requests and register GET /metrics, By-default it is True.
+- METRICS_DIR: Directory of the per process snapshots, None (default) for a single process.
+- METRICS_FLUSH_INTERVAL: Minimum number of seconds between two snapshots of a process.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import threading
+from abc import ABC
+from abc import abstractmethod
+from bisect import bisect_left
+from time import monotonic
+from typing import Callable
+from typing import Optional
+
+from flask import Flask
+from flask import Response
+from flask import current_app
+from flask import g
+from flask import request
+
+STRIPES = 16
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric(ABC):
+    """
+    Base class of the metrics, values are kept per label values in lock striped shards.
+
+    Subclasses define the values of a series (a list of numbers, summed when shards or processes are merged) and how
+    they are rendered.
+    """
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._shards = [(threading.Lock(), dict()) for _ in range(STRIPES)]
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+
+    def _shard(self) -> tuple[threading.Lock, dict]:
+        try:
+            return self._shards[self._local.shard]
+        except AttributeError:
+            self._local.shard = next(self._next_shard) % STRIPES
+            return self._shards[self._local.shard]
+
+    @abstractmethod
+    def new_values(self) -> list:
+        """
+        Return the initial values of a new series.
+
+        :return: list of numbers
+        """
+
+    def collect(self) -> dict[tuple, list]:
+        """
+        Return the values of every series, summed over the shards.
+
+        :return: {label values: values}
+        """
+        series = dict()
+        for lock, shard in self._shards:
+            with lock:
+                items = [(labels, list(values)) for labels, values in shard.items()]
+            for labels, values in items:
+                merge_values(series, labels, values)
+        return series
+
+    @abstractmethod
+    def render(self, series: dict[tuple, list]) -> list[str]:
+        """
+        Render the series in the Prometheus text format, without the HELP and TYPE lines.
+
+        :param series: {label values: values}, see collect()
+        :return: list of lines
+        """
+
+    def format_labels(self, label_values: tuple, **extra) -> str:
+        pairs = list(zip(self.labels, label_values)) + list(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{escape_label(str(value))}"' for name, value in pairs) + '}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def new_values(self) -> list:
+        return [0]
+
+    def inc(self, *label_values, amount: float = 1):
+        lock, shard = self._shard()
+        with lock:
+            values = shard.get(label_values)
+            if values is None:
+                values = shard[label_values] = self.new_values()
+            values[0] += amount
+
+    def render(self, series: dict[tuple, list]) -> list[str]:
+        return [f'{self.name}{self.format_labels(labels)} {format_value(values[0])}'
+                for labels, values in sorted(series.items())]
+
+
+class Histogram(Metric):
+    """
+    Histogram with fixed buckets, the values of a series are the (non cumulative) count of each bucket, the count of
+    the +Inf bucket and the sum of the observations.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def new_values(self) -> list:
+        return [0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        lock, shard = self._shard()
+        with lock:
+            values = shard.get(label_values)
+            if values is None:
+                values = shard[label_values] = self.new_values()
+            values[index] += 1
+            values[-1] += value
+
+    def render(self, series: dict[tuple, list]) -> list[str]:
+        lines = list()
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self.format_labels(labels, le=format_value(bound))} {cumulative}')
+            lines.append(f'{self.name}_sum{self.format_labels(labels)} {format_value(values[-1])}')
+            lines.append(f'{self.name}_count{self.format_labels(labels)} {cumulative}')
+        return lines
+
+
+class StatsCounter(Counter):
+    """
+    Counter without labels read, when collected, from the stats() of a component counting on its own, i.e. the entity
+    cache.
+    """
+
+    def __init__(self, name: str, documentation: str, stats: Callable[[], Optional[dict]], key: str):
+        super().__init__(name, documentation, ())
+        self.stats = stats
+        self.key = key
+
+    def collect(self) -> dict[tuple, list]:
+        stats = self.stats()
+        return {(): [stats[self.key]]} if stats else {}
+
+
+def cache_metrics(app: Flask) -> list[Metric]:
+    """
+    Return the counters of the entity cache of the app.
+
+    :param app: The flask app.
+    :return: list of StatsCounter
+    """
+
+    def stats() -> Optional[dict]:
+        cache = app.extensions.get('entity_cache')
+        return cache.stats() if cache is not None else None
+
+    return [StatsCounter('entity_cache_hits_total', 'Lookups of the entity cache answered from the cache.', stats,
+                         'hits'),
+            StatsCounter('entity_cache_misses_total', 'Lookups of the entity cache not found in the cache.', stats,
+                         'misses'),
+            StatsCounter('entity_cache_evictions_total', 'Entries evicted from the entity cache, by size or TTL.',
+                         stats, 'evictions')]
+
+
+class MetricsRegistry:
+    """
+    The metrics of the API and their collection, single or multi process.
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.requests = Counter('http_requests_total', 'Number of requests.',
+                                ('endpoint', 'method', 'status'))
+        self.latency = Histogram('http_request_duration_seconds', 'Duration of the requests.',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.response_size = Histogram('http_response_size_bytes', 'Size of the response bodies.',
+                                       ('endpoint', 'method'), SIZE_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds', 'Time spent executing SQL statements per request.',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.metrics = [self.requests, self.latency, self.response_size, self.db_time]
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def add(self, metric: Metric):
+        """
+        Add a metric to the exported ones.
+
+        :param metric: The metric.
+        """
+        self.metrics.append(metric)
+
+    def record(self, endpoint: str, method: str, status: int, duration: float, size: int | None, db_time: float):
+        """
+        Record a request.
+
+        :param endpoint: Name of the endpoint (view).
+        :param method: HTTP method.
+        :param status: Status code of the response.
+        :param duration: Duration of the request in seconds.
+        :param size: Size of the response body in bytes, None if unknown (streamed).
+        :param db_time: Time spent in the DB in seconds.
+        """
+        self.requests.inc(endpoint, method, str(status))
+        self.latency.observe(duration, endpoint, method)
+        self.db_time.observe(db_time, endpoint, method)
+        if size is not None:
+            self.response_size.observe(size, endpoint, method)
+        if self.directory and monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self) -> dict[str, dict[tuple, list]]:
+        """
+        Return the values of the metrics of this process.
+
+        :return: {metric name: {label values: values}}
+        """
+        return {metric.name: metric.collect() for metric in self.metrics}
+
+    def snapshot_path(self, pid: int = None) -> str:
+        return os.path.join(self.directory, f'metrics-{pid or os.getpid()}.json')
+
+    def flush(self):
+        """
+        Write the snapshot of this process to METRICS_DIR, atomically.
+        """
+        if not self.directory or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = monotonic()
+            document = {name: [[list(labels), values] for labels, values in series.items()]
+                        for name, series in self.snapshot().items()}
+            path = self.snapshot_path()
+            with open(path + '.tmp', 'w') as file:
+                json.dump(document, file)
+            os.replace(path + '.tmp', path)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self) -> dict[str, dict[tuple, list]]:
+        """
+        Return the values of the metrics of all processes, the snapshots of the other processes are read from
+        METRICS_DIR.
+
+        :return: {metric name: {label values: values}}
+        """
+        collected = self.snapshot()
+        if not self.directory:
+            return collected
+        own = os.path.basename(self.snapshot_path())
+        for file_name in os.listdir(self.directory):
+            if not file_name.startswith('metrics-') or not file_name.endswith('.json') or file_name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name)) as file:
+                    document = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, items in document.items():
+                series = collected.setdefault(name, dict())
+                for labels, values in items:
+                    merge_values(series, tuple(labels), values)
+        return collected
+
+    def render(self) -> str:
+        """
+        Return the metrics of all processes in the Prometheus text format.
+
+        :return: exposition text
+        """
+        collected = self.collect()
+        lines = list()
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines += metric.render(collected.get(metric.name, {}))
+        return '\n'.join(lines) + '\n'
+
+
+def merge_values(series: dict[tuple, list], labels: tuple, values: list):
+    current = series.get(labels)
+    if current is None:
+        series[labels] = list(values)
+    else:
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value) -> str:
+    if isinstance(value, (str, int)):
+        return str(value)
+    return repr(float(value))
+
+
+def record_request(response):
+    """
+    Record the request in the metrics registry of the app, registered as an after_request hook by init_metrics().
+
+    :param response: The response.
+    :return: The response
+    """
+    registry = current_app.extensions.get('metrics')
+    timing = g.get('timing')
+    if registry is None or timing is None:
+        return response
+    registry.record(endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code,
+                    duration=timing.elapsed(), size=None if response.is_streamed else response.content_length,
+                    db_time=timing.db_time)
+    return response
+
+
+def metrics_view():
+    """
+    GET /metrics, the metrics of the app in the Prometheus text format.
+    """
+    return Response(current_app.extensions['metrics'].render(), mimetype=CONTENT_TYPE)
+
+
+def init_metrics(app: Flask) -> MetricsRegistry | None:
+    """
+    Create the metrics registry of the app, register it on app.extensions['metrics'], hook it to the requests and add
+    GET /metrics.
+
+    :param app: The flask app.
+    :return: The registry | None if metrics are disabled
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+    registry = MetricsRegistry(directory=app.config.get('METRICS_DIR'),
+                               flush_interval=float(app.config.get('METRICS_FLUSH_INTERVAL', 1.0)))
+    for metric in cache_metrics(app):
+        registry.add(metric)
+    app.extensions['metrics'] = registry
+    app.after_request(record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    return registry
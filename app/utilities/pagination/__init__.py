@@ -0,0 +1,71 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor carries the sort keys of a listing and the values of those keys for the last returned row, it is a url-safe
+base64 encoded json document. Clients should treat it as an opaque string and pass it back untouched.
+"""
+
+import json
+import base64
+import binascii
+from uuid import UUID
+from datetime import datetime
+
+_ENCODERS = {
+    datetime: ('dt', datetime.isoformat),
+    UUID: ('uuid', str),
+}
+
+_DECODERS = {
+    'dt': datetime.fromisoformat,
+    'uuid': UUID,
+}
+
+
+def encode_cursor(keys: list[str] | tuple[str, ...], values: list | tuple) -> str:
+    """
+    Encode the sort keys and the values of the last row of a page to an opaque cursor.
+
+    :param keys: Names of the sort keys (columns).
+    :param values: Values of the sort keys for the last row.
+    :return: Cursor string
+    """
+    encoded_values = list()
+    for value in values:
+        encoder = _ENCODERS.get(type(value))
+        if encoder:
+            encoded_values.append([encoder[0], encoder[1](value)])
+        else:
+            encoded_values.append(value)
+    document = json.dumps({'k': list(keys), 'v': encoded_values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(document.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: list[str] | tuple[str, ...]) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    :param cursor: Cursor string.
+    :param keys: Names of the sort keys the cursor is expected to carry.
+    :return: Values of the sort keys
+    :raises ValueError If the cursor is malformed or was produced for different sort keys.
+    """
+    try:
+        document = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_keys = document['k']
+        encoded_values = document['v']
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as err:
+        raise ValueError(f'malformed cursor: {err}')
+    if cursor_keys != list(keys) or len(encoded_values) != len(keys):
+        raise ValueError('cursor does not match the requested sort order')
+    values = list()
+    for value in encoded_values:
+        if isinstance(value, list):
+            try:
+                tag, raw = value
+                values.append(_DECODERS[tag](raw))
+            except (ValueError, TypeError, KeyError) as err:
+                raise ValueError(f'malformed cursor value: {err}')
+        else:
+            values.append(value)
+    return tuple(values)
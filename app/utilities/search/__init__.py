@@ -0,0 +1,281 @@
+"""
+Pluggable full-text search over the __search_fields__ of BaseModel subclasses.
+
+The backend of the app lives in app.extensions['search'] and is created by init_search(app) from the app config. The
+index is kept in sync incrementally from the model_changed signal (sent by every BaseModel write), on its own
+connection and transaction so the session and its objects are left untouched, and can be rebuilt with
+'flask catalog rebuild-search'.
+
+Results are (id, score) pairs ordered by score (lower is better) then id, so they can be paginated with a keyset on
+(score, id).
+
+Config Variables:
+
+- SEARCH_BACKEND: 'auto' (default, fts5 on SQLite builds having FTS5, like otherwise), 'fts5', 'like', or a
+SearchBackend subclass (or its import path in the form 'package.module:Class').
+"""
+
+import logging
+import sqlite3
+import threading
+from abc import ABC
+from abc import abstractmethod
+from importlib import import_module
+from uuid import UUID
+
+from flask import Flask
+from flask import current_app
+from flask import has_app_context
+from sqlalchemy import DDL
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import BaseModel
+from app.models.signals import model_changed
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+SYNC_CHUNK_SIZE = 500
+
+
+def searchable_models() -> list:
+    """
+    Return the mapped models having __search_fields__.
+
+    :return: list of model classes
+    """
+    return [mapper.class_ for mapper in BaseModel.registry.mappers
+            if getattr(mapper.class_, '__search_fields__', None)]
+
+
+class SearchBackend(ABC):
+    """
+    Interface of the search backends.
+    """
+    name = ''
+
+    def install(self, model):
+        """
+        Prepare the backend for a model, called once per model by init_search().
+
+        :param model: The model class.
+        """
+
+    @abstractmethod
+    def search(self, model, query: str, limit: int = 10, after: tuple = None) -> list[tuple[str, float]]:
+        """
+        Search the active objects of a model.
+
+        :param model: The model class.
+        :param query: Words to search, every word should match (as a prefix) one of the search fields.
+        :param limit: Number of results to return.
+        :param after: (score, id) of the last result of the previous page, None for the first page.
+        :return: list of (id, score)
+        """
+
+    def update(self, model, ids):
+        """
+        Re-index the objects having the given ids, inactive or missing objects are removed from the index.
+
+        :param model: The model class.
+        :param ids: The ids of the changed objects.
+        """
+
+    def rebuild(self, model) -> int:
+        """
+        Index all active objects of a model from scratch.
+
+        :param model: The model class.
+        :return: Number of indexed objects
+        """
+        return 0
+
+    @staticmethod
+    def terms(query: str) -> list[str]:
+        return [term for term in query.replace('"', ' ').split() if term]
+
+
+class LikeSearchBackend(SearchBackend):
+    """
+    Fallback backend without an index, matches every word with LIKE '%word%' on the search fields. Results are not
+    ranked (score is 0) and are ordered by id.
+    """
+    name = 'like'
+
+    def search(self, model, query: str, limit: int = 10, after: tuple = None) -> list[tuple[str, float]]:
+        conditions = [model.active == True]
+        for term in self.terms(query):
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append(or_(*[getattr(model, field).ilike(pattern, escape='\\')
+                                    for field in model.__search_fields__]))
+        if after is not None:
+            conditions.append(model.id > UUID(after[1]))
+        statement = select(model.id).where(and_(*conditions)).order_by(model.id).limit(limit)
+        return [(id.hex, 0.0) for id in db.session.scalars(statement)]
+
+
+class FTS5SearchBackend(SearchBackend):
+    """
+    SQLite FTS5 backend, results are ranked with bm25.
+
+    Each model gets a '<table>_fts' virtual table holding the id (not indexed) and a copy of the search fields, its
+    rowid is the rowid of the model's row so a changed object is located without scanning the index. The virtual table
+    is created and dropped with the model's table (create_all() / drop_all()) and by rebuild(). On a database created
+    before the search was added, a missing virtual table is created and filled on the first search or update of its
+    model (ensure_index()). The rowid of a table without an INTEGER PRIMARY KEY may change on VACUUM, rebuild the index
+    after it.
+    """
+    name = 'fts5'
+
+    def __init__(self):
+        self._indexed = set()
+        self._lock = threading.Lock()
+
+    def install(self, model):
+        if getattr(model, '__search_ddl_installed__', False):
+            return
+        model.__search_ddl_installed__ = True
+        event.listen(model.__table__, 'after_create',
+                     DDL(self.create_statement(model)).execute_if(callable_=self._has_fts5))
+        event.listen(model.__table__, 'before_drop',
+                     DDL(f'DROP TABLE IF EXISTS {self.table(model)}').execute_if(dialect='sqlite'))
+
+    @staticmethod
+    def available() -> bool:
+        connection = sqlite3.connect(':memory:')
+        try:
+            return ('ENABLE_FTS5',) in connection.execute('PRAGMA compile_options').fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _has_fts5(ddl, target, bind, **kwargs) -> bool:
+        return bind.dialect.name == 'sqlite' and FTS5SearchBackend.available()
+
+    @staticmethod
+    def table(model) -> str:
+        return f'{model.__tablename__}_fts'
+
+    def create_statement(self, model) -> str:
+        fields = ', '.join(model.__search_fields__)
+        return (f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table(model)} '
+                f"USING fts5(id UNINDEXED, {fields}, tokenize = 'unicode61', prefix = '2 3')")
+
+    def match_expression(self, query: str) -> str:
+        return ' '.join('"' + term + '"*' for term in self.terms(query))
+
+    def ensure_index(self, model):
+        """
+        Create and fill the virtual table of a model if it is missing, checked once per model.
+
+        :param model: The model class.
+        """
+        if model in self._indexed:
+            return
+        with self._lock:
+            if model in self._indexed:
+                return
+            inspector = inspect(db.engine)
+            if not inspector.has_table(model.__tablename__):
+                return
+            if not inspector.has_table(self.table(model)):
+                count = self.rebuild(model)
+                app_logger.warning(f'search index {self.table(model)} was missing, created with {count} objects')
+            self._indexed.add(model)
+
+    def search(self, model, query: str, limit: int = 10, after: tuple = None) -> list[tuple[str, float]]:
+        self.ensure_index(model)
+        table = self.table(model)
+        statement = (f'SELECT id, score FROM (SELECT id, bm25({table}) AS score FROM {table} '
+                     f'WHERE {table} MATCH :query)')
+        params = {'query': self.match_expression(query), 'limit': limit}
+        if after is not None:
+            statement += ' WHERE score > :score OR (score = :score AND id > :id)'
+            params.update(score=after[0], id=after[1])
+        statement += ' ORDER BY score, id LIMIT :limit'
+        return [(row.id, row.score) for row in db.session.execute(text(statement), params)]
+
+    def update(self, model, ids):
+        self.ensure_index(model)
+        table = self.table(model)
+        fields = ', '.join(model.__search_fields__)
+        source = model.__tablename__
+        delete = text(f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {source} WHERE id IN :ids)')
+        insert = text(f'INSERT INTO {table} (rowid, id, {fields}) SELECT rowid, id, {fields} FROM {source} '
+                      f'WHERE id IN :ids AND active = 1')
+        ids = [id.hex if isinstance(id, UUID) else id for id in ids]
+        with db.engine.begin() as connection:
+            for start in range(0, len(ids), SYNC_CHUNK_SIZE):
+                params = {'ids': ids[start:start + SYNC_CHUNK_SIZE]}
+                connection.execute(delete.bindparams(bindparam('ids', expanding=True)), params)
+                connection.execute(insert.bindparams(bindparam('ids', expanding=True)), params)
+
+    def rebuild(self, model) -> int:
+        table = self.table(model)
+        fields = ', '.join(model.__search_fields__)
+        with db.engine.begin() as connection:
+            connection.execute(text(self.create_statement(model)))
+            connection.execute(text(f'DELETE FROM {table}'))
+            result = connection.execute(text(f'INSERT INTO {table} (rowid, id, {fields}) SELECT rowid, id, {fields} '
+                                             f'FROM {model.__tablename__} WHERE active = 1'))
+        return result.rowcount
+
+
+BACKENDS = {
+    'fts5': FTS5SearchBackend,
+    'like': LikeSearchBackend,
+}
+
+
+def init_search(app: Flask) -> SearchBackend:
+    """
+    Create the search backend configured for the app, install it for every searchable model and register it on
+    app.extensions['search'].
+
+    :param app: The flask app.
+    :return: The search backend
+    """
+    backend = app.config.get('SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        backend = 'fts5' if uri.startswith('sqlite') and FTS5SearchBackend.available() else 'like'
+    if isinstance(backend, str):
+        if backend in BACKENDS:
+            backend = BACKENDS[backend]
+        else:
+            module_name, _, class_name = backend.partition(':')
+            backend = getattr(import_module(module_name), class_name)
+    search_backend = backend()
+    for model in searchable_models():
+        search_backend.install(model)
+    app.extensions['search'] = search_backend
+    return search_backend
+
+
+@model_changed.connect
+def sync(sender, ids=(), **kwargs):
+    """
+    Re-index the changed objects of a searchable model, connected to the model_changed signal.
+
+    Errors are logged and never fail the write that sent the signal.
+
+    :param sender: The model class.
+    :param ids: The ids of the changed objects.
+    """
+    if not has_app_context() or not getattr(sender, '__search_fields__', None):
+        return
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        return
+    try:
+        backend.update(sender, ids)
+    except SQLAlchemyError as e:
+        app_logger.error(f'failed to update the search index of {sender.__name__}: {getattr(e, "orig", e)}')
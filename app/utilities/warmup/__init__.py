@@ -0,0 +1,109 @@
+"""
+Warm-up of the app: builds once, before serving, what the first requests of every process would otherwise build.
+
+warm_up(app) runs these steps and returns the seconds spent on each:
+
+- mappers: configures the sqlalchemy mappers.
+- serializers: builds the shared schemas, dumpers and loaders of every service (BaseService.warm_up()).
+- routes: sorts the url map and builds its matcher.
+- statements: reads the first row of every model once (get_all(limit=1), no scan), to fill the compiled statement cache
+of the engine, skipped with a warning if the database is not reachable or not created yet.
+
+initiate_app() skips the warm-up of the apps loaded by the flask CLI (flask db, flask catalog, ..., see cli_context()),
+their command runs once and exits.
+
+Connections opened by the warm-up are closed before it returns: with a pre-forking server loading the app in its master
+process (i.e. gunicorn --preload) the workers inherit everything built here, copy on write, but no connection. The
+audit log writer and the metrics start their threads in the worker serving the first request.
+
+Config Variables:
+
+- WARM_UP: Warm the app up at the end of initiate_app(), By-default it is False. Ignored by the flask CLI.
+"""
+
+import logging
+import os
+from time import perf_counter
+
+from flask import Flask
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import configure_mappers
+
+from app.extensions import db
+from environ import APP_LOGGER_NAME
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+
+
+def app_services(app: Flask) -> list:
+    """
+    Return the services of the views of the app (see BaseAPI.as_view()), each one once.
+
+    :param app: The flask app.
+    :return: list of BaseService
+    """
+    services = dict()
+    for view in app.view_functions.values():
+        service = getattr(view, 'service', None)
+        if service is not None:
+            services[id(service)] = service
+    return list(services.values())
+
+
+def warm_up_statements(app: Flask, services: list) -> bool:
+    models = {service.__model__ for service in services}
+    with app.app_context():
+        try:
+            for model in models:
+                model.get_all(limit=1)
+        except SQLAlchemyError as e:
+            app_logger.warning(f'warm-up: statements skipped, {getattr(e, "orig", e)}')
+            db.session.rollback()
+            return False
+        finally:
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    return True
+
+
+def cli_context() -> bool:
+    """
+    Return True if the app is loaded by the flask CLI, which sets FLASK_RUN_FROM_CLI for every command.
+
+    :return: bool
+    """
+    return os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+
+
+def warm_up(app: Flask) -> dict[str, float]:
+    """
+    Warm the app up, see the module documentation.
+
+    :param app: The flask app.
+    :return: {step: seconds}
+    """
+    services = app_services(app)
+    timings = dict()
+
+    start = perf_counter()
+    configure_mappers()
+    timings['mappers'] = perf_counter() - start
+
+    start = perf_counter()
+    native = getattr(app.json, 'native_types', False)
+    for service in services:
+        service.warm_up(native=native)
+    timings['serializers'] = perf_counter() - start
+
+    start = perf_counter()
+    app.url_map.update()
+    timings['routes'] = perf_counter() - start
+
+    start = perf_counter()
+    if warm_up_statements(app, services):
+        timings['statements'] = perf_counter() - start
+
+    app_logger.info(f'warm-up of {len(services)} services: ' +
+                    ', '.join(f'{step} {seconds * 1000:.1f}ms' for step, seconds in timings.items()))
+    return timings
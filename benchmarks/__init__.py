@@ -0,0 +1,92 @@
+"""
+Benchmarks of the catalogue, they are not collected by pytest.
+
+Each module can be run on its own, i.e. 'python -m benchmarks.bench_load'.
+"""
+
+import json
+import math
+import timeit
+
+
+def measure(func, number: int = 1000, repeat: int = 5) -> dict:
+    """
+    Time func() with timeit, keeping the best of 'repeat' runs of 'number' calls.
+
+    :param func: callable without arguments
+    :param number: calls per run
+    :param repeat: number of runs
+    :return: {'number', 'repeat', 'best_us', 'ops_per_sec'}
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    return {'number': number, 'repeat': repeat, 'best_us': round(best * 1e6, 3), 'ops_per_sec': round(1 / best, 1)}
+
+
+def print_table(rows: list[dict], columns: list[str]):
+    """
+    Print a list of results as an aligned text table.
+
+    :param rows: results
+    :param columns: keys of the results to print
+    """
+    widths = [max(len(column), *(len(str(row.get(column, ''))) for row in rows)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).ljust(width) for column, width in zip(columns, widths)))
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    Return the p-th percentile (nearest rank) of already sorted values.
+
+    :param sorted_values: values sorted in ascending order
+    :param p: percentile, between 0 and 100
+    :return: value | 0.0 if there are no values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def save_results(path: str, document: dict):
+    """
+    Write results (i.e. to be used as a baseline) as a json file.
+
+    :param path: file path
+    :param document: {'meta': {...}, 'results': [...]}
+    """
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+
+
+def compare_to_baseline(results: list[dict], baseline_path: str, keys: list[str], metrics: dict[str, bool],
+                        tolerance: float = 0.1) -> list[dict]:
+    """
+    Compare results with the results stored in a baseline file (see save_results()).
+
+    Results are matched on the given keys, a metric regresses if it is worse than the baseline by more than
+    'tolerance' (relative).
+
+    :param results: current results
+    :param baseline_path: path of the baseline json file
+    :param keys: keys identifying a result, i.e. ['route', 'server']
+    :param metrics: metric names mapped to True if higher is better (throughput) | False if lower is better (latency)
+    :param tolerance: allowed relative change, 0.1 is 10%
+    :return: one row per compared metric with 'baseline', 'current', 'change' and 'regression'
+    """
+    with open(baseline_path) as file:
+        baseline = {tuple(row.get(key) for key in keys): row for row in json.load(file)['results']}
+    rows = list()
+    for result in results:
+        previous = baseline.get(tuple(result.get(key) for key in keys))
+        if previous is None:
+            continue
+        for metric, higher_is_better in metrics.items():
+            if not previous.get(metric) or result.get(metric) is None:
+                continue
+            change = (result[metric] - previous[metric]) / previous[metric]
+            regression = -change > tolerance if higher_is_better else change > tolerance
+            rows.append({**{key: result.get(key) for key in keys}, 'metric': metric, 'baseline': previous[metric],
+                         'current': result[metric], 'change': f'{change:+.1%}', 'regression': regression})
+    return rows
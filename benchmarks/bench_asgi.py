@@ -0,0 +1,228 @@
+"""
+Concurrent reads through the ASGI serving mode (app.utilities.asgi.ASGIApp) compared with the thread per request
+serving of the WSGI servers, on the catalogue seeded by bench_http.
+
+For each route and each --concurrency level, the same requests are sent in process (no network) by:
+
+- threads: one thread per in-flight request calling the flask (WSGI) app, like a threaded WSGI server.
+- asgi: one asyncio task per in-flight request calling ASGIApp, the views read through its asyncio (aiosqlite) session.
+
+The throughput, the p50 / p99 latency, the errors (5xx, i.e. database pool timeouts) and the peak number of threads of
+the process are reported.
+
+Usage: python -m benchmarks.bench_asgi [--products N] [--requests N] [--concurrency N,...] [--db-dir DIR]
+                                       [--save FILE] [--baseline FILE] [--tolerance T] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+from flask import Flask
+
+from app.utilities.asgi import ASGIApp
+from app.utilities.asgi import wsgi_environ
+from benchmarks import compare_to_baseline
+from benchmarks import percentile
+from benchmarks import print_table
+from benchmarks import save_results
+from benchmarks.bench_http import create_app
+from benchmarks.bench_http import routes
+from benchmarks.bench_http import sample_ids
+from benchmarks.bench_http import seed
+
+COLUMNS = ['route', 'server', 'concurrency', 'requests', 'errors', 'throughput_rps', 'p50_ms', 'p99_ms',
+           'peak_threads']
+ROUTES = ('GET /products', 'GET /products/id?expand', 'GET /products/id/categories')
+
+
+def http_scope(url: str) -> dict:
+    path, _, query_string = url.partition('?')
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'root_path': '', 'query_string': query_string.encode(), 'headers': [],
+            'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 50000)}
+
+
+class ThreadCounter:
+    """
+    Samples threading.active_count() in the background and keeps the peak.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize(route: str, server: str, concurrency: int, latencies: list[float], wall: float, errors: int,
+              peak_threads: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'route': route,
+        'server': server,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_threads': peak_threads,
+    }
+
+
+def run_threads(app: Flask, route: str, urls: list[str], concurrency: int) -> dict:
+    latencies = list()
+    errors = [0]
+    lock = threading.Lock()
+    batches = [urls[i::concurrency] for i in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def drive(batch: list[str]):
+        status = list()
+
+        def start_response(response_status, headers, exc_info=None):
+            status.append(int(response_status.split(' ', 1)[0]))
+
+        barrier.wait()
+        for url in batch:
+            request_start = perf_counter()
+            try:
+                iterable = app(wsgi_environ(http_scope(url), b''), start_response)
+                try:
+                    b''.join(iterable)
+                finally:
+                    getattr(iterable, 'close', lambda: None)()
+                failed = status[-1] >= 500
+            except Exception:
+                failed = True
+            with lock:
+                latencies.append(perf_counter() - request_start)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=drive, args=(batch,)) for batch in batches]
+    with ThreadCounter() as counter:
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = perf_counter() - start
+    return summarize(route, 'threads', concurrency, latencies, wall, errors[0], counter.peak)
+
+
+def run_asgi(asgi_app: ASGIApp, route: str, urls: list[str], concurrency: int) -> dict:
+    latencies = list()
+    errors = [0]
+
+    async def request(url: str):
+        status = list()
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        request_start = perf_counter()
+        try:
+            await asgi_app(http_scope(url), receive, send)
+            failed = status[0] >= 500
+        except Exception:
+            failed = True
+        latencies.append(perf_counter() - request_start)
+        errors[0] += failed
+
+    async def drive(batch: list[str]):
+        for url in batch:
+            await request(url)
+
+    async def main():
+        try:
+            await asyncio.gather(*(drive(urls[i::concurrency]) for i in range(concurrency)))
+        finally:
+            # the pooled connections belong to this event loop
+            await asgi_app.dispose()
+
+    with ThreadCounter() as counter:
+        start = perf_counter()
+        asyncio.run(main())
+        wall = perf_counter() - start
+    return summarize(route, 'asgi', concurrency, latencies, wall, errors[0], counter.peak)
+
+
+def run(products: int = 10000, requests: int = 2000, concurrency: list[int] = None, db_dir: str = None) -> dict:
+    """
+    Seed the catalogue and benchmark both serving modes for every route and concurrency level.
+
+    :return: {'meta': {...}, 'results': [...]}
+    """
+    concurrency = concurrency or [16, 256, 1024]
+    db_dir = os.path.abspath(db_dir or tempfile.mkdtemp(prefix='bench_asgi_'))
+    app = create_app(db_dir)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    seed(app, products, max(products // 100, 10), 3)
+    ids = sample_ids(app)
+    asgi_app = ASGIApp(app)
+    results = list()
+    for route, url in routes(ids, products):
+        if route not in ROUTES:
+            continue
+        for level in concurrency:
+            rng = random.Random(3)
+            urls = [url(rng) for _ in range(max(requests, level))]
+            results.append(run_threads(app, route, urls, level))
+            results.append(run_asgi(asgi_app, route, urls, level))
+    meta = {'products': products, 'requests': requests, 'concurrency': concurrency, 'asgi': asgi_app.stats(),
+            'db_dir': db_dir}
+    return {'meta': meta, 'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000, help='products in the catalogue')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per route, mode and concurrency')
+    parser.add_argument('--concurrency', default='16,256,1024', help='comma separated in-flight request levels')
+    parser.add_argument('--db-dir', default=None, help='directory of the database, reused if already seeded')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    document = run(products=args.products, requests=args.requests, db_dir=args.db_dir,
+                   concurrency=[int(level) for level in args.concurrency.split(',') if level])
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['route', 'server', 'concurrency'],
+                                         {'throughput_rps': True, 'p99_ms': False}, args.tolerance)
+        print()
+        print_table(comparison, ['route', 'server', 'concurrency', 'metric', 'baseline', 'current', 'change',
+                                 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
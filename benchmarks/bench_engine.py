@@ -0,0 +1,176 @@
+"""
+Concurrent read / write throughput of the database engine profiles (see app.utilities.database) on a SQLite file.
+
+For each profile a fresh database is seeded with --products products, then --readers threads read random products
+(BaseModel.get) and pages (BaseModel.get_all) while --writers threads update random products (BaseModel.patch), for
+--seconds. Every operation runs in the thread's own app context and ends the session like a request would.
+
+Profiles:
+
+- sqlalchemy: sqlalchemy and SQLite defaults (rollback journal, synchronous=FULL, no pragmas).
+- default: DefaultConfig (WAL, synchronous=NORMAL, busy_timeout).
+- production: Production (plus mmap, larger page cache and pool).
+
+Usage: python -m benchmarks.bench_engine [--products N] [--readers N] [--writers N] [--seconds S]
+                                         [--profiles name,...] [--save FILE] [--baseline FILE] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from time import perf_counter
+from uuid import UUID
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy import text
+
+from app import initiate_app
+from app.config import DefaultConfig
+from app.config import Production
+from app.extensions import db
+from app.models.product.product import Product
+from benchmarks import compare_to_baseline
+from benchmarks import print_table
+from benchmarks import save_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS = ['profile', 'journal_mode', 'reads', 'writes', 'reads_per_sec', 'writes_per_sec', 'errors']
+
+
+class BenchDefault(DefaultConfig):
+    # the api is not called, keep the audit log and the metrics out of the measure
+    AUDIT_LOG_ASYNC = False
+    METRICS_ENABLED = False
+
+
+class SQLAlchemyDefaults(BenchDefault):
+    DATABASE_POOL_SIZE = None
+    DATABASE_MAX_OVERFLOW = None
+    DATABASE_POOL_TIMEOUT = None
+    DATABASE_POOL_RECYCLE = None
+    DATABASE_POOL_PRE_PING = None
+    DATABASE_STATEMENT_CACHE_SIZE = None
+    SQLITE_PRAGMAS = {}
+
+
+class BenchProduction(Production):
+    AUDIT_LOG_ASYNC = False
+    METRICS_ENABLED = False
+
+
+PROFILES = {
+    'sqlalchemy': SQLAlchemyDefaults,
+    'default': BenchDefault,
+    'production': BenchProduction,
+}
+
+
+def create_app(config, db_dir: str) -> Flask:
+    app = Flask('benchmarks', root_path=ROOT, instance_path=db_dir)
+    return initiate_app(app, config, False)
+
+
+def seed(app: Flask, products: int, chunk_size: int = 10000) -> list[UUID]:
+    rng = random.Random(1)
+    ids = [UUID(int=rng.getrandbits(128), version=4) for _ in range(products)]
+    with app.app_context():
+        db.create_all()
+        for start in range(0, products, chunk_size):
+            db.session.execute(insert(Product), [
+                {'id': id, 'name': f'product {i}', 'code': f'P-{i:07d}', 'description': 'a product',
+                 'base_price': 10.0, 'vat_price': 12.0}
+                for i, id in enumerate(ids[start:start + chunk_size], start)
+            ])
+            db.session.commit()
+    return ids
+
+
+def run_profile(name: str, products: int, readers: int, writers: int, seconds: float) -> dict:
+    db_dir = tempfile.mkdtemp(prefix=f'bench_engine_{name}_')
+    app = create_app(PROFILES[name], db_dir)
+    ids = seed(app, products)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(readers + writers + 1)
+    deadline = [0.0]
+
+    def worker(index: int, write: bool):
+        rng = random.Random(index)
+        done = 0
+        errors = 0
+        with app.app_context():
+            barrier.wait()
+            while perf_counter() < deadline[0]:
+                try:
+                    if write:
+                        ok = Product.patch(rng.choice(ids), base_price=rng.uniform(1, 100)) is not None
+                    elif rng.random() < 0.9:
+                        ok = Product.get(rng.choice(ids)) is not None
+                    else:
+                        ok = Product.get_all(limit=20, page=rng.randint(1, 50)) is not None
+                except BaseException:
+                    ok = False
+                    db.session.rollback()
+                db.session.close()
+                done += ok
+                errors += not ok
+        with lock:
+            counts['writes' if write else 'reads'] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=(i, i < writers)) for i in range(readers + writers)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = perf_counter() + seconds
+    barrier.wait()
+    start = perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    with app.app_context():
+        journal_mode = db.session.execute(text('PRAGMA journal_mode')).scalar()
+        db.engine.dispose()
+    return {'profile': name, 'journal_mode': journal_mode, **counts,
+            'reads_per_sec': round(counts['reads'] / elapsed, 1),
+            'writes_per_sec': round(counts['writes'] / elapsed, 1)}
+
+
+def run(products: int = 10000, readers: int = 4, writers: int = 2, seconds: float = 5.0,
+        profiles: list[str] = None) -> dict:
+    results = [run_profile(name, products, readers, writers, seconds) for name in profiles or PROFILES]
+    return {'meta': {'products': products, 'readers': readers, 'writers': writers, 'seconds': seconds},
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000, help='products in the database')
+    parser.add_argument('--readers', type=int, default=4, help='reading threads')
+    parser.add_argument('--writers', type=int, default=2, help='writing threads')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration per profile')
+    parser.add_argument('--profiles', default='', help=f'comma separated profiles among {", ".join(PROFILES)}')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    document = run(products=args.products, readers=args.readers, writers=args.writers, seconds=args.seconds,
+                   profiles=[profile for profile in args.profiles.split(',') if profile])
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['profile'],
+                                         {'reads_per_sec': True, 'writes_per_sec': True}, args.tolerance)
+        print()
+        print_table(comparison, ['profile', 'metric', 'baseline', 'current', 'change', 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,325 @@
+"""
+HTTP benchmark of the generated REST endpoints (BaseRestAPI, BaseRestAPIById, the relationship views, search and
+filters) on a seeded catalogue.
+
+Products and categories are seeded with a fixed random seed into a SQLite database under --db-dir (a temporary
+directory by default), a database already holding the requested catalogue is reused so large catalogues are seeded
+once. Every route is driven through the flask test client (in process, no network) and through werkzeug's threaded
+WSGI server (the server of 'flask run') with --concurrency client connections. For each route and server the
+throughput, the p50 / p95 / p99 latency and, for the test client, the peak memory allocated per request (tracemalloc)
+are reported. Note that GET /products/id is served from the entity cache once an id has been read.
+
+Results can be stored with --save and compared with a stored baseline with --baseline, the exit code is 1 if a route
+regressed by more than --tolerance.
+
+Usage: python -m benchmarks.bench_http [--products N] [--categories N] [--fan-out N] [--requests N]
+                                       [--server client|wsgi|both] [--concurrency N] [--db-dir DIR]
+                                       [--save FILE] [--baseline FILE] [--tolerance T] [--json]
+
+i.e. --products 10000 | 100000 | 1000000
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import tracemalloc
+from time import perf_counter
+from uuid import UUID
+
+import sqlalchemy
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy import select
+from werkzeug.serving import WSGIRequestHandler
+from werkzeug.serving import make_server
+
+from app import initiate_app
+from app.config import Production
+from app.extensions import db
+from app.models.product.product import Category
+from app.models.product.product import Product
+from app.models.product.product import product_category
+from benchmarks import compare_to_baseline
+from benchmarks import percentile
+from benchmarks import print_table
+from benchmarks import save_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = '/api/v1'
+SAMPLE_SIZE = 1000
+COLUMNS = ['route', 'server', 'requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'alloc_peak_kib']
+
+
+def create_app(db_dir: str) -> Flask:
+    """
+    Create the production app with its blueprints, the SQLite database lives in db_dir (the instance path).
+
+    :param db_dir: absolute directory of the database
+    :return: flask app
+    """
+    app = Flask('benchmarks', root_path=ROOT, instance_path=db_dir)
+    return initiate_app(app, Production)
+
+
+def random_uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def seed(app: Flask, products: int, categories: int, fan_out: int, chunk_size: int = 10000, seed_value: int = 1):
+    """
+    Seed the catalogue with Core bulk inserts, unless the database already holds it.
+
+    :param app: flask app
+    :param products: number of products
+    :param categories: number of categories
+    :param fan_out: number of categories of each product
+    :param chunk_size: rows per INSERT statement
+    :param seed_value: random seed
+    """
+    rng = random.Random(seed_value)
+    with app.app_context():
+        db.create_all()
+        if Product.count() == products and Category.count() == categories:
+            return
+        db.drop_all()
+        db.create_all()
+        category_ids = [random_uuid(rng) for _ in range(categories)]
+        db.session.execute(insert(Category), [
+            {'id': id, 'name': f'category {i}', 'code': f'C-{i:06d}', 'description': f'category number {i}'}
+            for i, id in enumerate(category_ids)
+        ])
+        fan_out = min(fan_out, categories)
+        for start in range(0, products, chunk_size):
+            rows = list()
+            links = list()
+            for i in range(start, min(start + chunk_size, products)):
+                id = random_uuid(rng)
+                price = round(rng.uniform(1, 1000), 2)
+                rows.append({'id': id, 'name': f'product {i}', 'code': f'P-{i:07d}',
+                             'description': f'product number {i} of the catalogue', 'base_price': price,
+                             'vat_price': round(price * 1.2, 2)})
+                links += [{'product_id': id, 'category_id': category_id}
+                          for category_id in rng.sample(category_ids, fan_out)]
+            db.session.execute(insert(Product), rows)
+            if links:
+                db.session.execute(insert(product_category), links)
+            db.session.commit()
+        app.extensions['search'].rebuild(Product)
+
+
+def sample_ids(app: Flask) -> dict:
+    """
+    Pick products, categories and product-category links to request, ids are random so the first ones by id are a
+    random (and reproducible) sample.
+
+    :param app: flask app
+    :return: {'products', 'categories', 'links'}
+    """
+    with app.app_context():
+        products = db.session.scalars(select(Product.id).order_by(Product.id).limit(SAMPLE_SIZE)).all()
+        categories = db.session.scalars(select(Category.id).order_by(Category.id).limit(SAMPLE_SIZE)).all()
+        links = db.session.execute(select(product_category.c.product_id, product_category.c.category_id)
+                                   .order_by(product_category.c.product_id).limit(SAMPLE_SIZE)).all()
+    return {'products': products, 'categories': categories, 'links': links}
+
+
+def routes(ids: dict, product_count: int) -> list[tuple[str, callable]]:
+    """
+    Return the benchmarked routes, each one with a function building a url from a random.Random.
+
+    :param ids: see sample_ids()
+    :param product_count: products in the catalogue, the pages and searched names are picked among them
+    :return: list of (route name, url function)
+    """
+    products = ids['products']
+    categories = ids['categories']
+    links = ids['links']
+    pages = max(product_count // 20, 1)
+    return [
+        ('GET /products', lambda rng: f'{PREFIX}/products?limit=20&page={rng.randint(1, pages)}'),
+        ('GET /products?cursor', lambda rng: f'{PREFIX}/products?limit=20&cursor='),
+        ('GET /products?filter',
+         lambda rng: f'{PREFIX}/products?limit=20&filter[code][prefix]=P-{rng.randint(0, 99):02d}'),
+        ('GET /products/id', lambda rng: f'{PREFIX}/products/{rng.choice(products)}'),
+        ('GET /products/id?expand', lambda rng: f'{PREFIX}/products/{rng.choice(products)}?expand=categories'),
+        ('GET /products/id/categories', lambda rng: f'{PREFIX}/products/{rng.choice(products)}/categories'),
+        ('GET /products/id/categories/id',
+         lambda rng: '{}/products/{}/categories/{}'.format(PREFIX, *rng.choice(links))),
+        ('GET /categories/id/products', lambda rng: f'{PREFIX}/categories/{rng.choice(categories)}/products'),
+        ('GET /products/search',
+         lambda rng: f'{PREFIX}/products/search?q=product+{rng.randrange(product_count)}&limit=20'),
+    ]
+
+
+def summarize(route: str, server: str, latencies: list[float], wall: float, errors: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'route': route,
+        'server': server,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run_client(app: Flask, route: str, url, requests: int, warmup: int, alloc_requests: int, rng) -> dict:
+    client = app.test_client()
+    for _ in range(warmup):
+        client.get(url(rng))
+    urls = [url(rng) for _ in range(requests)]
+    latencies = list()
+    errors = 0
+    start = perf_counter()
+    for request_url in urls:
+        request_start = perf_counter()
+        response = client.get(request_url)
+        latencies.append(perf_counter() - request_start)
+        errors += response.status_code >= 400
+    result = summarize(route, 'client', latencies, perf_counter() - start, errors)
+
+    peaks = list()
+    tracemalloc.start()
+    try:
+        for request_url in urls[:alloc_requests]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            client.get(request_url)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    result['alloc_peak_kib'] = round(sum(peaks) / len(peaks) / 1024, 1) if peaks else None
+    return result
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+
+def run_wsgi(port: int, route: str, url, requests: int, warmup: int, concurrency: int, rng) -> dict:
+    batches = [[url(rng) for _ in range(requests // concurrency + (i < requests % concurrency))]
+               for i in range(concurrency)]
+    warmup_urls = [url(rng) for _ in range(warmup)]
+    latencies = list()
+    errors = [0]
+    lock = threading.Lock()
+
+    def drive(urls: list[str], record: bool):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local_latencies = list()
+        local_errors = 0
+        try:
+            for request_url in urls:
+                request_start = perf_counter()
+                connection.request('GET', request_url)
+                response = connection.getresponse()
+                response.read()
+                local_latencies.append(perf_counter() - request_start)
+                local_errors += response.status >= 400
+        finally:
+            connection.close()
+        if record:
+            with lock:
+                latencies.extend(local_latencies)
+                errors[0] += local_errors
+
+    drive(warmup_urls, record=False)
+    threads = [threading.Thread(target=drive, args=(urls, True)) for urls in batches]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(route, 'wsgi', latencies, perf_counter() - start, errors[0])
+    result['alloc_peak_kib'] = None
+    return result
+
+
+def run(products: int = 10000, categories: int = None, fan_out: int = 3, requests: int = 500, warmup: int = 20,
+        server: str = 'both', concurrency: int = 4, alloc_requests: int = 50, db_dir: str = None) -> dict:
+    """
+    Seed the catalogue and benchmark every route.
+
+    :return: {'meta': {...}, 'results': [...]}
+    """
+    categories = categories or max(products // 100, 10)
+    db_dir = os.path.abspath(db_dir or tempfile.mkdtemp(prefix='bench_http_'))
+    app = create_app(db_dir)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    seed_start = perf_counter()
+    seed(app, products, categories, fan_out)
+    seed_seconds = perf_counter() - seed_start
+    ids = sample_ids(app)
+
+    results = list()
+    if server in ('client', 'both'):
+        rng = random.Random(2)
+        for route, url in routes(ids, products):
+            results.append(run_client(app, route, url, requests, warmup, alloc_requests, rng))
+    if server in ('wsgi', 'both'):
+        http_server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            rng = random.Random(2)
+            for route, url in routes(ids, products):
+                results.append(run_wsgi(http_server.server_port, route, url, requests, warmup, concurrency, rng))
+        finally:
+            http_server.shutdown()
+    meta = {
+        'products': products,
+        'categories': categories,
+        'fan_out': fan_out,
+        'requests': requests,
+        'concurrency': concurrency,
+        'seed_seconds': round(seed_seconds, 2),
+        'db_dir': db_dir,
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'sqlite': sqlite3.sqlite_version,
+    }
+    return {'meta': meta, 'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000, help='products in the catalogue')
+    parser.add_argument('--categories', type=int, default=None, help='categories, defaults to products / 100')
+    parser.add_argument('--fan-out', type=int, default=3, help='categories of each product')
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per route and server')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per route and server')
+    parser.add_argument('--server', choices=('client', 'wsgi', 'both'), default='both')
+    parser.add_argument('--concurrency', type=int, default=4, help='client connections to the wsgi server')
+    parser.add_argument('--alloc-requests', type=int, default=50, help='requests traced by tracemalloc per route')
+    parser.add_argument('--db-dir', default=None, help='directory of the database, reused if already seeded')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    document = run(products=args.products, categories=args.categories, fan_out=args.fan_out, requests=args.requests,
+                   warmup=args.warmup, server=args.server, concurrency=max(args.concurrency, 1),
+                   alloc_requests=args.alloc_requests, db_dir=args.db_dir)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['route', 'server'],
+                                         {'throughput_rps': True, 'p95_ms': False}, args.tolerance)
+        print()
+        print_table(comparison, ['route', 'server', 'metric', 'baseline', 'current', 'change', 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,116 @@
+"""
+Serialization of product pages (1k rows by default) through the JSON providers of app.utilities.jsonprovider.
+
+Each variant dumps a page of transient products with the precompiled dumper then builds the JSON response with a
+provider, like GET /products does:
+
+- flask: flask's DefaultJSONProvider and the string dumper (the path before CatalogJSONProvider).
+- stdlib: CatalogJSONProvider with the json module and the string dumper.
+- orjson: CatalogJSONProvider with orjson and the string dumper.
+- orjson-native: CatalogJSONProvider with orjson and the native dumper (UUID and datetime left to orjson).
+
+The dump, the encoding and their total are timed (best of --repeat runs), for the plain ProductSchema and for the
+schema with the hyperlinks of the product blueprint. The orjson variants are skipped if orjson is not installed.
+
+Usage: python -m benchmarks.bench_json [--sizes 100,1000] [--repeat N] [--save FILE] [--baseline FILE] [--json]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.blueprints.api.product import product_v1
+from app.models.product.product import ProductSchema
+from app.models.serializer import get_dumper
+from app.utilities.jsonprovider import CatalogJSONProvider
+from app.utilities.jsonprovider import orjson
+from benchmarks import compare_to_baseline
+from benchmarks import print_table
+from benchmarks import save_results
+from benchmarks.bench_schema import create_app
+from benchmarks.bench_schema import links_schema
+from benchmarks.bench_schema import product
+
+COLUMNS = ['variant', 'schema', 'size', 'dump_ms', 'encode_ms', 'total_ms', 'speedup', 'bytes']
+
+
+def variants(app) -> dict:
+    """
+    Return the benchmarked variants.
+
+    :param app: flask app
+    :return: {name: (provider, native dumper)}
+    """
+    result = {
+        'flask': (DefaultJSONProvider(app), False),
+        'stdlib': (CatalogJSONProvider(app, backend='stdlib'), False),
+    }
+    if orjson is not None:
+        result['orjson'] = (CatalogJSONProvider(app, backend='orjson'), False)
+        result['orjson-native'] = (CatalogJSONProvider(app, backend='orjson'), True)
+    return result
+
+
+def best(func, number: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def run(sizes: list[int] = None, repeat: int = 5, budget: int = 20000) -> dict:
+    """
+    Time every variant for each schema and page size.
+
+    :return: {'meta': {...}, 'results': [...]}
+    """
+    sizes = sizes or [1000]
+    app = create_app()
+    results = list()
+    with app.test_request_context():
+        schemas = {'product': ProductSchema, 'product+links': links_schema(ProductSchema, product_v1)}
+        for schema_name, schema_class in schemas.items():
+            for size in sizes:
+                page = [product(i) for i in range(size)]
+                number = max(budget // size, 1)
+                baseline = None
+                for name, (provider, native) in variants(app).items():
+                    dumper = get_dumper(schema_class, native=native)
+                    document = dumper.dump(page, many=True)
+                    dump = best(lambda: dumper.dump(page, many=True), number, repeat)
+                    encode = best(lambda: provider.response(document).get_data(), number, repeat)
+                    total = dump + encode
+                    baseline = baseline or total
+                    results.append({'variant': name, 'schema': schema_name, 'size': size,
+                                    'dump_ms': round(dump * 1000, 3), 'encode_ms': round(encode * 1000, 3),
+                                    'total_ms': round(total * 1000, 3), 'speedup': round(baseline / total, 2),
+                                    'bytes': len(provider.response(document).get_data())})
+    return {'meta': {'sizes': sizes, 'repeat': repeat, 'python': sys.version.split()[0],
+                     'orjson': getattr(orjson, '__version__', None)},
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000', help='comma separated page sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the best one is kept')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    document = run(sizes=[int(size) for size in args.sizes.split(',') if size], repeat=args.repeat)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['variant', 'schema', 'size'],
+                                         {'total_ms': False}, args.tolerance)
+        print()
+        print_table(comparison, ['variant', 'schema', 'size', 'metric', 'baseline', 'current', 'change',
+                                 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,62 @@
+"""
+Compare the marshmallow load path with the precompiled Loader used by BaseService.create_model and update_model.
+
+Usage: python -m benchmarks.bench_load [--number N] [--many N] [--json]
+"""
+
+import json
+import argparse
+from uuid import uuid4
+
+from app.models.product.product import ProductSchema
+from app.models.serializer import get_loader
+from benchmarks import measure
+from benchmarks import print_table
+
+CREATE_EXCLUDE = ('id', 'created', 'updated', 'active')
+UPDATE_EXCLUDE = ('created', 'updated')
+
+
+def product_payload(i: int, with_id: bool = False) -> dict:
+    payload = {
+        'name': f'product {i}',
+        'code': f'P-{i:06d}',
+        'description': 'a product of the catalogue',
+        'base_price': 10.5 + i,
+        'vat_price': 12.6 + i,
+        'parent_id': None,
+    }
+    if with_id:
+        payload.update(id=str(uuid4()), active=True)
+    return payload
+
+
+def run(number: int = 2000, many: int = 100) -> list[dict]:
+    cases = [
+        ('create', CREATE_EXCLUDE, {'product': product_payload(1)}, False),
+        ('update', UPDATE_EXCLUDE, {'product': product_payload(1, with_id=True)}, False),
+        (f'create x{many}', CREATE_EXCLUDE, {'products': [product_payload(i) for i in range(many)]}, True),
+    ]
+    results = list()
+    for name, exclude, data, is_many in cases:
+        case_number = max(number // (many if is_many else 1), 10)
+        current = measure(lambda: ProductSchema(exclude=exclude).load(data, many=is_many), number=case_number)
+        loader = get_loader(ProductSchema, exclude=exclude)
+        fast = measure(lambda: loader.load(data, many=is_many), number=case_number)
+        results.append({'case': name, 'path': 'schema per request', **current})
+        results.append({'case': name, 'path': 'precompiled loader', **fast,
+                        'speedup': round(current['best_us'] / fast['best_us'], 2)})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=2000, help='loads per timing run')
+    parser.add_argument('--many', type=int, default=100, help='size of the collection case')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    results = run(number=args.number, many=args.many)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, ['case', 'path', 'best_us', 'ops_per_sec', 'speedup'])
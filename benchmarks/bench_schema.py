@@ -0,0 +1,239 @@
+"""
+Microbenchmarks of the hot functions of BaseSchema and BaseModel, in isolation, for 1 to 10k objects.
+
+Cases:
+
+- make_model, handle_single_or_collection, load_with_wrapper: the BaseSchema hooks called directly on prepared data.
+- to_json: BaseModel.to_json() of transient objects.
+- hyperlinks: dump of a schema with an ma.Hyperlinks field minus the same dump without it, in a request context.
+- schema.dump / dumper.dump / schema.load / loader.load: the full paths the hooks are part of, for reference.
+
+Cases run on ProductSchema, CategorySchema and ChildSchema (test example models). Each case is timed (best of
+--repeat runs) and its peak memory is measured with tracemalloc on a separate call. With --profile the selected cases
+are run under cProfile, the stats are printed (--profile-sort, --profile-limit) or written to --profile-output for
+snakeviz / pstats.
+
+Usage: python -m benchmarks.bench_schema [--sizes 1,10,100,1000,10000] [--cases name,...] [--schemas name,...]
+                                         [--profile] [--profile-output FILE] [--save FILE] [--baseline FILE] [--json]
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import datetime
+from uuid import uuid4
+
+from flask import Flask
+
+from app import generate_view_name
+from app import initiate_app
+from app.blueprints.api import BaseRestAPIById
+from app.blueprints.api.category import category_v1
+from app.blueprints.api.product import product_v1
+from app.config import Test
+from app.extensions import ma
+from app.models.product.product import Category
+from app.models.product.product import CategorySchema
+from app.models.product.product import Product
+from app.models.product.product import ProductSchema
+from app.models.serializer import get_dumper
+from app.models.serializer import get_loader
+from benchmarks import compare_to_baseline
+from benchmarks import print_table
+from benchmarks import save_results
+from test.models.example import Child
+from test.models.example import ChildSchema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_EXCLUDE = ('id', 'created', 'updated', 'active')
+COLUMNS = ['case', 'schema', 'size', 'number', 'call_us', 'per_object_us', 'peak_kib']
+
+
+def product(i: int) -> Product:
+    return Product(id=uuid4(), name=f'product {i}', code=f'P-{i:07d}', description='a product of the catalogue',
+                   base_price=10.5 + i, vat_price=12.6 + i, parent_id=None, created=datetime.now(),
+                   updated=datetime.now(), active=True)
+
+
+def category(i: int) -> Category:
+    return Category(id=uuid4(), name=f'category {i}', code=f'C-{i:06d}', description='a category',
+                    created=datetime.now(), updated=datetime.now(), active=True)
+
+
+def child(i: int) -> Child:
+    return Child(id=uuid4(), name=f'child {i}', parent_id=uuid4(), created=datetime.now(), updated=datetime.now(),
+                 active=True)
+
+
+def links_schema(schema_class, blueprint):
+    view_name = generate_view_name(BaseRestAPIById, schema_class, blueprint=blueprint)
+    return schema_class.from_dict({
+        'links': ma.Hyperlinks(
+            [
+                {'href': ma.URLFor(view_name, values=dict(id='<id>')), 'rel': 'self', 'type': 'GET'},
+                {'href': ma.URLFor(view_name, values=dict(id='<id>')), 'rel': 'parent', 'type': 'GET'},
+            ],
+            dump_only=True
+        )
+    })
+
+
+SCHEMAS = {
+    'product': (ProductSchema, product, product_v1),
+    'category': (CategorySchema, category, category_v1),
+    'child': (ChildSchema, child, None),
+}
+
+
+def create_app() -> Flask:
+    """
+    Create the app with its blueprints, for url building only (no database is used).
+
+    :return: flask app
+    """
+    app = Flask('benchmarks', root_path=ROOT, instance_path=tempfile.mkdtemp(prefix='bench_schema_'))
+    return initiate_app(app, Test)
+
+
+def build_cases(schema_name: str, size: int) -> dict[str, callable]:
+    """
+    Return the cases of a schema for a number of objects, as callables without arguments.
+
+    :param schema_name: key of SCHEMAS
+    :param size: number of objects
+    :return: {case name: callable}
+    """
+    schema_class, factory, blueprint = SCHEMAS[schema_name]
+    many = size > 1
+    objects = [factory(i) for i in range(size)]
+    target = objects if many else objects[0]
+    schema = schema_class(many=many)
+    load_schema = schema_class(exclude=LOAD_EXCLUDE, many=many)
+    dumper = get_dumper(schema_class)
+    loader = get_loader(schema_class, exclude=LOAD_EXCLUDE)
+
+    dumped = schema.dump(target)
+    payload = load_schema.dump(target)
+    validated = loader.load_dict(payload, many=many)
+    plain = dumped[schema_class.__envelope__['many' if many else 'single']]
+
+    cases = {
+        'make_model': lambda: load_schema.make_model(validated, many=many),
+        'handle_single_or_collection': lambda: schema.handle_single_or_collection(plain, many=many),
+        'load_with_wrapper': lambda: load_schema.load_with_wrapper(payload, many=many),
+        'to_json': lambda: [model_object.to_json() for model_object in objects],
+        'schema.dump': lambda: schema.dump(target),
+        'dumper.dump': lambda: dumper.dump(target, many=many),
+        'schema.load': lambda: load_schema.load(payload),
+        'loader.load': lambda: loader.load(payload, many=many),
+    }
+    if blueprint is not None:
+        linked_schema = links_schema(schema_class, blueprint)(many=many)
+        cases['hyperlinks'] = (lambda: linked_schema.dump(target), lambda: schema.dump(target))
+    return cases
+
+
+def time_case(func, number: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes: list[int], case_names: list[str] = None, schema_names: list[str] = None, repeat: int = 3,
+        budget: int = 20000, profiler: cProfile.Profile = None) -> dict:
+    """
+    Time and memory profile the cases.
+
+    :param sizes: numbers of objects
+    :param case_names: cases to run, all if None
+    :param schema_names: schemas to run, all if None
+    :param repeat: timing runs, the best one is kept
+    :param budget: objects processed per timing run, sets the number of calls
+    :param profiler: if given, each case is also run under it
+    :return: {'meta': {...}, 'results': [...]}
+    """
+    app = create_app()
+    results = list()
+    with app.test_request_context():
+        for schema_name in schema_names or SCHEMAS:
+            for size in sizes:
+                for case, func in build_cases(schema_name, size).items():
+                    if case_names and case not in case_names:
+                        continue
+                    number = max(budget // size, 1)
+                    if isinstance(func, tuple):
+                        # the cost of the field alone: with the field minus without it
+                        with_field, without_field = func
+                        seconds = time_case(with_field, number, repeat) - time_case(without_field, number, repeat)
+                        peak = peak_memory(with_field) - peak_memory(without_field)
+                        func = with_field
+                    else:
+                        seconds = time_case(func, number, repeat)
+                        peak = peak_memory(func)
+                    if profiler is not None:
+                        profiler.runcall(func)
+                    results.append({'case': case, 'schema': schema_name, 'size': size, 'number': number,
+                                    'call_us': round(seconds * 1e6, 3), 'per_object_us': round(seconds * 1e6 / size, 3),
+                                    'peak_kib': round(peak / 1024, 1)})
+    return {'meta': {'sizes': sizes, 'repeat': repeat, 'budget': budget, 'python': sys.version.split()[0]},
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,10,100,1000,10000', help='comma separated numbers of objects')
+    parser.add_argument('--cases', default='', help='comma separated case names, all by default')
+    parser.add_argument('--schemas', default='', help=f'comma separated schemas among {", ".join(SCHEMAS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs, the best one is kept')
+    parser.add_argument('--budget', type=int, default=20000, help='objects processed per timing run')
+    parser.add_argument('--profile', action='store_true', help='run the cases under cProfile')
+    parser.add_argument('--profile-output', default=None, help='write the cProfile stats to this file')
+    parser.add_argument('--profile-sort', default='cumulative', help='sort key of the printed stats')
+    parser.add_argument('--profile-limit', type=int, default=30, help='number of printed functions')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile or args.profile_output else None
+    document = run(sizes=[int(size) for size in args.sizes.split(',') if size],
+                   case_names=[case for case in args.cases.split(',') if case],
+                   schema_names=[schema for schema in args.schemas.split(',') if schema],
+                   repeat=args.repeat, budget=args.budget, profiler=profiler)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+    if profiler is not None:
+        if args.profile_output:
+            profiler.dump_stats(args.profile_output)
+        else:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats(args.profile_sort).print_stats(args.profile_limit)
+            print(stream.getvalue())
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['case', 'schema', 'size'],
+                                         {'per_object_us': False}, args.tolerance)
+        print()
+        print_table(comparison, ['case', 'schema', 'size', 'metric', 'baseline', 'current', 'change', 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
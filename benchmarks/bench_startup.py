@@ -0,0 +1,155 @@
+"""
+Startup profile of the app: import time, app creation, warm-up (see app.utilities.warmup) and the first requests.
+
+Every run starts a fresh interpreter, so nothing is shared between runs, in an empty temporary working directory and
+on an empty catalogue. Two profiles are measured:
+
+- cold: WARM_UP = False, the first requests build the schemas, the routes matcher and the statements.
+- warm: WARM_UP = True, they are built by initiate_app() (i.e. once in the master process of a pre-forking server).
+
+The median over --runs of each step is reported. With --importtime the modules spending the most time importing
+themselves (python -X importtime) are listed as well.
+
+Usage: python -m benchmarks.bench_startup [--runs N] [--importtime N] [--save FILE] [--baseline FILE] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import compare_to_baseline
+from benchmarks import print_table
+from benchmarks import save_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS = ['profile', 'runs', 'import_ms', 'create_ms', 'first_request_ms', 'second_request_ms', 'ready_ms',
+           'log_dir_at_import']
+
+# runs in a fresh interpreter, prints one json line
+SCRIPT = '''
+import json, os
+from time import perf_counter
+start = perf_counter()
+import app
+imported = perf_counter()
+from flask import Flask
+from app import initiate_app
+from app.config import Production
+
+class Profile(Production):
+    WARM_UP = {warm_up}
+    AUDIT_LOG_ASYNC = False
+    METRICS_ENABLED = False
+
+# importing the app should not create the log directory (see app.utilities.logging.configuration)
+log_dir_at_import = os.path.exists('log')
+flask_app = Flask('benchmarks', root_path={root!r}, instance_path=os.getcwd())
+created_start = perf_counter()
+initiate_app(flask_app, Profile)
+created = perf_counter()
+client = flask_app.test_client()
+first_start = perf_counter()
+first = client.get('/api/v1/products?limit=5')
+first_end = perf_counter()
+client.get('/api/v1/products?limit=5')
+second_end = perf_counter()
+assert first.status_code == 200, first.status_code
+print(json.dumps({{'import_ms': (imported - start) * 1000, 'create_ms': (created - created_start) * 1000,
+                  'first_request_ms': (first_end - first_start) * 1000,
+                  'second_request_ms': (second_end - first_end) * 1000,
+                  'ready_ms': (first_end - start) * 1000, 'log_dir_at_import': log_dir_at_import}}))
+'''
+
+
+def create_database(directory: str) -> str:
+    script = ('import os\n'
+              'from flask import Flask\n'
+              'from app import initiate_app\n'
+              'from app.config import Test\n'
+              'from app.extensions import db\n'
+              f'flask_app = initiate_app(Flask("benchmarks", root_path={ROOT!r}, instance_path=os.getcwd()), Test)\n'
+              'with flask_app.app_context():\n'
+              '    db.create_all()\n')
+    database_url = f'sqlite:///{os.path.join(directory, "catalogue.db")}'
+    run_python(['-c', script], directory, database_url)
+    return database_url
+
+
+def run_python(args: list[str], directory: str, database_url: str) -> subprocess.CompletedProcess:
+    environment = dict(os.environ, PYTHONPATH=ROOT, DATABASE_URL=database_url)
+    return subprocess.run([sys.executable, *args], cwd=directory, env=environment, capture_output=True, text=True,
+                          check=True)
+
+
+def run_profile(name: str, runs: int) -> dict:
+    samples = list()
+    for _ in range(runs):
+        database_url = create_database(tempfile.mkdtemp(prefix='bench_startup_db_'))
+        # a directory of its own, the one of the database holds the logs of its creation
+        directory = tempfile.mkdtemp(prefix=f'bench_startup_{name}_')
+        output = run_python(['-c', SCRIPT.format(warm_up=name == 'warm', root=ROOT)], directory, database_url).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {'profile': name, 'runs': runs}
+    for key in ('import_ms', 'create_ms', 'first_request_ms', 'second_request_ms', 'ready_ms'):
+        result[key] = round(statistics.median(sample[key] for sample in samples), 2)
+    result['log_dir_at_import'] = any(sample['log_dir_at_import'] for sample in samples)
+    return result
+
+
+def import_profile(top: int) -> list[dict]:
+    """
+    Return the modules with the largest self import time of 'import app'.
+
+    :param top: number of modules
+    :return: list of {'module', 'self_ms', 'cumulative_ms'}
+    """
+    directory = tempfile.mkdtemp(prefix='bench_startup_import_')
+    stderr = run_python(['-X', 'importtime', '-c', 'import app'], directory, 'sqlite://').stderr
+    modules = list()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        modules.append({'module': module.strip(), 'self_ms': round(int(self_us) / 1000, 2),
+                        'cumulative_ms': round(int(cumulative_us) / 1000, 2)})
+    return sorted(modules, key=lambda module: module['self_ms'], reverse=True)[:top]
+
+
+def run(runs: int = 5, importtime: int = 0) -> dict:
+    results = [run_profile(name, runs) for name in ('cold', 'warm')]
+    document = {'meta': {'runs': runs, 'python': sys.version.split()[0]}, 'results': results}
+    if importtime:
+        document['imports'] = import_profile(importtime)
+    return document
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per profile')
+    parser.add_argument('--importtime', type=int, default=0, help='list the N slowest modules to import')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this json file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+    document = run(runs=args.runs, importtime=args.importtime)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'], COLUMNS)
+        if document.get('imports'):
+            print()
+            print_table(document['imports'], ['module', 'self_ms', 'cumulative_ms'])
+    if args.save:
+        save_results(args.save, document)
+    if args.baseline:
+        comparison = compare_to_baseline(document['results'], args.baseline, ['profile'],
+                                         {'ready_ms': False, 'first_request_ms': False}, args.tolerance)
+        print()
+        print_table(comparison, ['profile', 'metric', 'baseline', 'current', 'change', 'regression'])
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
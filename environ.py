@@ -1,4 +1,6 @@
-SQLALCHEMY_DATABASE_URI = 'sqlite:///develop.db'
+import os
+
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///develop.db')
 
 # LOGGING
 APP_LOGGER_NAME = 'app_logger'